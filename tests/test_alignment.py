@@ -0,0 +1,76 @@
+import numpy as np
+import pandas as pd
+import sqlalchemy
+
+from trading_intel import alignment
+from trading_intel.init_db import metadata
+
+
+def test_align_attaches_latest_value_within_staleness(monkeypatch):
+    monkeypatch.setattr(alignment, "FRED_SERIES", ["DEXUSAL"])
+    monkeypatch.setattr(alignment, "DUNE_METRICS", ["tvl"])
+    monkeypatch.setattr(alignment, "DUNE_TIME_COLUMN", "day")
+    monkeypatch.setattr(
+        alignment,
+        "ALIGN_MAX_STALENESS",
+        {"fred": 48, "onchain": 1, "dune": 24},
+    )
+    engine = sqlalchemy.create_engine("sqlite://")
+    metadata.create_all(engine)
+    pd.DataFrame(
+        {
+            "timestamp": pd.to_datetime(["2021-01-01", "2021-01-04"]),
+            "price": [0.7, 0.8],
+            "symbol": "DEXUSAL",
+            "type": "fred",
+        }
+    ).to_sql("price_data", engine, if_exists="append", index=False)
+    pd.DataFrame(
+        {
+            "timestamp": pd.to_datetime(["2021-01-02 09:59:48"]),
+            "number": [11_000_000],
+            "gas_used": [12_000_000],
+            "gas_limit": [15_000_000],
+            "base_fee": [30_000_000_000],
+            "tx_count": [150],
+            "size": [60_000],
+        }
+    ).to_sql("onchain_data", engine, if_exists="append", index=False)
+    pd.DataFrame(
+        {
+            "day": ["2020-06-01 00:00:00.000 UTC", "2021-01-02 00:00:00.000 UTC"],
+            "tvl": [9.0, 5.0],
+            "query_id": 1,
+        }
+    ).to_sql("dune_data", engine, index=False)
+    prices = pd.DataFrame(
+        {
+            "timestamp": pd.to_datetime(
+                [
+                    "2021-01-02 10:00",
+                    "2021-01-01 12:00",
+                    "2021-01-03 11:00",
+                    "2021-01-04 00:00",
+                ]
+            ),
+            "price": [1.0, 2.0, 3.0, 4.0],
+        }
+    )
+
+    out = alignment.align(prices, engine)
+
+    np.testing.assert_array_equal(out.fred_dexusal, [0.7, 0.7, np.nan, 0.8])
+    np.testing.assert_array_equal(out.gas_used, [12_000_000, np.nan, np.nan, np.nan])
+    np.testing.assert_array_equal(out.tx_count, [150, np.nan, np.nan, np.nan])
+    np.testing.assert_array_equal(out.dune_tvl, [5.0, np.nan, np.nan, np.nan])
+    assert out.price.tolist() == [1.0, 2.0, 3.0, 4.0]
+
+
+def test_align_without_source_tables():
+    engine = sqlalchemy.create_engine("sqlite://")
+    prices = pd.DataFrame({"timestamp": pd.to_datetime(["2021-01-01"]), "price": [1.0]})
+
+    out = alignment.align(prices, engine)
+
+    assert set(alignment.aligned_columns()) <= set(out.columns)
+    assert out[alignment.aligned_columns()].isna().all().all()
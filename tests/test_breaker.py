@@ -0,0 +1,77 @@
+from datetime import datetime, timedelta
+
+import sqlalchemy
+
+from trading_intel.breaker import (
+    CLOSED,
+    HALF_OPEN,
+    OPEN,
+    BreakerRegistry,
+    CircuitBreaker,
+    breaker_status,
+)
+
+
+def test_breaker_opens_and_recovers():
+    t0 = datetime(2024, 1, 1)
+    breaker = CircuitBreaker("src", failure_threshold=2, cooldown=60)
+
+    breaker.record_failure(RuntimeError("down"), now=t0)
+    assert breaker.state == CLOSED and breaker.allow(now=t0)
+    breaker.record_failure(RuntimeError("down"), now=t0)
+    assert breaker.state == OPEN
+    assert not breaker.allow(now=t0 + timedelta(seconds=30))
+    assert breaker.skipped == 1
+
+    assert breaker.allow(now=t0 + timedelta(seconds=60))
+    assert breaker.state == HALF_OPEN
+    breaker.record_failure(RuntimeError("still down"), now=t0)
+    assert breaker.state == OPEN
+    assert breaker.last_error == "still down"
+
+    assert breaker.allow(now=t0 + timedelta(seconds=120))
+    breaker.record_success()
+    assert breaker.state == CLOSED
+    assert breaker.failures == 0
+
+
+def test_unrecorded_probe_is_retried(tmp_path):
+    engine = sqlalchemy.create_engine(f"sqlite:///{tmp_path / 'ti.db'}")
+    t0 = datetime(2024, 1, 1)
+    registry = BreakerRegistry()
+    breaker = registry.get("src")
+    breaker.failure_threshold = 1
+    breaker.cooldown = timedelta(seconds=60)
+    breaker.record_failure(RuntimeError("down"), now=t0)
+    # The probe is granted but its outcome never recorded.
+    assert breaker.allow(now=t0 + timedelta(seconds=60))
+    registry.save(engine)
+
+    restored = BreakerRegistry()
+    restored.load(engine)
+    again = restored.get("src")
+    again.cooldown = timedelta(seconds=60)
+    assert again.state == HALF_OPEN
+    assert not again.allow(now=t0 + timedelta(seconds=90))
+    assert again.allow(now=t0 + timedelta(seconds=120))
+
+
+def test_registry_persists_state(tmp_path):
+    engine = sqlalchemy.create_engine(f"sqlite:///{tmp_path / 'ti.db'}")
+    registry = BreakerRegistry()
+    breaker = registry.get("reddit")
+    breaker.failure_threshold = 1
+    breaker.record_failure(RuntimeError("503"))
+    breaker.allow()
+    registry.save(engine)
+
+    restored = BreakerRegistry()
+    restored.load(engine)
+    again = restored.get("reddit")
+    assert again.state == OPEN
+    assert again.skipped == 1
+    assert not again.allow()
+
+    status = breaker_status(engine)
+    assert status.source.tolist() == ["reddit"]
+    assert status.state.tolist() == [OPEN]
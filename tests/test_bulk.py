@@ -0,0 +1,117 @@
+import pandas as pd
+import sqlalchemy
+
+from trading_intel import bulk
+
+
+def test_write_frame_sqlite_fallback():
+    engine = sqlalchemy.create_engine("sqlite://")
+    df = pd.DataFrame({"symbol": ["a", "b"], "price": [1.0, None]})
+
+    assert bulk.write_method(engine) is None
+    assert bulk.write_frame(df, "price_data", engine) == 2
+    assert bulk.write_frame(df.iloc[:0], "price_data", engine) == 0
+    assert len(pd.read_sql_table("price_data", engine)) == 2
+
+
+def test_copy_rows_streams_text_format():
+    captured = {}
+
+    class Cursor:
+        def __enter__(self):
+            return self
+
+        def __exit__(self, *exc):
+            return False
+
+        def copy_expert(self, sql, buf):
+            captured["sql"] = sql
+            captured["data"] = buf.read()
+
+    class Conn:
+        connection = type("Raw", (), {"cursor": lambda self: Cursor()})()
+
+    table = type("Table", (), {"name": "price_data", "schema": None})()
+    rows = [("a\tb", 1.5, None), ("back\\slash", 2, "x\ny")]
+
+    assert bulk.copy_rows(table, Conn(), ["title", "price", "sub"], rows) == 2
+    assert captured["sql"] == ('COPY "price_data" ("title", "price", "sub") FROM STDIN')
+    assert captured["data"] == "a\\tb\t1.5\t\\N\nback\\\\slash\t2\tx\\ny\n"
+
+
+def _prices_table(engine):
+    from trading_intel.init_db import price_data
+
+    price_data.create(engine)
+
+
+def test_upsert_updates_on_natural_key():
+    engine = sqlalchemy.create_engine("sqlite://")
+    _prices_table(engine)
+    keys = ["symbol", "type", "timestamp"]
+    ts = pd.date_range("2021-01-01", periods=3, freq="h")
+    df = pd.DataFrame(
+        {"timestamp": ts, "price": [1.0, 2.0, 3.0], "symbol": "btc"}
+    ).assign(type="crypto")
+
+    assert bulk.upsert(df, "price_data", engine, keys) == 3
+    assert bulk.upsert(df, "price_data", engine, keys) == 0
+    changed = df.assign(price=[1.0, 2.0, 4.0])
+    bulk.upsert(changed, "price_data", engine, keys, update=True)
+
+    stored = pd.read_sql_table("price_data", engine)
+    assert stored.price.tolist() == [1.0, 2.0, 4.0]
+
+
+def test_insert_new_returns_only_new_rows():
+    engine = sqlalchemy.create_engine("sqlite://")
+    df = pd.DataFrame({"id": ["a", "b"], "title": ["x", "y"]})
+    with engine.begin() as conn:
+        conn.exec_driver_sql(
+            "CREATE TABLE posts (id VARCHAR PRIMARY KEY, title VARCHAR)"
+        )
+    bulk.insert_new(df.iloc[:1], "posts", engine, ["id"])
+
+    new = bulk.insert_new(df, "posts", engine, ["id"])
+
+    assert new.id.tolist() == ["b"]
+    assert bulk.insert_new(df, "posts", engine, ["id"]).empty
+
+
+def test_read_frame_and_chunks_sqlite_fallback():
+    engine = sqlalchemy.create_engine("sqlite://")
+    ts = pd.date_range("2021-01-01", periods=5, freq="h")
+    pd.DataFrame({"timestamp": ts, "price": range(5)}).to_sql(
+        "price_data", engine, index=False
+    )
+    query = sqlalchemy.text("SELECT * FROM price_data WHERE price >= :low")
+
+    df = bulk.read_frame(query, engine, params={"low": 1}, parse_dates=["timestamp"])
+    assert df.price.tolist() == [1, 2, 3, 4]
+    assert df.timestamp.dtype.kind == "M"
+    chunks = bulk.read_chunks(query, engine, params={"low": 0}, chunksize=2)
+    assert [len(c) for c in chunks] == [2, 2, 1]
+
+
+def test_csv_options_type_columns_from_oids():
+    description = [
+        ("price", 701),
+        ("volume", 1700),
+        ("count", 23),
+        ("ok", 16),
+        ("timestamp", 1114),
+        ("symbol", 1043),
+    ]
+
+    options = bulk._csv_options(description, ["hour"])
+
+    assert options["dtype"] == {
+        "price": "float64",
+        "volume": "float64",
+        "ok": str,
+        "symbol": str,
+    }
+    assert options["parse_dates"] == ["hour", "timestamp"]
+    assert options["bools"] == ["ok"]
+    assert options["na_values"]["price"] == ["\\N", "NaN"]
+    assert options["na_values"]["symbol"] == ["\\N"]
@@ -0,0 +1,32 @@
+from trading_intel import cli
+
+
+class FakeProcess:
+    pid = 4321
+
+    def __init__(self, codes):
+        self.codes = iter(codes)
+
+    def poll(self):
+        return next(self.codes)
+
+
+def _start(monkeypatch, tmp_path, proc, pids):
+    pids = iter(pids)
+    monkeypatch.setattr(cli, "DAEMON_LOG", str(tmp_path / "daemon.log"))
+    monkeypatch.setattr(cli, "_remove_legacy_cron", lambda: None)
+    monkeypatch.setattr(cli, "running_pid", lambda path: next(pids))
+    monkeypatch.setattr(cli.subprocess, "Popen", lambda *a, **kw: proc)
+    monkeypatch.setattr(cli.time, "sleep", lambda seconds: None)
+    return cli.start()
+
+
+def test_start_waits_for_the_pidfile(monkeypatch, tmp_path):
+    proc = FakeProcess([None, None])
+    assert _start(monkeypatch, tmp_path, proc, [None, None, None, 4321]) == 0
+
+
+def test_start_reports_a_daemon_that_exits(monkeypatch, tmp_path, caplog):
+    proc = FakeProcess([None, 1])
+    assert _start(monkeypatch, tmp_path, proc, [None, None, None]) == 1
+    assert "exited with code 1" in caplog.text
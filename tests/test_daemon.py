@@ -0,0 +1,69 @@
+import asyncio
+
+import pytest
+
+from trading_intel import daemon
+
+
+def test_pidfile_single_instance(tmp_path):
+    path = str(tmp_path / "ti.pid")
+    assert daemon.running_pid(path) is None
+
+    with daemon.PidFile(path):
+        assert daemon.running_pid(path) is not None
+        with pytest.raises(daemon.AlreadyRunning):
+            daemon.PidFile(path).acquire()
+
+    assert daemon.running_pid(path) is None
+    with daemon.PidFile(path):
+        pass
+
+
+def test_serve_survives_failed_ticks_and_stops(monkeypatch):
+    closed = []
+
+    async def close_client():
+        closed.append(True)
+
+    monkeypatch.setattr(daemon, "close_client", close_client)
+
+    async def scenario():
+        stop = asyncio.Event()
+        calls = []
+
+        async def tick():
+            calls.append(len(calls))
+            if len(calls) == 1:
+                raise RuntimeError("upstream down")
+            if len(calls) == 3:
+                stop.set()
+
+        ticks = await daemon.serve(tick, interval=0, stop=stop)
+        return ticks, calls
+
+    ticks, calls = asyncio.run(scenario())
+    assert ticks == 3
+    assert calls == [0, 1, 2]
+    assert closed == [True]
+
+
+def test_serve_sleeps_until_tick_is_due(monkeypatch):
+    async def close_client():
+        pass
+
+    monkeypatch.setattr(daemon, "close_client", close_client)
+
+    async def scenario():
+        stop = asyncio.Event()
+        calls = []
+
+        async def tick():
+            calls.append(True)
+            if len(calls) == 2:
+                stop.set()
+            return 0.01
+
+        await daemon.serve(tick, interval=3600, stop=stop)
+        return calls
+
+    assert len(asyncio.run(asyncio.wait_for(scenario(), 5))) == 2
@@ -0,0 +1,129 @@
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import sqlalchemy
+
+from trading_intel import feature_store
+
+
+def features(symbol, start, periods, value=1.0, type_="crypto"):
+    return pd.DataFrame(
+        {
+            "symbol": symbol,
+            "type": type_,
+            "timestamp": pd.date_range(start, periods=periods, freq="D"),
+            "price_diff": np.arange(periods) * value,
+            "ema_12": np.nan,
+        }
+    )
+
+
+def test_sync_appends_new_rows_by_symbol_and_month(tmp_path):
+    engine = sqlalchemy.create_engine("sqlite://")
+    features("btc", "2021-01-30", 4).to_sql("features", engine, index=False)
+    features("eth", "2021-02-10", 2).to_sql(
+        "features", engine, index=False, if_exists="append"
+    )
+
+    assert feature_store.sync(engine, tmp_path) == 6
+    files = sorted(str(p.relative_to(tmp_path)) for p in tmp_path.glob("*/*/*.arrow"))
+    assert files == [
+        "symbol=btc/type=crypto/2021-01.0000.arrow",
+        "symbol=btc/type=crypto/2021-02.0000.arrow",
+        "symbol=eth/type=crypto/2021-02.0000.arrow",
+    ]
+    assert feature_store.sync(engine, tmp_path) == 0
+
+    features("btc", "2021-02-03", 2, value=10).to_sql(
+        "features", engine, index=False, if_exists="append"
+    )
+    before = (tmp_path / "symbol=btc/type=crypto/2021-02.0000.arrow").stat().st_mtime_ns
+    assert feature_store.sync(engine, tmp_path) == 2
+    # New rows go to a new part; the existing file is left alone.
+    assert (
+        tmp_path / "symbol=btc/type=crypto/2021-02.0000.arrow"
+    ).stat().st_mtime_ns == before
+    assert (tmp_path / "symbol=btc/type=crypto/2021-02.0001.arrow").exists()
+    table = feature_store.read_table(["price_diff"], ["btc"], root=tmp_path)
+    assert table.column_names == ["price_diff"]
+    assert table.column("price_diff").to_pylist() == [0, 1, 2, 3, 0, 10]
+
+    # A rebuilt table with fewer rows rewrites that symbol.
+    with engine.begin() as conn:
+        conn.exec_driver_sql("DELETE FROM features WHERE price_diff = 10")
+    assert feature_store.sync(engine, tmp_path) == 5
+    assert feature_store.read_table(root=tmp_path).num_rows == 7
+
+
+def test_read_table_maps_files_without_copying(tmp_path):
+    engine = sqlalchemy.create_engine("sqlite://")
+    features("btc", "2021-01-01", 90).to_sql("features", engine, index=False)
+    feature_store.sync(engine, tmp_path)
+
+    allocated = pa.total_allocated_bytes()
+    table = feature_store.read_table(["price_diff", "ema_12"], root=tmp_path)
+    assert pa.total_allocated_bytes() == allocated
+    assert table.num_rows == 90
+
+    window = feature_store.read_table(
+        ["price_diff"],
+        start=pd.Timestamp("2021-02-10"),
+        end=pd.Timestamp("2021-02-12"),
+        root=tmp_path,
+    )
+    assert window.column("price_diff").to_pylist() == [40, 41]
+
+    X = feature_store.feature_matrix(table, ["price_diff", "ema_12"])
+    assert X.dtype == np.float32 and X.shape == (90, 2)
+    assert X[89, 0] == 89 and np.isnan(X[:, 1]).all()
+    reversed_ = feature_store.feature_matrix(
+        table, ["price_diff"], order=np.arange(90)[::-1]
+    )
+    assert reversed_[0, 0] == 89
+
+
+def test_parts_of_a_month_are_compacted(tmp_path, monkeypatch):
+    monkeypatch.setattr(feature_store, "MAX_PARTS", 3)
+    engine = sqlalchemy.create_engine("sqlite://")
+    directory = tmp_path / "symbol=btc" / "type=crypto"
+    counts = []
+    for day in range(1, 6):
+        features("btc", f"2021-01-{day:02d}", 1, value=day).to_sql(
+            "features", engine, index=False, if_exists="append"
+        )
+        feature_store.sync(engine, tmp_path)
+        counts.append(len(list(directory.glob("*.arrow"))))
+
+    assert counts == [1, 2, 1, 2, 1]
+    assert [p.name for p in directory.glob("*.arrow")] == ["2021-01.0000.arrow"]
+    table = feature_store.read_table(["timestamp"], root=tmp_path)
+    assert table.column("timestamp").to_pandas().dt.day.tolist() == [1, 2, 3, 4, 5]
+
+
+def test_symbol_with_two_types_is_stored_per_type(tmp_path):
+    engine = sqlalchemy.create_engine("sqlite://")
+    features("abc", "2021-01-01", 3, type_="crypto").to_sql(
+        "features", engine, index=False
+    )
+    features("abc", "2021-01-01", 2, value=10, type_="stock").to_sql(
+        "features", engine, index=False, if_exists="append"
+    )
+
+    assert feature_store.sync(engine, tmp_path) == 5
+    assert sorted(p.name for p in (tmp_path / "symbol=abc").iterdir()) == [
+        "type=crypto",
+        "type=stock",
+    ]
+    table = feature_store.read_table(["type", "price_diff"], ["abc"], root=tmp_path)
+    assert table.column("type").to_pylist() == ["crypto"] * 3 + ["stock"] * 2
+    assert feature_store.sync(engine, tmp_path) == 0
+
+    # Rebuilding or dropping one type leaves the other one's files alone.
+    crypto = tmp_path / "symbol=abc/type=crypto/2021-01.0000.arrow"
+    before = crypto.stat().st_mtime_ns
+    with engine.begin() as conn:
+        conn.exec_driver_sql("DELETE FROM features WHERE type = 'stock'")
+    assert feature_store.sync(engine, tmp_path) == 0
+    assert not (tmp_path / "symbol=abc/type=stock").exists()
+    assert crypto.stat().st_mtime_ns == before
+    assert feature_store.read_table(root=tmp_path).num_rows == 3
@@ -1,45 +1,214 @@
+import json
+from datetime import datetime
+
+import numpy as np
 import pandas as pd
 import pandas.testing as pdt
+import sqlalchemy
 
-from trading_intel import features
+from trading_intel import features, indicators
+from trading_intel.init_db import feature_state, metadata
 
 
-def test_create_features(monkeypatch):
-    sample = pd.DataFrame(
+def _sample(start="2021-01-01", periods=3, prices=(100.0, 110.0, 120.0)):
+    return pd.DataFrame(
         {
-            "timestamp": pd.date_range("2021-01-01", periods=3, freq="H"),
-            "price": [100.0, 110.0, 120.0],
-            "title": ["a", "b", "c"],
+            "timestamp": pd.date_range(start, periods=periods, freq="h"),
+            "price": list(prices),
+            "symbol": "bitcoin",
+            "type": "crypto",
+            "sentiment_score": 0.5,
         }
     )
 
-    def fake_read_sql(query, engine):
-        return sample.copy()
 
-    captured = {}
+def _patch(monkeypatch, frames):
+    engine = sqlalchemy.create_engine("sqlite://")
+    queries = []
 
-    def fake_to_sql(self, name, engine, if_exists="replace", index=False):
-        captured["df"] = self.copy()
-        captured["name"] = name
-        captured["if_exists"] = if_exists
-        captured["index"] = index
+    def fake_read_frame(query, engine, params):
+        queries.append(query)
+        frame = frames.pop(0).copy()
+        assert params == {
+            "start": frame.timestamp.min().floor("h"),
+            "end": frame.timestamp.max(),
+        }
+        return frame
 
-    monkeypatch.setattr(features.pd, "read_sql", fake_read_sql)
-    monkeypatch.setattr(pd.DataFrame, "to_sql", fake_to_sql)
-    monkeypatch.setattr(features, "_sentiment", lambda text: 0.5)
+    def fake_bounds(full):
+        return frames[0].timestamp.min().floor("h"), frames[0].timestamp.max()
 
-    features.create_features()
+    monkeypatch.setattr(features, "engine", engine)
+    monkeypatch.setattr(features, "_time_bounds", fake_bounds)
+    monkeypatch.setattr(features, "read_frame", fake_read_frame)
+    return engine, queries
+
+
+def test_create_features(monkeypatch):
+    sample = _sample()
+    engine, queries = _patch(monkeypatch, [sample])
+
+    out = features.create_features().reset_index(drop=True)
 
-    out = captured["df"].reset_index(drop=True)
     expected = sample.copy()
     expected["hour"] = expected.timestamp.dt.hour
     expected["price_diff"] = expected.price.pct_change()
     expected["ema_12"] = expected.price.ewm(span=12).mean()
-    expected["sentiment_score"] = 0.5
     expected.dropna(subset=["price_diff", "ema_12"], inplace=True)
     expected = expected.reset_index(drop=True)
 
-    pdt.assert_frame_equal(out, expected)
-    assert captured["name"] == "features"
-    assert captured["if_exists"] == "replace"
-    assert not captured["index"]
+    pdt.assert_frame_equal(out[expected.columns], expected)
+    assert set(indicators.indicator_columns()) <= set(out.columns)
+    assert queries == [features.FULL_QUERY]
+    stored = pd.read_sql_table("features", engine)
+    assert len(stored) == len(expected)
+
+
+def test_create_features_incremental(monkeypatch):
+    first = _sample()
+    second = _sample("2021-01-01 03:00", periods=2, prices=(130.0, 125.0))
+    engine, queries = _patch(monkeypatch, [first, second])
+
+    features.create_features()
+    appended = features.create_features()
+
+    assert queries == [features.FULL_QUERY, features.INCREMENTAL_QUERY]
+    assert len(appended) == 2
+    assert len(pd.read_sql_table("features", engine)) == 4
+    state = pd.read_sql_table("feature_state", engine)
+    assert state.watermark.iloc[0] == second.timestamp.iloc[-1]
+    assert json.loads(state.state.iloc[0])["close"][-1] == 125.0
+
+
+def test_incremental_matches_full_rebuild():
+    rng = np.random.default_rng(0)
+    df = pd.concat(
+        [
+            pd.DataFrame(
+                {
+                    "timestamp": pd.date_range("2021-01-01", periods=40, freq="h"),
+                    "price": rng.uniform(50, 150, 40),
+                    "symbol": symbol,
+                    "type": "crypto",
+                }
+            )
+            for symbol in ("bitcoin", "ethereum")
+        ]
+    ).sort_values("timestamp", kind="stable", ignore_index=True)
+    df.loc[7, "price"] = np.nan
+
+    full, _ = features.compute_features(df)
+    head, states = features.compute_features(df.iloc[:30])
+    states = json.loads(json.dumps({"|".join(k): v for k, v in states.items()}))
+    states = {tuple(k.split("|")): v for k, v in states.items()}
+    tail, _ = features.compute_features(df.iloc[30:], states)
+    chunked = pd.concat([head, tail])
+
+    for col in indicators.indicator_columns():
+        np.testing.assert_allclose(chunked[col], full[col], rtol=1e-9, err_msg=col)
+    for symbol, group in df.groupby("symbol"):
+        np.testing.assert_allclose(
+            full.loc[group.index, "ema_12"],
+            group.price.ewm(span=12).mean(),
+            rtol=1e-12,
+        )
+
+
+def test_indicators_match_pandas_per_symbol():
+    rng = np.random.default_rng(1)
+    df = pd.concat(
+        [
+            pd.DataFrame(
+                {
+                    "timestamp": pd.date_range("2021-01-01", periods=80, freq="h"),
+                    "close": rng.uniform(50, 150, 80),
+                    "volume": rng.uniform(1e3, 1e4, 80),
+                    "symbol": symbol,
+                    "type": "stock",
+                }
+            )
+            for symbol in ("AAPL", "MSFT")
+        ]
+    ).sort_values("timestamp", kind="stable", ignore_index=True)
+
+    out, _ = features.compute_features(df)
+
+    for symbol, group in df.groupby("symbol"):
+        got = out.loc[group.index]
+        close, volume = group.close, group.volume
+        returns = close.pct_change()
+        macd = close.ewm(span=12).mean() - close.ewm(span=26).mean()
+        delta = close.diff()
+        gain = delta.clip(lower=0).ewm(alpha=1 / 14).mean()
+        loss = (-delta).clip(lower=0).ewm(alpha=1 / 14).mean()
+        expected = {
+            "price_diff": returns,
+            "ema_26": close.ewm(span=26).mean(),
+            "sma_50": close.rolling(50).mean(),
+            "rsi_14": 100 - 100 / (1 + gain / loss),
+            "macd": macd,
+            "macd_signal": macd.ewm(span=9).mean(),
+            "volatility_24": returns.rolling(24).std(),
+            "volume_z_24": (volume - volume.rolling(24).mean())
+            / volume.rolling(24).std(),
+        }
+        for col, values in expected.items():
+            np.testing.assert_allclose(got[col], values, rtol=1e-9, err_msg=col)
+
+
+def test_parallel_matches_serial(monkeypatch):
+    rng = np.random.default_rng(2)
+    df = pd.concat(
+        [
+            pd.DataFrame(
+                {
+                    "timestamp": pd.date_range("2021-01-01", periods=60, freq="h"),
+                    "price": rng.uniform(50, 150, 60),
+                    "volume": rng.uniform(1e3, 1e4, 60),
+                    "symbol": f"coin{i}",
+                    "type": "crypto",
+                }
+            )
+            for i in range(5)
+        ]
+    ).sort_values("timestamp", kind="stable", ignore_index=True)
+    monkeypatch.setattr(features, "POOL_MIN_ROWS", 0)
+    monkeypatch.setattr(features, "available_cpus", lambda: 2)
+
+    serial, serial_states = features.compute_features(df)
+    parallel, parallel_states = features.compute_features(df, workers=2)
+
+    pdt.assert_frame_equal(parallel, serial)
+    assert json.dumps(sorted(parallel_states.items())) == json.dumps(
+        sorted(serial_states.items())
+    )
+
+
+def test_time_bounds_cover_rows_past_watermark(monkeypatch):
+    engine = sqlalchemy.create_engine("sqlite://")
+    metadata.create_all(engine)
+    _sample().drop(columns="sentiment_score").to_sql(
+        "price_data", engine, if_exists="append", index=False
+    )
+    monkeypatch.setattr(features, "engine", engine)
+    assert features._time_bounds(True) == (
+        datetime(2021, 1, 1, 0),
+        datetime(2021, 1, 1, 2),
+    )
+    with engine.begin() as conn:
+        conn.execute(
+            feature_state.insert(),
+            {
+                "symbol": "bitcoin",
+                "type": "crypto",
+                "watermark": datetime(2021, 1, 1, 0, 30),
+                "state": "{}",
+            },
+        )
+    assert features._time_bounds(False) == (
+        datetime(2021, 1, 1, 1),
+        datetime(2021, 1, 1, 2),
+    )
+    with engine.begin() as conn:
+        conn.execute(feature_state.update().values(watermark=datetime(2021, 1, 2)))
+    assert features._time_bounds(False) is None
@@ -0,0 +1,167 @@
+import asyncio
+
+import aiohttp
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from trading_intel import http_cache, http_client
+
+
+def test_backoff_delay_bounds():
+    assert http_client.backoff_delay(3, retry_after=2.5) == 2.5
+    for attempt in range(10):
+        delay = http_client.backoff_delay(attempt)
+        assert 0 <= delay <= http_client.BACKOFF_CAP
+
+
+def test_token_bucket_spaces_requests(monkeypatch):
+    clock = {"now": 0.0}
+    sleeps = []
+
+    async def fake_sleep(seconds):
+        sleeps.append(seconds)
+        clock["now"] += seconds
+
+    monkeypatch.setattr(http_client.time, "monotonic", lambda: clock["now"])
+    monkeypatch.setattr(http_client.asyncio, "sleep", fake_sleep)
+
+    async def body():
+        bucket = http_client.TokenBucket(per_minute=30)
+        for _ in range(3):
+            await bucket.acquire()
+
+    asyncio.run(body())
+    assert sleeps == [2.0, 2.0]
+
+
+def test_token_bucket_burst_from_config(monkeypatch):
+    clock = {"now": 0.0}
+    sleeps = []
+
+    async def fake_sleep(seconds):
+        sleeps.append(seconds)
+        clock["now"] += seconds
+
+    monkeypatch.setattr(http_client.time, "monotonic", lambda: clock["now"])
+    monkeypatch.setattr(http_client.asyncio, "sleep", fake_sleep)
+
+    async def body():
+        client = http_client.AsyncHTTP(rate_limits={"api": 30}, bursts={"api": 3})
+        bucket = client.limiters["api"]
+        for _ in range(5):
+            await bucket.acquire()
+
+    asyncio.run(body())
+    assert sleeps == [2.0, 2.0]
+
+
+def test_retries_must_allow_one_attempt():
+    with pytest.raises(ValueError, match="retries"):
+        http_client.AsyncHTTP(retries=0)
+
+
+async def _serve(handler, body, cache=None):
+    app = web.Application()
+    app.router.add_get("/", handler)
+    server = TestServer(app)
+    await server.start_server()
+    client = http_client.AsyncHTTP(retries=3, cache=cache)
+    try:
+        return await body(client, str(server.make_url("/")))
+    finally:
+        await client.close()
+        await server.close()
+
+
+def test_get_json_retries_transient_errors(monkeypatch):
+    monkeypatch.setattr(http_client, "BACKOFF_BASE", 0)
+    calls = []
+
+    async def handler(request):
+        calls.append(request.query["q"])
+        if len(calls) < 3:
+            return web.Response(status=503)
+        return web.json_response({"ok": True})
+
+    async def body(client, url):
+        return await client.get_json(url, params={"q": "x"})
+
+    assert asyncio.run(_serve(handler, body)) == {"ok": True}
+    assert calls == ["x", "x", "x"]
+
+
+def test_get_json_raises_client_errors_immediately():
+    calls = []
+
+    async def handler(request):
+        calls.append(1)
+        return web.Response(status=404)
+
+    async def body(client, url):
+        await client.get_json(url)
+
+    with pytest.raises(aiohttp.ClientResponseError):
+        asyncio.run(_serve(handler, body))
+    assert len(calls) == 1
+
+
+def test_cached_get_revalidates_and_skips_unchanged(tmp_path):
+    cache = http_cache.ResponseCache(
+        str(tmp_path / "cache.sqlite"), ttls={"slow": 3600}
+    )
+    seen_headers = []
+
+    async def handler(request):
+        seen_headers.append(request.headers.get("If-None-Match"))
+        if request.headers.get("If-None-Match") == '"v1"':
+            return web.Response(status=304)
+        if request.query.get("q") == "fast":
+            return web.json_response({"n": 1})
+        return web.json_response({"n": 1}, headers={"ETag": '"v1"'})
+
+    async def body(client, url):
+        first = await client.get_json(url, if_changed=True)
+        again = await client.get_json(url, if_changed=True)
+        plain = await client.get_json(url)
+        fresh = await client.get_json(url, params={"q": "slow"}, provider="slow")
+        cached = await client.get_json(
+            url, params={"q": "slow"}, provider="slow", if_changed=True
+        )
+        await client.get_json(url, params={"q": "fast"})
+        fast = await client.get_json(url, params={"q": "fast"}, if_changed=True)
+        return first, again, plain, fresh, cached, fast
+
+    first, again, plain, fresh, cached, fast = asyncio.run(_serve(handler, body, cache))
+    assert first == plain == fresh == {"n": 1}
+    assert again is cached is fast is http_client.UNCHANGED
+    # The TTL hit made no request; the others were conditional on the ETag.
+    assert seen_headers == [None, '"v1"', '"v1"', None, None, None]
+    assert cache.stats()[""] == {
+        "hit": 0,
+        "revalidated": 2,
+        "unchanged": 1,
+        "miss": 2,
+    }
+    assert cache.stats()["slow"]["hit"] == 1
+
+
+def test_cache_keys_omit_credentials_and_expire(tmp_path, monkeypatch):
+    key = http_cache.cache_key("GET", "https://x", {"q": "a", "apikey": "s3cret"})
+    assert key == http_cache.cache_key("GET", "https://x", {"q": "a"})
+    assert "s3cret" not in key
+
+    path = str(tmp_path / "cache.sqlite")
+    cache = http_cache.ResponseCache(path, ttls={"slow": 3600}, retain=60)
+    cache.put('GET https://x {"apikey": "s3cret"}', "fast", b"{}", "d")
+    cache.put("GET https://x/page {}", "fast", b"{}", "d")
+    cache.put("GET https://x/slow {}", "slow", b"{}", "d")
+    cache.close()
+
+    now = http_cache.time.time()
+    monkeypatch.setattr(http_cache.time, "time", lambda: now + 600)
+    cache = http_cache.ResponseCache(path, ttls={"slow": 3600}, retain=60)
+    cache.put("GET https://x/new {}", "fast", b"{}", "d")
+    assert cache.prune() == 0
+    rows = cache._conn.execute("SELECT key FROM responses ORDER BY key").fetchall()
+    assert [r[0] for r in rows] == ["GET https://x/new {}", "GET https://x/slow {}"]
@@ -3,6 +3,8 @@ import os
 import sys
 
 import pandas as pd
+import pytest
+import sqlalchemy
 
 os.environ.setdefault("ALPHA_VANTAGE_API_KEY", "test")
 os.environ.setdefault("FRED_API_KEY", "test")
@@ -11,54 +13,361 @@ import importlib  # noqa: E402
 import trading_intel.config as config  # noqa: E402
 
 importlib.reload(config)  # ensure env var picked up
-from trading_intel import ingestion  # noqa: E402
+from trading_intel import http_cache, ingestion  # noqa: E402
+from trading_intel.breaker import breaker_status  # noqa: E402
+from trading_intel.init_db import metadata  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def sqlite_engine(tmp_path, monkeypatch):
+    engine = sqlalchemy.create_engine(f"sqlite:///{tmp_path / 'ti.db'}")
+    metadata.create_all(engine)
+    monkeypatch.setattr(ingestion, "engine", engine)
+    monkeypatch.setattr(ingestion, "seen_posts", ingestion.SeenIds())
+    cache = http_cache.ResponseCache(str(tmp_path / "cache.sqlite"))
+    monkeypatch.setattr(http_cache, "_shared", cache)
+    ingestion.breakers.reset()
+    yield engine
+    ingestion.breakers.reset()
+
+
+class FakeClient:
+    def __init__(self, handler):
+        self.handler = handler
+
+    async def get_json(self, url, **kwargs):
+        return self.handler(url, **kwargs)
+
+    async def post_json(self, url, json, **kwargs):
+        return self.handler(url, json=json, **kwargs)
+
+
+def run_written(coro):
+    """Run a fetch coroutine and wait for the rows it queued."""
+
+    async def runner():
+        try:
+            return await coro
+        finally:
+            await ingestion.close_writer()
+
+    return asyncio.run(runner())
+
+
+def use_client(monkeypatch, handler):
+    monkeypatch.setattr(ingestion, "get_client", lambda: FakeClient(handler))
 
 
 def test_fetch_crypto_error(monkeypatch):
     def fail(*args, **kwargs):
         raise RuntimeError("boom")
 
-    monkeypatch.setattr(ingestion.requests, "get", fail)
+    use_client(monkeypatch, fail)
     df = ingestion.fetch_crypto()
     assert isinstance(df, pd.DataFrame)
     assert df.empty
 
 
+def test_fetch_crypto_requests_delta(monkeypatch, sqlite_engine):
+    now = pd.Timestamp.utcnow().tz_localize(None).floor("h")
+    hours = pd.date_range(end=now, periods=4, freq="h")
+    calls = []
+
+    def fake_get(url, params, **kwargs):
+        calls.append(params["days"])
+        ms = hours.astype("int64") // 10**6
+        return {"prices": [[t, 100.0 + i] for i, t in enumerate(ms)]}
+
+    use_client(monkeypatch, fake_get)
+    monkeypatch.setattr(ingestion, "BACKFILL_DAYS", 10)
+
+    assert len(ingestion.fetch_crypto()) == 4
+    again = ingestion.fetch_crypto()
+
+    assert calls == ["10", "2"]
+    assert again.timestamp.tolist() == [hours[-1]]
+    stored = pd.read_sql_table("price_data", sqlite_engine)
+    assert len(stored) == 4
+    mark = pd.read_sql_table("source_state", sqlite_engine)
+    assert mark.last_timestamp.tolist() == [hours[-1]]
+
+
+def test_fetch_crypto_many_skips_failed_symbols(monkeypatch, sqlite_engine):
+    def fake_get(url, params, provider, **kwargs):
+        assert provider == "coingecko"
+        if "dogecoin" in url:
+            raise RuntimeError("boom")
+        return {"prices": [[1_600_000_000_000, 10.0]]}
+
+    use_client(monkeypatch, fake_get)
+
+    df = ingestion.fetch_crypto_many(["bitcoin", "dogecoin", "ethereum"])
+
+    assert sorted(df.symbol) == ["bitcoin", "ethereum"]
+    stored = pd.read_sql_table("price_data", sqlite_engine)
+    assert sorted(stored.symbol) == ["bitcoin", "ethereum"]
+
+
+def test_open_circuit_skips_source(monkeypatch, sqlite_engine):
+    calls = []
+
+    def fail(url, **kwargs):
+        calls.append(url)
+        raise RuntimeError("503")
+
+    use_client(monkeypatch, fail)
+    monkeypatch.setattr(ingestion.breakers.get("coingecko"), "failure_threshold", 2)
+
+    for _ in range(4):
+        assert ingestion.fetch_crypto().empty
+
+    assert len(calls) == 2
+    breaker = ingestion.breakers.get("coingecko")
+    assert breaker.state == "open"
+    assert breaker.skipped == 2
+
+
+def test_failed_probe_reopens_circuit(monkeypatch, sqlite_engine):
+    breaker = ingestion.breakers.get("coingecko")
+    monkeypatch.setattr(breaker, "failure_threshold", 1)
+    monkeypatch.setattr(breaker, "cooldown", pd.Timedelta(0))
+    breaker.record_failure(RuntimeError("503"))
+
+    def fail(source, symbols):
+        raise sqlalchemy.exc.OperationalError("SELECT", {}, Exception("locked"))
+
+    monkeypatch.setattr(ingestion, "_last_timestamps", fail)
+
+    assert ingestion.fetch_crypto().empty
+    assert breaker.state == "open"
+    assert breaker.failures == 2
+
+
 def test_fetch_stock_error(monkeypatch):
     def fail(*args, **kwargs):
         raise RuntimeError("fail")
 
-    monkeypatch.setattr(ingestion.requests, "get", fail)
+    use_client(monkeypatch, fail)
     df = ingestion.fetch_stock()
     assert isinstance(df, pd.DataFrame)
     assert df.empty
 
 
 def test_fetch_yfinance_error(monkeypatch):
-    class DummyTicker:
-        def __init__(self, *args, **kwargs):
-            pass
-
-        def history(self, *args, **kwargs):
-            raise RuntimeError("yf fail")
+    def download(*args, **kwargs):
+        raise RuntimeError("yf fail")
 
-    dummy = type("mod", (), {"Ticker": DummyTicker})
+    dummy = type("mod", (), {"download": staticmethod(download)})
     monkeypatch.setitem(sys.modules, "yfinance", dummy)
     df = ingestion.fetch_yfinance()
     assert isinstance(df, pd.DataFrame)
     assert df.empty
 
 
+def test_fetch_yfinance_many_single_download(monkeypatch, sqlite_engine):
+    calls = []
+    index = pd.DatetimeIndex(
+        pd.date_range("2021-01-04", periods=2, tz="America/New_York"),
+        name="Date",
+    )
+
+    def download(tickers, **kwargs):
+        calls.append(tickers)
+        frames = {
+            t: pd.DataFrame(
+                {"Open": [1.0, 2.0], "Close": [1.5, 2.5], "Stock Splits": 0.0},
+                index=index,
+            )
+            for t in tickers
+        }
+        return pd.concat(frames, axis=1)
+
+    dummy = type("mod", (), {"download": staticmethod(download)})
+    monkeypatch.setitem(sys.modules, "yfinance", dummy)
+
+    df = ingestion.fetch_yfinance_many(["SPY", "QQQ"])
+
+    assert calls == [["SPY", "QQQ"]]
+    assert sorted(set(df.symbol)) == ["QQQ", "SPY"]
+    assert df.timestamp.dt.tz is None
+    stored = pd.read_sql_table("price_data", sqlite_engine)
+    assert len(stored) == 4
+    assert stored.stock_splits.notna().all()
+
+    # Once the window starts at the stored mark, the same download again is
+    # recognised by its hash and not rewritten.
+    assert len(ingestion.fetch_yfinance_many(["SPY", "QQQ"])) == 2
+    assert ingestion.fetch_yfinance_many(["SPY", "QQQ"]).empty
+    assert http_cache.shared_cache().stats()["yfinance"]["unchanged"] == 1
+
+
 def test_fetch_fred_error(monkeypatch):
     def fail(*args, **kwargs):
         raise RuntimeError("fred fail")
 
-    monkeypatch.setattr(ingestion.requests, "get", fail)
+    use_client(monkeypatch, fail)
     df = ingestion.fetch_fred()
     assert isinstance(df, pd.DataFrame)
     assert df.empty
 
 
+def test_fetch_eth_chain_resumes_in_batches(monkeypatch, sqlite_engine):
+    batches = []
+
+    def fake_rpc(url, json, **kwargs):
+        batches.append(json)
+        replies = []
+        for call in json:
+            if call["method"] == "eth_blockNumber":
+                result = hex(110)
+            else:
+                n = int(call["params"][0], 16)
+                result = {
+                    "number": hex(n),
+                    "timestamp": hex(1_600_000_000 + 12 * n),
+                    "gasUsed": hex(1000 + n),
+                    "gasLimit": hex(30_000_000),
+                    "baseFeePerGas": hex(7),
+                    "transactions": ["0xab"] * 3,
+                    "size": hex(512),
+                }
+            replies.append({"jsonrpc": "2.0", "id": call["id"], "result": result})
+        return replies[::-1]  # batch replies may come in any order
+
+    use_client(monkeypatch, fake_rpc)
+    monkeypatch.setattr(ingestion, "ONCHAIN_BATCH_SIZE", 4)
+    monkeypatch.setattr(ingestion, "ONCHAIN_BACKFILL_BLOCKS", 10)
+    df = ingestion.fetch_eth_chain()
+    assert df.number.tolist() == list(range(101, 111))
+    assert [len(b) for b in batches] == [1, 4, 4, 2]
+
+    batches.clear()
+    # Nothing new until the head moves: only the head is requested.
+    assert ingestion.fetch_eth_chain().empty
+    assert [len(b) for b in batches] == [1]
+    stored = pd.read_sql("SELECT * FROM onchain_data", sqlite_engine)
+    assert len(stored) == 10
+    assert stored.tx_count.unique().tolist() == [3]
+    assert stored.gas_used.iloc[0] == 1101
+
+
+def test_fetch_eth_chain_stops_at_unseen_block(monkeypatch, sqlite_engine):
+    seen = {"upto": 105}
+
+    def fake_rpc(url, json, **kwargs):
+        replies = []
+        for call in json:
+            if call["method"] == "eth_blockNumber":
+                result = hex(110)
+            elif int(call["params"][0], 16) > seen["upto"]:
+                result = None
+            else:
+                n = int(call["params"][0], 16)
+                result = {
+                    "number": hex(n),
+                    "timestamp": hex(1_600_000_000 + 12 * n),
+                    "gasUsed": hex(1000),
+                    "gasLimit": hex(30_000_000),
+                    "transactions": [],
+                    "size": hex(512),
+                }
+            replies.append({"jsonrpc": "2.0", "id": call["id"], "result": result})
+        return replies
+
+    use_client(monkeypatch, fake_rpc)
+    monkeypatch.setattr(ingestion, "ONCHAIN_BATCH_SIZE", 4)
+    monkeypatch.setattr(ingestion, "ONCHAIN_BACKFILL_BLOCKS", 10)
+
+    assert ingestion.fetch_eth_chain().number.tolist() == list(range(101, 106))
+    assert ingestion.breakers.get("eth_chain").failures == 0
+    seen["upto"] = 110
+    assert ingestion.fetch_eth_chain().number.tolist() == list(range(106, 111))
+
+
+def test_fetch_eth_chain_rpc_error(monkeypatch):
+    def fake_rpc(url, json, **kwargs):
+        return [{"jsonrpc": "2.0", "id": 0, "error": {"code": -32000}}]
+
+    use_client(monkeypatch, fake_rpc)
+    assert ingestion.fetch_eth_chain().empty
+    assert ingestion.breakers.get("eth_chain").failures == 1
+
+
+def reddit_listing(posts):
+    """Fake ``/new`` endpoint over ``posts``, newest first, 2 per page."""
+    requests = []
+
+    def fake_get(url, params, **kwargs):
+        sub = url.split("/")[-2]
+        requests.append((sub, params.get("after")))
+        ours = [p for p in posts if p["sub"] == sub]
+        start = 0
+        if params.get("after"):
+            start = [p["id"] for p in ours].index(params["after"]) + 1
+        page = ours[start : start + 2]  # noqa: E203
+        after = page[-1]["id"] if start + 2 < len(ours) else None
+        return {
+            "data": {
+                "after": after,
+                "children": [{"data": p} for p in page],
+            }
+        }
+
+    return fake_get, requests
+
+
+def test_fetch_reddit_pages_back_to_mark(monkeypatch, sqlite_engine):
+    monkeypatch.setattr(ingestion, "ingest_posts", lambda df, engine: None)
+    now = pd.Timestamp.utcnow().tz_localize(None).floor("min")
+    posts = [
+        {
+            "id": f"{sub}{i}",
+            "created_utc": (now - pd.Timedelta(minutes=i)).timestamp(),
+            "title": "t",
+            "sub": sub,
+        }
+        for sub in ("a", "b")
+        for i in range(5)
+    ]
+    fake_get, requests = reddit_listing(posts)
+    use_client(monkeypatch, fake_get)
+
+    df = run_written(ingestion.afetch_reddit_many(["a", "b"], limit=2))
+    assert len(df) == 10
+    assert [r for r in requests if r[0] == "a"] == [
+        ("a", None),
+        ("a", "a1"),
+        ("a", "a3"),
+    ]
+
+    # Two newer posts in "a": the next run stops at the stored mark and
+    # only the posts not stored yet are written.
+    for i in (1, 2):
+        posts.insert(
+            0,
+            {
+                "id": f"new{i}",
+                "created_utc": (now + pd.Timedelta(minutes=i)).timestamp(),
+                "title": "t",
+                "sub": "a",
+            },
+        )
+    requests.clear()
+    ingestion.seen_posts = ingestion.SeenIds()  # as after a restart
+    run_written(ingestion.afetch_reddit_many(["a"], limit=2))
+    assert requests == [("a", None), ("a", "new1")]
+    stored = pd.read_sql("SELECT id FROM reddit_data", sqlite_engine)
+    assert len(stored) == 12
+    assert "a0" in ingestion.seen_posts
+
+
+def test_seen_ids_evicts_oldest():
+    seen = ingestion.SeenIds(capacity=2)
+    seen.add(["a", "b", "c"])
+    assert "a" not in seen
+    assert "c" in seen and len(seen) == 2
+
+
 def test_fetch_dune_error(monkeypatch):
     class DummyClient:
         def __init__(self, *args, **kwargs):
@@ -73,17 +382,40 @@ def test_fetch_dune_error(monkeypatch):
     assert df.empty
 
 
-def test_fetch_all(monkeypatch):
-    def ok(*args, **kwargs):
+def test_write_dune_upserts_results(sqlite_engine):
+    # Left by earlier versions, which appended every result.
+    pd.DataFrame(
+        {"timestamp": ["2021-01-01 00:00:00.000 UTC"] * 2, "tvl": 1.0, "query_id": 1}
+    ).to_sql("dune_data", sqlite_engine, index=False)
+    result = pd.DataFrame(
+        {
+            "timestamp": ["2021-01-01 00:00:00.000 UTC", "2021-01-02 00:00:00.000 UTC"],
+            "tvl": [1.5, 2.0],
+            "query_id": 1,
+        }
+    )
+
+    for _ in range(2):
+        with sqlite_engine.begin() as conn:
+            ingestion._write_dune(conn, [("dune", result)])
+
+    stored = pd.read_sql("SELECT * FROM dune_data ORDER BY timestamp", sqlite_engine)
+    assert stored.tvl.tolist() == [1.5, 2.0]
+
+
+def test_fetch_all(monkeypatch, sqlite_engine):
+    async def ok(*args, **kwargs):
         return pd.DataFrame({"x": [1]})
 
-    monkeypatch.setattr(ingestion, "fetch_crypto", ok)
-    monkeypatch.setattr(ingestion, "fetch_stock", ok)
-    monkeypatch.setattr(ingestion, "fetch_yfinance", ok)
-    monkeypatch.setattr(ingestion, "fetch_fred", ok)
-    monkeypatch.setattr(ingestion, "fetch_eth_chain", ok)
-    monkeypatch.setattr(ingestion, "fetch_dune", ok)
-    monkeypatch.setattr(ingestion, "fetch_reddit", ok)
+    monkeypatch.setattr(ingestion, "afetch_crypto_many", ok)
+    monkeypatch.setattr(ingestion, "afetch_stock_many", ok)
+    monkeypatch.setattr(ingestion, "afetch_yfinance_many", ok)
+    monkeypatch.setattr(ingestion, "afetch_fred_many", ok)
+    monkeypatch.setattr(ingestion, "afetch_eth_chain", ok)
+    monkeypatch.setattr(ingestion, "afetch_dune", ok)
+    monkeypatch.setattr(ingestion, "afetch_reddit_many", ok)
+
+    ingestion.breakers.get("dune").record_failure(RuntimeError("down"))
 
     results = asyncio.run(ingestion.fetch_all())
     assert set(results) == {
@@ -96,3 +428,21 @@ def test_fetch_all(monkeypatch):
         "reddit",
     }
     assert all(isinstance(df, pd.DataFrame) for df in results.values())
+    saved = breaker_status(sqlite_engine)
+    assert saved.set_index("source").failures.to_dict() == {"dune": 1}
+
+
+def test_fetch_all_drops_unwritten_frames(monkeypatch, sqlite_engine):
+    async def fetched(coins):
+        df = pd.DataFrame({"x": [1]})
+        await ingestion.get_writer().put("prices", "coingecko", df)
+        return df
+
+    def fail(conn, items):
+        raise RuntimeError("db down")
+
+    monkeypatch.setattr(ingestion, "afetch_crypto_many", fetched)
+    monkeypatch.setitem(ingestion.WRITE_HANDLERS, "prices", fail)
+
+    results = asyncio.run(ingestion.fetch_all(["crypto"]))
+    assert results["crypto"].empty
@@ -0,0 +1,58 @@
+from datetime import datetime
+
+import pandas as pd
+import sqlalchemy
+
+from trading_intel import init_db
+
+
+def test_dedup_tables_keeps_latest_row(monkeypatch):
+    engine = sqlalchemy.create_engine("sqlite://")
+    monkeypatch.setattr(init_db, "engine", engine)
+    with engine.begin() as conn:
+        conn.exec_driver_sql(
+            "CREATE TABLE price_data (id INTEGER PRIMARY KEY, timestamp "
+            "DATETIME, price FLOAT, symbol VARCHAR, type VARCHAR)"
+        )
+        conn.exec_driver_sql(
+            "INSERT INTO price_data (timestamp, price, symbol, type) VALUES "
+            "('2021-01-01 00:00:00', 1, 'btc', 'crypto'), "
+            "('2021-01-01 00:00:00', 2, 'btc', 'crypto'), "
+            "('2021-01-01 01:00:00', 3, 'btc', 'crypto')"
+        )
+
+    assert init_db.dedup_tables() == 1
+
+    stored = pd.read_sql_table("price_data", engine)
+    assert stored.price.tolist() == [2.0, 3.0]
+    indexes = sqlalchemy.inspect(engine).get_indexes("price_data")
+    assert any(i["unique"] for i in indexes)
+
+
+def test_migrate_onchain_moves_untyped_table(monkeypatch):
+    engine = sqlalchemy.create_engine("sqlite://")
+    monkeypatch.setattr(init_db, "engine", engine)
+    pd.DataFrame({"number": [1], "gasUsed": [21000], "hash": ["0x"]}).to_sql(
+        "onchain_data", engine, index=False
+    )
+
+    assert init_db.migrate_onchain()
+    assert not init_db.migrate_onchain()
+
+    inspector = sqlalchemy.inspect(engine)
+    assert inspector.has_table("onchain_data_legacy")
+    columns = {c["name"] for c in inspector.get_columns("onchain_data")}
+    assert {"number", "gas_used", "base_fee", "tx_count"} <= columns
+
+
+def test_partitions_only_on_postgresql(monkeypatch):
+    engine = sqlalchemy.create_engine("sqlite://")
+    monkeypatch.setattr(init_db, "engine", engine)
+    init_db.create_tables()
+
+    assert init_db.ensure_partitions() == []
+    assert not init_db.partition_prices()
+    assert init_db.dedup_tables() == 0
+    assert init_db.add_months(init_db.month_start(datetime(2021, 11, 20)), 3) == (
+        datetime(2022, 2, 1)
+    )
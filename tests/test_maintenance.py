@@ -0,0 +1,84 @@
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import sqlalchemy
+
+from trading_intel import maintenance
+from trading_intel.init_db import add_months, metadata, month_start
+
+
+def prices(timestamps, **columns):
+    return pd.DataFrame({"timestamp": pd.to_datetime(timestamps), **columns}).assign(
+        symbol=columns.get("symbol", "btc"), type="crypto"
+    )
+
+
+def bars_of(engine, table):
+    return pd.read_sql(f"SELECT * FROM {table} ORDER BY bucket", engine)
+
+
+def test_bars_aggregate_ohlcv():
+    rows = pd.concat(
+        [
+            prices(
+                ["2021-01-01 00:10", "2021-01-01 00:50", "2021-01-01 00:30"],
+                price=[2.0, 4.0, 1.0],
+            ),
+            prices(
+                ["2021-01-01 01:00"],
+                open=[10.0],
+                high=[12.0],
+                low=[9.0],
+                close=[11.0],
+                volume=[5.0],
+                symbol="AAPL",
+            ),
+        ],
+        ignore_index=True,
+    )
+
+    out = maintenance.bars(rows, "1h").set_index("symbol")
+
+    btc = out.loc["btc"]
+    assert (btc.open, btc.high, btc.low, btc.close) == (2.0, 4.0, 1.0, 4.0)
+    assert btc["count"] == 3 and np.isnan(btc.volume)
+    aapl = out.loc["AAPL"]
+    assert (aapl.open, aapl.high, aapl.low, aapl.close) == (10, 12, 9, 11)
+    assert aapl.volume == 5.0
+
+
+def test_refresh_rollups_is_incremental(monkeypatch):
+    engine = sqlalchemy.create_engine("sqlite://")
+    metadata.create_all(engine)
+    prices(
+        pd.date_range("2021-01-30 20:00", periods=12, freq="h"),
+        price=np.arange(12.0),
+    ).to_sql("price_data", engine, if_exists="append", index=False)
+
+    assert maintenance.refresh_rollups(engine) == {"1h": 12, "1d": 2}
+    daily = bars_of(engine, "price_1d")
+    assert daily.close.tolist() == [3.0, 11.0]
+    assert daily["count"].tolist() == [4, 8]
+
+    # A revised last row only changes the recent bars.
+    with engine.begin() as conn:
+        conn.exec_driver_sql("UPDATE price_data SET price = 100 WHERE price = 11")
+    monkeypatch.setattr(maintenance, "ROLLUP_LOOKBACK_DAYS", 0)
+    assert maintenance.refresh_rollups(engine) == {"1h": 1, "1d": 1}
+    assert bars_of(engine, "price_1d").close.tolist() == [3.0, 100.0]
+    assert bars_of(engine, "price_1h").high.tolist()[-1] == 100.0
+
+
+def test_expire_prices_deletes_old_rows_without_partitions():
+    engine = sqlalchemy.create_engine("sqlite://")
+    metadata.create_all(engine)
+    cutoff = add_months(month_start(datetime.utcnow()), -2)
+    prices([add_months(cutoff, -1), cutoff, datetime.utcnow()], price=[1, 2, 3]).to_sql(
+        "price_data", engine, if_exists="append", index=False
+    )
+
+    assert maintenance.expire_prices(engine, retention_months=0) == []
+    assert maintenance.expire_prices(engine, retention_months=2) == ["price_data"]
+    kept = pd.read_sql("SELECT price FROM price_data", engine)
+    assert kept.price.tolist() == [2.0, 3.0]
@@ -1,24 +1,86 @@
+import logging
+
+import numpy as np
 import pandas as pd
+import sqlalchemy
+import torch
 
-from trading_intel import modeling
+from trading_intel import feature_store, modeling
+from trading_intel.indicators import feature_columns
+from trading_intel.sequences import SequenceDataset
 
 
-def test_train_creates_model(tmp_path, monkeypatch):
+def features(start, periods=5):
     df = pd.DataFrame(
-        {
-            "price_diff": [0.1, 0.2, 0.3, 0.4, 0.5],
-            "ema_12": [1, 2, 3, 4, 5],
-            "sentiment_score": [0.1, 0.2, 0.3, 0.4, 0.5],
-        }
+        {col: np.linspace(0.1, 0.5, periods) for col in feature_columns()}
     )
+    df["sma_50"] = float("nan")
+    df["symbol"] = "btc"
+    df["type"] = "crypto"
+    df["timestamp"] = pd.date_range(start, periods=periods, freq="h")
+    return df
 
-    def fake_read_sql(table, engine):
-        return df.copy()
 
-    monkeypatch.setattr(modeling.pd, "read_sql", fake_read_sql)
+def use_tmp_store(tmp_path, monkeypatch):
+    engine = sqlalchemy.create_engine("sqlite://")
+    monkeypatch.setattr(modeling, "engine", engine)
+    monkeypatch.setattr(feature_store, "store_dir", tmp_path / "store")
     monkeypatch.setattr(modeling, "lstm_path", tmp_path / "lstm.pth")
     monkeypatch.setattr(modeling, "range", lambda n: range(1))
+    monkeypatch.setattr(modeling, "SEQ_LEN", 2)
+    return engine
+
+
+def test_train_creates_model(tmp_path, monkeypatch, caplog):
+    caplog.set_level(logging.INFO)
+    engine = use_tmp_store(tmp_path, monkeypatch)
+    features("2021-01-31 22:00").to_sql("features", engine, index=False)
 
     modeling.train()
 
     assert modeling.lstm_path.exists()
+    assert len(list((tmp_path / "store").glob("symbol=btc/type=*/*.arrow"))) == 2
+    assert "samples/s" in caplog.text
+    checkpoint = modeling.load_checkpoint()
+    assert checkpoint["watermark"] == "2021-02-01T02:00:00"
+    assert checkpoint["optimizer"]["state"]
+
+
+def test_incremental_train_fine_tunes_new_rows(tmp_path, monkeypatch, caplog):
+    caplog.set_level(logging.INFO)
+    engine = use_tmp_store(tmp_path, monkeypatch)
+    features("2021-01-31 22:00").to_sql("features", engine, index=False)
+    # An old plain state_dict cannot be fine-tuned.
+    torch.save(
+        modeling.SimpleLSTM(len(feature_columns())).state_dict(),
+        modeling.lstm_path,
+    )
+    modeling.train(incremental=True)
+    assert "training from scratch" in caplog.text
+
+    features("2021-02-01 03:00", periods=10).to_sql(
+        "features", engine, index=False, if_exists="append"
+    )
+    caplog.clear()
+    modeling.train(incremental=True)
+
+    assert "Fine-tuning on 8 new windows and 3 replayed ones" in caplog.text
+    checkpoint = modeling.load_checkpoint()
+    assert checkpoint["watermark"] == "2021-02-01T12:00:00"
+    assert not list(tmp_path.glob("*.tmp"))
+
+    caplog.clear()
+    modeling.train(incremental=True)
+    assert "No new feature rows" in caplog.text
+
+
+def test_loader_yields_batches_of_windows():
+    X = np.arange(20, dtype=np.float32).reshape(10, 2)
+    dataset = SequenceDataset(X, np.array([0, 10]), seq_len=3, target=np.arange(10.0))
+    idx = np.arange(len(dataset))
+
+    batches = list(modeling._loader(dataset, idx, 4, 0, shuffle=False))
+
+    assert [tuple(w.shape) for w, _ in batches] == [(4, 3, 2), (3, 3, 2)]
+    assert isinstance(batches[0][0], torch.Tensor)
+    assert torch.cat([y for _, y in batches]).tolist() == list(np.arange(3.0, 10.0))
@@ -0,0 +1,114 @@
+import asyncio
+import json
+
+import numpy as np
+import pandas as pd
+import sqlalchemy
+
+from trading_intel import pipeline as pipeline_mod
+from trading_intel.features import compute_features
+from trading_intel.init_db import metadata
+
+
+def _prices(start, prices):
+    return pd.DataFrame(
+        {
+            "timestamp": pd.date_range(start, periods=len(prices), freq="h"),
+            "price": list(prices),
+            "symbol": "bitcoin",
+            "type": "crypto",
+        }
+    )
+
+
+def _engine(tmp_path):
+    engine = sqlalchemy.create_engine(f"sqlite:///{tmp_path / 'ti.db'}")
+    metadata.create_all(engine)
+    pd.DataFrame(
+        {
+            "sub": "CryptoCurrency",
+            "hour": pd.to_datetime(["2021-01-01 01:00"]),
+            "compound_mean": [0.5],
+            "post_count": [2],
+            "compound_min": [0.1],
+            "compound_max": [0.9],
+        }
+    ).to_sql("sentiment_hourly", engine, if_exists="append", index=False)
+    return engine
+
+
+def test_update_computes_only_new_rows(monkeypatch, tmp_path):
+    engine = _engine(tmp_path)
+    monkeypatch.setattr(pipeline_mod, "create_features", lambda: None)
+    pipe = pipeline_mod.FeaturePipeline(engine, buffer_rows=3)
+    first = _prices("2021-01-01", [100.0, 110.0, 120.0])
+    # Overlaps the first fetch: only the last two rows are new.
+    second = _prices("2021-01-01 02:00", [120.0, 130.0, 125.0])
+
+    async def run():
+        a = await pipe.update(first)
+        b = await pipe.update(second)
+        await pipe.flush()
+        return a, b
+
+    a, b = asyncio.run(run())
+
+    assert len(a) == 2 and len(b) == 2
+    history = pd.concat([first, second.iloc[1:]], ignore_index=True)
+    history["sentiment_score"] = np.where(history.timestamp.dt.hour == 1, 0.5, 0.0)
+    expected, _ = compute_features(history)
+    np.testing.assert_allclose(pd.concat([a, b]).ema_12, expected.ema_12.iloc[1:])
+    assert a.sentiment_score.tolist() == [0.5, 0.0]
+
+    assert pipe.recent("bitcoin", "crypto").price.iloc[-1] == 125.0
+    assert len(pipe.recent("bitcoin", "crypto")) == 3
+    stored = pd.read_sql_table("features", engine)
+    assert len(stored) == 4
+    state = pd.read_sql_table("feature_state", engine)
+    assert state.watermark.tolist() == [pd.Timestamp("2021-01-01 04:00")]
+
+    restored = pipeline_mod.FeaturePipeline(engine, buffer_rows=3)
+    restored.load()
+    assert restored.states.keys() == pipe.states.keys()
+    for key, state in pipe.states.items():
+        assert json.dumps(restored.states[key]) == json.dumps(state)
+    assert restored.recent("bitcoin", "crypto").price.iloc[-1] == 125.0
+    assert asyncio.run(restored.update(second)).empty
+
+
+def test_failed_write_is_recomputed(monkeypatch, tmp_path):
+    engine = _engine(tmp_path)
+    monkeypatch.setattr(pipeline_mod, "create_features", lambda: None)
+    pipe = pipeline_mod.FeaturePipeline(engine, buffer_rows=3)
+    write_frame = pipeline_mod.write_frame
+    failures = iter([RuntimeError("disk full")])
+
+    def flaky_write(df, table, conn):
+        error = next(failures, None)
+        if error is not None:
+            raise error
+        write_frame(df, table, conn)
+
+    monkeypatch.setattr(pipeline_mod, "write_frame", flaky_write)
+    first = _prices("2021-01-01", [100.0, 110.0, 120.0])
+    second = _prices("2021-01-01 03:00", [130.0, 125.0])
+
+    async def run():
+        await pipe.update(first)
+        await pipe.flush()
+        assert not pipe.loaded
+        rows = await pipe.update(second)
+        await pipe.flush()
+        return rows
+
+    rows = asyncio.run(run())
+
+    assert len(rows) == 4
+    stored = pd.read_sql_table("features", engine)
+    assert len(stored) == 4
+    history = pd.concat([first, second], ignore_index=True)
+    history["sentiment_score"] = np.where(history.timestamp.dt.hour == 1, 0.5, 0.0)
+    expected, _ = compute_features(history)
+    np.testing.assert_allclose(stored.ema_12, expected.ema_12.iloc[1:])
+    state = pd.read_sql_table("feature_state", engine)
+    assert state.watermark.tolist() == [pd.Timestamp("2021-01-01 04:00")]
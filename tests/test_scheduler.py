@@ -0,0 +1,19 @@
+from trading_intel.scheduler import CadenceScheduler
+
+
+def test_sources_run_on_their_own_cadence():
+    now = [0.0]
+    scheduler = CadenceScheduler(
+        {"crypto": 300, "reddit": 900, "fred": 86400, "dune": 0},
+        clock=lambda: now[0],
+    )
+
+    assert sorted(scheduler.due()) == ["crypto", "fred", "reddit"]
+    assert scheduler.due() == []
+    assert scheduler.next_due_in() == 300
+
+    now[0] = 600
+    assert scheduler.due() == ["crypto"]
+    now[0] = 900
+    assert sorted(scheduler.due()) == ["crypto", "reddit"]
+    assert scheduler.next_due_in() == 300
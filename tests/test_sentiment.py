@@ -0,0 +1,87 @@
+import pandas as pd
+import pytest
+import sqlalchemy
+
+from trading_intel import sentiment
+
+
+def _posts(titles, minutes):
+    return pd.DataFrame(
+        {
+            "id": [f"p{m}" for m in minutes],
+            "timestamp": [
+                pd.Timestamp("2021-01-01 10:00") + pd.Timedelta(minutes=m)
+                for m in minutes
+            ],
+            "title": titles,
+            "selftext": "",
+            "sub": "CryptoCurrency",
+        }
+    )
+
+
+def test_ingest_posts_merges_batches(monkeypatch):
+    scores = {"good": 0.8, "bad": -0.4, "meh": 0.1}
+    monkeypatch.setattr(sentiment, "score", lambda text: scores[text])
+    engine = sqlalchemy.create_engine("sqlite://")
+
+    assert sentiment.ingest_posts(_posts(["good", "bad"], [5, 10]), engine)
+    sentiment.ingest_posts(_posts(["meh", "good"], [20, 70]), engine)
+
+    rollup = pd.read_sql_table("sentiment_hourly", engine).sort_values("hour")
+    first = rollup.iloc[0]
+    assert first.hour == pd.Timestamp("2021-01-01 10:00")
+    assert first.post_count == 3
+    assert abs(first.compound_mean - 0.5 / 3) < 1e-12
+    assert (first.compound_min, first.compound_max) == (-0.4, 0.8)
+    assert rollup.iloc[1].post_count == 1
+    scored = pd.read_sql_table("reddit_sentiment", engine)
+    assert len(scored) == 4
+    assert set(scored["mode"]) == {"title"}
+
+
+def test_backfill_and_rebuild_from_stored_scores(monkeypatch):
+    monkeypatch.setattr(sentiment, "score", lambda text: len(text) / 10)
+    engine = sqlalchemy.create_engine("sqlite://")
+    posts = _posts(["ab", "abcd"], [0, 30])
+    posts.to_sql("reddit_data", engine, index=False)
+
+    assert sentiment.backfill_scores(engine, workers=1) == 2
+    assert sentiment.backfill_scores(engine, workers=1) == 0
+    assert sentiment.rebuild_hourly(engine) == 1
+
+    rollup = pd.read_sql_table("sentiment_hourly", engine)
+    assert rollup.post_count.iloc[0] == 2
+    assert abs(rollup.compound_mean.iloc[0] - 0.3) < 1e-12
+
+
+def test_failed_rescore_keeps_scores(monkeypatch):
+    monkeypatch.setattr(sentiment, "score", lambda text: len(text) / 10)
+    engine = sqlalchemy.create_engine("sqlite://")
+    _posts(["ab", "abcd"], [0, 30]).to_sql("reddit_data", engine, index=False)
+    sentiment.backfill_scores(engine, workers=1)
+
+    def fail(text):
+        raise RuntimeError("model missing")
+
+    monkeypatch.setattr(sentiment, "score", fail)
+    with pytest.raises(RuntimeError):
+        sentiment.backfill_scores(engine, workers=1, rescore=True)
+    assert len(pd.read_sql_table("reddit_sentiment", engine)) == 2
+
+    monkeypatch.setattr(sentiment, "score", lambda text: -1.0)
+    assert sentiment.backfill_scores(engine, workers=1, rescore=True) == 2
+    scored = pd.read_sql_table("reddit_sentiment", engine)
+    assert scored.compound.tolist() == [-1.0, -1.0]
+
+
+def test_post_text_with_selftext():
+    posts = pd.DataFrame({"title": ["Up", "Down"], "selftext": ["big", None]})
+    assert sentiment.post_text(posts, include_selftext=False).tolist() == [
+        "Up",
+        "Down",
+    ]
+    assert sentiment.post_text(posts, include_selftext=True).tolist() == [
+        "Up\nbig",
+        "Down",
+    ]
@@ -0,0 +1,46 @@
+import numpy as np
+import pandas as pd
+
+from trading_intel.sequences import SequenceDataset, blocks, last_windows
+
+
+def test_windows_stay_inside_symbols_without_copying():
+    X = np.arange(14, dtype=np.float32).reshape(7, 2)
+    symbol = np.array(["a", "a", "a", "a", "b", "b", "b"])
+    target = np.arange(7, dtype=np.float32) * 10
+
+    bounds = blocks(symbol)
+    dataset = SequenceDataset(X, bounds, seq_len=2, target=target)
+
+    assert bounds.tolist() == [0, 4, 7]
+    assert np.shares_memory(dataset.view, X)
+    # Windows end at rows 1 and 2 of "a" and row 5 of "b"; each is
+    # labelled with the next row of its own symbol.
+    assert dataset.ends.tolist() == [1, 2, 5]
+    window, label = dataset[2]
+    assert window.tolist() == [[8, 9], [10, 11]] and label == 60
+    windows, labels = dataset.batch(np.arange(len(dataset)))
+    assert windows.shape == (3, 2, 2)
+    assert labels.tolist() == [20, 30, 60]
+
+
+def test_blocks_split_on_every_key():
+    symbol = np.array(["a", "a", "a"])
+    type_ = np.array(["crypto", "stock", "stock"])
+
+    assert blocks(symbol, type_).tolist() == [0, 1, 3]
+    assert blocks(np.array([])).tolist() == [0, 0]
+
+
+def test_last_windows_per_symbol():
+    frames = [
+        pd.DataFrame({"x": [1.0, 2.0, 3.0], "y": [None, 5.0, 6.0]}),
+        pd.DataFrame({"x": [7.0], "y": [8.0]}),
+        pd.DataFrame({"x": [9.0, 10.0], "y": [11.0, 12.0]}),
+    ]
+
+    windows, found = last_windows(frames, ["x", "y"], seq_len=2)
+
+    assert found == [0, 2]
+    assert windows.dtype == np.float32
+    assert windows.tolist() == [[[2, 5], [3, 6]], [[9, 11], [10, 12]]]
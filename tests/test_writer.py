@@ -0,0 +1,140 @@
+import asyncio
+import threading
+
+import pandas as pd
+import sqlalchemy
+
+from trading_intel.writer import BatchWriter
+
+
+def frame(n):
+    return pd.DataFrame({"x": range(n)})
+
+
+def test_flush_coalesces_frames_per_target():
+    engine = sqlalchemy.create_engine("sqlite://")
+    calls, committed = [], []
+
+    def prices(conn, items):
+        calls.append(("prices", [(s, len(df)) for s, df in items]))
+        return lambda: committed.append("prices")
+
+    def posts(conn, items):
+        calls.append(("posts", [(s, len(df)) for s, df in items]))
+
+    async def body():
+        writer = BatchWriter(engine, {"prices": prices, "posts": posts})
+        await writer.put("prices", "fred", frame(2))
+        await writer.put("posts", "reddit", frame(1))
+        await writer.put("prices", "coingecko", frame(3))
+        await writer.put("prices", "fred", frame(0))  # ignored
+        await writer.close()
+        return writer.flushes
+
+    assert asyncio.run(body()) == 1
+    assert calls == [
+        ("prices", [("fred", 2), ("coingecko", 3)]),
+        ("posts", [("reddit", 1)]),
+    ]
+    assert committed == ["prices"]
+
+
+def test_flushes_on_size_and_time():
+    engine = sqlalchemy.create_engine("sqlite://")
+    sizes = []
+
+    def handler(conn, items):
+        sizes.append(sum(len(df) for _, df in items))
+
+    async def body():
+        writer = BatchWriter(engine, {"t": handler}, batch_rows=5, flush_interval=0.05)
+        await writer.put("t", "a", frame(3))
+        await writer.put("t", "a", frame(3))  # reaches batch_rows
+        await writer.put("t", "a", frame(1))
+        await asyncio.sleep(0.3)  # flushed by age
+        assert sizes == [6, 1]
+        await writer.close()
+
+    asyncio.run(body())
+
+
+def test_full_queue_slows_producers():
+    engine = sqlalchemy.create_engine("sqlite://")
+    release = threading.Event()
+
+    def slow(conn, items):
+        release.wait(5)
+
+    async def body():
+        writer = BatchWriter(engine, {"t": slow}, queue_size=1, batch_rows=1)
+        await writer.put("t", "a", frame(1))  # taken and being written
+        await asyncio.sleep(0.05)
+        await writer.put("t", "a", frame(1))  # fills the queue
+        blocked = asyncio.create_task(writer.put("t", "a", frame(1)))
+        await asyncio.sleep(0.05)
+        assert not blocked.done()
+        release.set()
+        await blocked
+        await writer.close()
+        return writer.flushes
+
+    assert asyncio.run(body()) == 3
+
+
+def test_failed_flush_reports_sources():
+    engine = sqlalchemy.create_engine("sqlite://")
+    errors = []
+
+    def fail(conn, items):
+        raise RuntimeError("db down")
+
+    async def body():
+        writer = BatchWriter(
+            engine,
+            {"t": fail},
+            on_error=lambda sources, exc: errors.append(sources),
+        )
+        await writer.put("t", "fred", frame(1))
+        await writer.put("t", "coingecko", frame(1))
+        await writer.close()
+        return writer
+
+    writer = asyncio.run(body())
+    assert writer.flushes == 0
+    assert writer.failed == {"coingecko", "fred"}
+    assert errors == [["coingecko", "fred"]]
+
+
+def test_failed_target_keeps_other_targets(tmp_path):
+    engine = sqlalchemy.create_engine(f"sqlite:///{tmp_path / 'ti.db'}")
+    with engine.begin() as conn:
+        conn.exec_driver_sql("CREATE TABLE ok (x INTEGER)")
+
+    def good(conn, items):
+        for _, df in items:
+            df.to_sql("ok", conn, if_exists="append", index=False)
+
+    def bad(conn, items):
+        conn.exec_driver_sql("INSERT INTO ok VALUES (99)")
+        raise RuntimeError("columns drifted")
+
+    def broken_callback(sources, exc):
+        raise RuntimeError("callback bug")
+
+    async def body():
+        writer = BatchWriter(
+            engine, {"good": good, "bad": bad}, on_error=broken_callback
+        )
+        await writer.put("good", "fred", frame(2))
+        await writer.put("bad", "dune", frame(1))
+        await writer.flush()
+        # The writer task survived the failing callback.
+        await writer.put("good", "fred", frame(1))
+        await writer.close()
+        return writer
+
+    writer = asyncio.run(body())
+    assert writer.failed == {"dune"}
+    assert writer.flushes == 2
+    stored = pd.read_sql("SELECT x FROM ok", engine)
+    assert stored.x.tolist() == [0, 1, 0]
@@ -0,0 +1,182 @@
+import logging
+from datetime import timedelta
+
+import pandas as pd
+import sqlalchemy
+from sqlalchemy.exc import DatabaseError
+
+from .config import ALIGN_MAX_STALENESS, DUNE_METRICS, DUNE_TIME_COLUMN, FRED_SERIES
+
+logger = logging.getLogger(__name__)
+
+ONCHAIN_COLUMNS = ["gas_used", "base_fee", "tx_count"]
+
+
+def _quote(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+
+class AlignedSource:
+    """A slower-moving table attached to price rows by an as-of join.
+
+    ``load(conn, start, end)`` returns the source's ``timestamp`` column
+    and value ``columns`` for observations between ``start`` and ``end``;
+    each price row receives the latest of them at or before its own
+    timestamp, unless that is older than ``staleness``.
+    """
+
+    def __init__(self, name, columns, staleness, load):
+        self.name = name
+        self.columns = columns
+        self.staleness = staleness
+        self.load = load
+
+
+def _fred_loader(series: str):
+    query = sqlalchemy.text(
+        """
+        SELECT timestamp, price FROM price_data
+        WHERE type = 'fred' AND symbol = :series
+          AND timestamp >= :start AND timestamp <= :end
+        ORDER BY timestamp
+        """
+    ).bindparams(
+        sqlalchemy.bindparam("start", type_=sqlalchemy.DateTime),
+        sqlalchemy.bindparam("end", type_=sqlalchemy.DateTime),
+    )
+
+    def load(conn, start, end):
+        rows = conn.execute(query, {"series": series, "start": start, "end": end})
+        df = pd.DataFrame(rows.all(), columns=["timestamp", "value"])
+        return df.rename(columns={"value": f"fred_{series.lower()}"})
+
+    return load
+
+
+_ONCHAIN_QUERY = sqlalchemy.text(
+    f"""
+    SELECT timestamp,
+           {", ".join(ONCHAIN_COLUMNS)}
+    FROM onchain_data
+    WHERE timestamp >= :start AND timestamp <= :end
+    ORDER BY timestamp
+    """
+).bindparams(
+    sqlalchemy.bindparam("start", type_=sqlalchemy.DateTime),
+    sqlalchemy.bindparam("end", type_=sqlalchemy.DateTime),
+)
+
+
+def _load_onchain(conn, start, end):
+    rows = conn.execute(_ONCHAIN_QUERY, {"start": start, "end": end})
+    return pd.DataFrame(rows.all(), columns=["timestamp", *ONCHAIN_COLUMNS])
+
+
+def _load_dune(conn, start, end):
+    # Dune's time column is often text such as "2021-01-02 00:00:00.000 UTC".
+    # Comparing it with ISO dates widened by a day on either side (for
+    # UTC offsets) reads a superset of the window from both text and
+    # timestamp columns; the exact window is applied after parsing.
+    time_column = _quote(DUNE_TIME_COLUMN)
+    columns = ", ".join(_quote(c) for c in [DUNE_TIME_COLUMN, *DUNE_METRICS])
+    rows = conn.execute(
+        sqlalchemy.text(
+            f"SELECT {columns} FROM dune_data "
+            f"WHERE {time_column} >= :low AND {time_column} < :high"
+        ),
+        {
+            "low": (start - timedelta(days=1)).date().isoformat(),
+            "high": (end + timedelta(days=2)).date().isoformat(),
+        },
+    )
+    df = pd.DataFrame(rows.all(), columns=["timestamp", *DUNE_METRICS])
+    df["timestamp"] = pd.to_datetime(df.timestamp, utc=True).dt.tz_convert(None)
+    df = df[(df.timestamp >= start) & (df.timestamp <= end)]
+    return df.rename(columns={c: f"dune_{c}" for c in DUNE_METRICS})
+
+
+def aligned_sources() -> list[AlignedSource]:
+    """The sources attached to feature rows, from configuration."""
+    hours = {k: timedelta(hours=v) for k, v in ALIGN_MAX_STALENESS.items()}
+    sources = [
+        AlignedSource(
+            f"fred:{series}",
+            [f"fred_{series.lower()}"],
+            hours["fred"],
+            _fred_loader(series),
+        )
+        for series in FRED_SERIES
+    ]
+    sources.append(
+        AlignedSource("onchain", ONCHAIN_COLUMNS, hours["onchain"], _load_onchain)
+    )
+    if DUNE_METRICS:
+        sources.append(
+            AlignedSource(
+                "dune",
+                [f"dune_{c}" for c in DUNE_METRICS],
+                hours["dune"],
+                _load_dune,
+            )
+        )
+    return sources
+
+
+def aligned_columns() -> list[str]:
+    return [c for source in aligned_sources() for c in source.columns]
+
+
+def align(df: pd.DataFrame, engine) -> pd.DataFrame:
+    """Attach the latest macro, on-chain and Dune values to each row.
+
+    Each source is read only for the time span covered by ``df`` (plus its
+    staleness allowance) and joined with a sorted ``merge_asof``, so the
+    cost grows linearly with the rows instead of as a cross product.
+    Values older than the source's max staleness, and sources whose table
+    is missing, leave NaN.
+
+    Returns
+    -------
+    pandas.DataFrame
+        ``df`` with the aligned columns added, in the original row order.
+    """
+    out = df.copy()
+    sources = aligned_sources()
+    for column in [c for s in sources for c in s.columns]:
+        out[column] = float("nan")
+    if out.empty:
+        return out
+    left = pd.DataFrame(
+        {
+            "timestamp": out.timestamp.astype("datetime64[ns]").to_numpy(),
+            "_row": range(len(out)),
+        }
+    ).sort_values("timestamp", kind="stable")
+    end = left.timestamp.iloc[-1].to_pydatetime()
+    with engine.connect() as conn:
+        for source in sources:
+            start = (left.timestamp.iloc[0] - source.staleness).to_pydatetime()
+            try:
+                right = source.load(conn, start, end)
+            except DatabaseError as exc:  # table not created yet
+                logger.warning("Cannot align %s: %s", source.name, exc)
+                conn.rollback()
+                continue
+            if right.empty:
+                continue
+            right["timestamp"] = pd.to_datetime(right.timestamp).astype(
+                "datetime64[ns]"
+            )
+            right = right.sort_values("timestamp", kind="stable")
+            merged = pd.merge_asof(
+                left,
+                right.astype({c: float for c in source.columns}),
+                on="timestamp",
+                direction="backward",
+                tolerance=source.staleness,
+            )
+            for column in source.columns:
+                out.iloc[merged._row.to_numpy(), out.columns.get_loc(column)] = merged[
+                    column
+                ].to_numpy()
+    return out
@@ -0,0 +1,169 @@
+import logging
+import threading
+from datetime import datetime, timedelta
+
+import pandas as pd
+import sqlalchemy
+
+from .config import BREAKER_COOLDOWN, BREAKER_FAILURES
+from .init_db import circuit_breaker
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """Closed / open / half-open breaker for one ingestion source.
+
+    After ``failure_threshold`` consecutive failed runs the breaker opens
+    and :meth:`allow` refuses calls without touching the network. Once
+    ``cooldown`` seconds have passed it turns half-open and lets a single
+    probe through: success closes it again, failure re-opens it for
+    another cool-down. ``opened_at`` is reset when the probe is granted,
+    so a probe whose outcome was never recorded (e.g. the process died)
+    is followed by another one a cool-down later instead of leaving the
+    breaker half-open for good.
+    """
+
+    def __init__(
+        self,
+        source: str,
+        failure_threshold: int = BREAKER_FAILURES,
+        cooldown: float = BREAKER_COOLDOWN,
+    ) -> None:
+        self.source = source
+        self.failure_threshold = failure_threshold
+        self.cooldown = timedelta(seconds=cooldown)
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at: datetime | None = None
+        self.skipped = 0
+        self.last_error: str | None = None
+        self._lock = threading.Lock()
+
+    def allow(self, now: datetime | None = None) -> bool:
+        """Whether the source may be called now; counts refused calls."""
+        now = now or datetime.utcnow()
+        with self._lock:
+            if (
+                self.state in (OPEN, HALF_OPEN)
+                and now - self.opened_at >= self.cooldown
+            ):
+                self.state = HALF_OPEN
+                self.opened_at = now
+                logger.info("Circuit for %s half-open; probing", self.source)
+                return True
+            if self.state == CLOSED:
+                return True
+            self.skipped += 1
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            if self.state != CLOSED:
+                logger.info("Circuit for %s closed", self.source)
+            self.state = CLOSED
+            self.failures = 0
+            self.opened_at = None
+            self.last_error = None
+
+    def record_failure(
+        self, exc: BaseException | None = None, now: datetime | None = None
+    ) -> None:
+        with self._lock:
+            self.failures += 1
+            if exc is not None:
+                self.last_error = str(exc)[:500]
+            if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != OPEN:
+                    logger.warning(
+                        "Circuit for %s opened after %d failures; "
+                        "skipping it for %s",
+                        self.source,
+                        self.failures,
+                        self.cooldown,
+                    )
+                self.state = OPEN
+                self.opened_at = now or datetime.utcnow()
+
+    def as_row(self) -> dict:
+        return {
+            "source": self.source,
+            "state": self.state,
+            "failures": self.failures,
+            "opened_at": self.opened_at,
+            "skipped": self.skipped,
+            "last_error": self.last_error,
+        }
+
+
+class BreakerRegistry:
+    """Named :class:`CircuitBreaker` instances shared by all fetchers.
+
+    The registry lives in memory for the life of the process; :meth:`load`
+    and :meth:`save` sync it with the ``circuit_breaker`` table so that
+    separate ingestion runs see each other's failures.
+    """
+
+    def __init__(self) -> None:
+        self._breakers: dict[str, CircuitBreaker] = {}
+        self._lock = threading.Lock()
+
+    def get(self, source: str) -> CircuitBreaker:
+        with self._lock:
+            if source not in self._breakers:
+                self._breakers[source] = CircuitBreaker(source)
+            return self._breakers[source]
+
+    def reset(self) -> None:
+        with self._lock:
+            self._breakers.clear()
+
+    def load(self, engine) -> None:
+        """Replace the in-memory state with the persisted one."""
+        circuit_breaker.create(engine, checkfirst=True)
+        with engine.connect() as conn:
+            rows = conn.execute(sqlalchemy.select(circuit_breaker)).all()
+        for row in rows:
+            breaker = self.get(row.source)
+            with breaker._lock:
+                breaker.state = row.state
+                breaker.failures = row.failures
+                breaker.opened_at = row.opened_at
+                breaker.skipped = row.skipped
+                breaker.last_error = row.last_error
+
+    def save(self, engine) -> None:
+        """Persist every breaker's state."""
+        rows = self.snapshot()
+        if not rows:
+            return
+        circuit_breaker.create(engine, checkfirst=True)
+        with engine.begin() as conn:
+            conn.execute(
+                circuit_breaker.delete().where(
+                    circuit_breaker.c.source.in_([r["source"] for r in rows])
+                )
+            )
+            conn.execute(circuit_breaker.insert(), rows)
+
+    def snapshot(self) -> list[dict]:
+        """Current state, failure and skip counts of every breaker."""
+        with self._lock:
+            breakers = list(self._breakers.values())
+        return [b.as_row() for b in sorted(breakers, key=lambda b: b.source)]
+
+
+registry = BreakerRegistry()
+
+
+def breaker_status(engine) -> pd.DataFrame:
+    """The persisted breaker table, one row per source."""
+    circuit_breaker.create(engine, checkfirst=True)
+    return pd.read_sql(
+        sqlalchemy.select(circuit_breaker).order_by(circuit_breaker.c.source),
+        engine,
+    )
@@ -0,0 +1,395 @@
+import contextlib
+import io
+import logging
+import os
+import threading
+import time
+from collections.abc import Iterator
+
+import pandas as pd
+import sqlalchemy
+
+logger = logging.getLogger(__name__)
+
+# Rows per COPY / INSERT batch handed to ``DataFrame.to_sql``.
+CHUNK_ROWS = 50_000
+
+
+def _quote(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+
+# COPY text format: tab separated, ``\N`` for NULL, backslash escapes.
+_COPY_ESCAPES = str.maketrans({"\\": "\\\\", "\t": "\\t", "\n": "\\n", "\r": "\\r"})
+
+
+def _copy_value(value) -> str:
+    if value is None:
+        return "\\N"
+    return str(value).translate(_COPY_ESCAPES)
+
+
+def copy_rows(table, conn, keys, data_iter) -> int:
+    """``DataFrame.to_sql`` method that streams rows via ``COPY FROM STDIN``.
+
+    The rows are serialised to an in-memory buffer in COPY's text format
+    and loaded with a single ``COPY`` per chunk instead of one ``INSERT``
+    per row.
+    """
+    buf = io.StringIO()
+    count = 0
+    for row in data_iter:
+        buf.write("\t".join(map(_copy_value, row)))
+        buf.write("\n")
+        count += 1
+    buf.seek(0)
+    name = _quote(table.name)
+    if table.schema:
+        name = f"{_quote(table.schema)}.{name}"
+    columns = ", ".join(_quote(k) for k in keys)
+    with conn.connection.cursor() as cur:
+        cur.copy_expert(f"COPY {name} ({columns}) FROM STDIN", buf)
+    return count
+
+
+def write_method(con):
+    """The fastest ``to_sql`` insert method supported by ``con``'s dialect.
+
+    PostgreSQL gets ``COPY``; other databases (SQLite in tests and local
+    runs) fall back to pandas' default ``executemany`` inserts.
+    """
+    return copy_rows if con.dialect.name == "postgresql" else None
+
+
+def write_frame(
+    df: pd.DataFrame,
+    table: str,
+    con,
+    if_exists: str = "append",
+    chunksize: int = CHUNK_ROWS,
+) -> int:
+    """Bulk-write ``df`` to ``table`` and log the achieved throughput.
+
+    Parameters
+    ----------
+    df: pandas.DataFrame
+        Rows to write; the index is not stored.
+    table: str
+        Target table, created from ``df``'s dtypes if it does not exist.
+    con: sqlalchemy.engine.Engine or sqlalchemy.engine.Connection
+        Where to write. Pass a connection to join an open transaction.
+    if_exists: str
+        Forwarded to ``DataFrame.to_sql``.
+
+    Returns
+    -------
+    int
+        The number of rows written.
+    """
+    if df.empty and if_exists == "append":
+        return 0
+    t0 = time.perf_counter()
+    df.to_sql(
+        table,
+        con,
+        if_exists=if_exists,
+        index=False,
+        method=write_method(con),
+        chunksize=chunksize,
+    )
+    elapsed = time.perf_counter() - t0
+    logger.info(
+        "Wrote %d rows to %s in %.2fs (%.0f rows/s)",
+        len(df),
+        table,
+        elapsed,
+        len(df) / elapsed if elapsed > 0 else float("inf"),
+    )
+    return len(df)
+
+
+# PostgreSQL type OIDs of the columns COPY output is parsed into: floats
+# (real, double, numeric), booleans and dates/timestamps. Integers are
+# inferred; everything else stays text.
+_PG_FLOATS = {700, 701, 1700}
+_PG_BOOL = 16
+_PG_TIMES = {1082, 1114, 1184}
+
+
+def _connect(con):
+    """A connection on ``con``, or ``con`` itself if already a connection."""
+    if isinstance(con, sqlalchemy.engine.Connection):
+        return contextlib.nullcontext(con)
+    return con.connect()
+
+
+def _literal_sql(query, conn, params: dict | None) -> str:
+    """``query`` with ``params`` inlined, as COPY takes no parameters."""
+    if isinstance(query, str):
+        query = sqlalchemy.text(query)
+    compiled = query.compile(dialect=conn.dialect)
+    values = {**compiled.params, **(params or {})}
+    with conn.connection.cursor() as cur:
+        return cur.mogrify(str(compiled), values).decode()
+
+
+def _csv_options(description, parse_dates) -> dict:
+    """``read_csv`` arguments that type each column from its PostgreSQL OID."""
+    dtype, na_values, dates, bools = {}, {}, list(parse_dates or []), []
+    for column in description:
+        name, oid = column[0], column[1]
+        na_values[name] = ["\\N"]
+        if oid in _PG_FLOATS:
+            dtype[name] = "float64"
+            na_values[name].append("NaN")
+        elif oid in _PG_TIMES:
+            dates.append(name)
+        elif oid == _PG_BOOL:
+            dtype[name] = str
+            bools.append(name)
+        elif oid not in (20, 21, 23):
+            dtype[name] = str
+    return {
+        "dtype": dtype,
+        "na_values": na_values,
+        "keep_default_na": False,
+        "parse_dates": list(dict.fromkeys(dates)),
+        "date_format": "ISO8601",
+        # PostgreSQL prints the shortest text that round-trips each float.
+        "float_precision": "round_trip",
+        "bools": bools,
+    }
+
+
+def _copy_frames(
+    conn, query, params, parse_dates, chunksize: int | None
+) -> Iterator[pd.DataFrame]:
+    """Stream ``query`` through ``COPY ... TO STDOUT`` into DataFrames.
+
+    COPY writes CSV into a pipe from a worker thread while pandas' C
+    parser reads it on this one, building typed columns directly instead
+    of one Python object per value. Only ``chunksize`` rows (or the whole
+    result if None) are held at a time.
+    """
+    sql = _literal_sql(query, conn, params)
+    # An empty result of the query, only to learn its column types.
+    probe = conn.exec_driver_sql(
+        f"SELECT * FROM ({sql}) AS q LIMIT 0".replace("%", "%%")
+    )
+    options = _csv_options(probe.cursor.description, parse_dates)
+    probe.close()
+    bools = options.pop("bools")
+    copy = f"COPY ({sql}) TO STDOUT WITH (FORMAT csv, HEADER, NULL '\\N')"
+    read_fd, write_fd = os.pipe()
+    failure = []
+
+    def produce():
+        try:
+            with os.fdopen(write_fd, "wb") as sink:
+                with conn.connection.cursor() as cur:
+                    cur.copy_expert(copy, sink)
+        except Exception as exc:  # noqa: BLE001
+            failure.append(exc)
+
+    thread = threading.Thread(target=produce, daemon=True)
+    thread.start()
+    complete = False
+    try:
+        with os.fdopen(read_fd, "rb") as source:
+            frames = pd.read_csv(source, chunksize=chunksize, **options)
+            for frame in [frames] if chunksize is None else frames:
+                for col in bools:
+                    frame[col] = frame[col].map({"t": True, "f": False})
+                yield frame
+        complete = True
+    except Exception as exc:
+        thread.join()
+        if failure:
+            raise failure[0] from exc
+        raise
+    finally:
+        thread.join()
+        if not complete:
+            # The COPY was cut short, which leaves the connection unusable.
+            conn.invalidate()
+    if failure:
+        raise failure[0]
+
+
+def _log_read(rows: int, t0: float) -> None:
+    elapsed = time.perf_counter() - t0
+    logger.info(
+        "Read %d rows in %.2fs (%.0f rows/s)",
+        rows,
+        elapsed,
+        rows / elapsed if elapsed > 0 else float("inf"),
+    )
+
+
+def read_frame(
+    query, con, params: dict | None = None, parse_dates=None
+) -> pd.DataFrame:
+    """Read the result of ``query`` into a DataFrame, fast.
+
+    On PostgreSQL the rows are streamed with ``COPY (query) TO STDOUT``
+    and parsed into typed columns without going through the DB-API
+    cursor; other databases use ``pandas.read_sql``.
+
+    Parameters
+    ----------
+    query: str or sqlalchemy.sql.expression.Executable
+        A SELECT statement; bound parameters are inlined for COPY.
+    con: sqlalchemy.engine.Engine or sqlalchemy.engine.Connection
+        Where to read.
+    params: dict, optional
+        Values of the query's bound parameters.
+    parse_dates: list of str, optional
+        Columns to parse as datetimes where the database does not type
+        them (SQLite).
+    """
+    t0 = time.perf_counter()
+    with _connect(con) as conn:
+        if conn.dialect.name != "postgresql":
+            df = pd.read_sql(query, conn, params=params, parse_dates=parse_dates)
+        else:
+            (df,) = _copy_frames(conn, query, params, parse_dates, None)
+    _log_read(len(df), t0)
+    return df
+
+
+def read_chunks(
+    query,
+    con,
+    params: dict | None = None,
+    parse_dates=None,
+    chunksize: int = CHUNK_ROWS,
+) -> Iterator[pd.DataFrame]:
+    """Like :func:`read_frame`, in DataFrames of up to ``chunksize`` rows.
+
+    Lets callers process results larger than memory. Stopping the
+    iteration early on PostgreSQL discards the connection, whose COPY
+    was interrupted.
+    """
+    t0, rows = time.perf_counter(), 0
+    with _connect(con) as conn:
+        if conn.dialect.name != "postgresql":
+            frames = pd.read_sql(
+                query,
+                conn,
+                params=params,
+                parse_dates=parse_dates,
+                chunksize=chunksize,
+            )
+        else:
+            frames = _copy_frames(conn, query, params, parse_dates, chunksize)
+        for frame in frames:
+            rows += len(frame)
+            yield frame
+    _log_read(rows, t0)
+
+
+def transaction(con):
+    """A transaction on ``con``, or ``con`` itself if already a connection."""
+    if isinstance(con, sqlalchemy.engine.Connection):
+        return contextlib.nullcontext(con)
+    return con.begin()
+
+
+def _merge(
+    df: pd.DataFrame,
+    table: str,
+    con,
+    keys: list[str],
+    update: bool,
+    returning: bool,
+):
+    """Load ``df`` into a temporary staging table and merge it on ``keys``.
+
+    The staging table is created and dropped inside the same transaction
+    as the ``INSERT ... SELECT ... ON CONFLICT``, so a failure leaves
+    neither staged nor partially merged rows behind.
+    """
+    df = df.drop_duplicates(keys, keep="last")
+    columns = ", ".join(_quote(c) for c in df.columns)
+    target = _quote(table)
+    staging = _quote(f"_staging_{table}")
+    action = "DO NOTHING"
+    if update:
+        assignments = ", ".join(
+            f"{_quote(c)} = excluded.{_quote(c)}" for c in df.columns if c not in keys
+        )
+        if assignments:
+            action = f"DO UPDATE SET {assignments}"
+    # ``WHERE true`` keeps SQLite from parsing ON CONFLICT as a join clause.
+    sql = (
+        f"INSERT INTO {target} ({columns}) "
+        f"SELECT {columns} FROM {staging} WHERE true "
+        f"ON CONFLICT ({', '.join(_quote(k) for k in keys)}) {action}"
+    )
+    if returning:
+        sql += f" RETURNING {', '.join(_quote(k) for k in keys)}"
+    t0 = time.perf_counter()
+    with transaction(con) as conn:
+        conn.exec_driver_sql(
+            f"CREATE TEMPORARY TABLE {staging} AS "
+            f"SELECT {columns} FROM {target} WHERE 1 = 0"
+        )
+        df.to_sql(
+            f"_staging_{table}",
+            conn,
+            if_exists="append",
+            index=False,
+            method=write_method(conn),
+            chunksize=CHUNK_ROWS,
+        )
+        result = conn.exec_driver_sql(sql)
+        merged = result.fetchall() if returning else result.rowcount
+        conn.exec_driver_sql(f"DROP TABLE {staging}")
+    elapsed = time.perf_counter() - t0
+    logger.info(
+        "Merged %d rows into %s in %.2fs (%.0f rows/s)",
+        len(df),
+        table,
+        elapsed,
+        len(df) / elapsed if elapsed > 0 else float("inf"),
+    )
+    return merged
+
+
+def upsert(
+    df: pd.DataFrame,
+    table: str,
+    con,
+    keys: list[str],
+    update: bool = False,
+) -> int:
+    """Idempotently write ``df`` to ``table`` using its unique ``keys``.
+
+    Rows whose keys already exist are skipped, or overwritten with the
+    incoming values when ``update`` is set. ``keys`` must match a unique
+    index or constraint on ``table``, which must already exist.
+
+    Returns
+    -------
+    int
+        The number of rows inserted or updated.
+    """
+    if df.empty:
+        return 0
+    return _merge(df, table, con, keys, update, returning=False)
+
+
+def insert_new(df: pd.DataFrame, table: str, con, keys: list[str]) -> pd.DataFrame:
+    """Insert the rows of ``df`` whose ``keys`` are not yet in ``table``.
+
+    Returns
+    -------
+    pandas.DataFrame
+        The subset of ``df`` that was actually inserted.
+    """
+    if df.empty:
+        return df
+    inserted = _merge(df, table, con, keys, update=False, returning=True)
+    new = pd.MultiIndex.from_tuples([tuple(r) for r in inserted], names=keys)
+    mask = pd.MultiIndex.from_frame(df[keys]).isin(new)
+    return df[mask].drop_duplicates(keys, keep="last")
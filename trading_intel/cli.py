@@ -1,39 +1,122 @@
 #!/usr/bin/env python3
 import logging
+import os
+import signal
 import subprocess
 import sys
-from pathlib import Path
+import time
 
+from . import maintenance
+from .breaker import breaker_status
+from .config import DAEMON_LOG, DAEMON_PIDFILE, validate_env
+from .daemon import AlreadyRunning, run_daemon, running_pid
+from .http_cache import format_stats, shared_cache
+from .init_db import engine
 from .logging_utils import setup_logging
 
 logger = logging.getLogger(__name__)
 
+# Seconds ``start`` waits for the new daemon to take the pidfile.
+START_TIMEOUT = 30.0
+# Seconds ``stop`` waits for a tick in progress to finish.
+STOP_TIMEOUT = 60.0
 
-def start() -> None:
-    project_dir = Path(__file__).resolve().parent
+
+def _remove_legacy_cron() -> None:
+    """Drop the ``@hourly`` entry added by earlier versions of ``start``."""
     cmd = (
-        "(crontab -l 2>/dev/null; echo '@hourly cd "
-        f"{project_dir} && {sys.executable} -m trading_intel.inference "
-        ">> inference.log 2>&1') | crontab -"
+        "crontab -l 2>/dev/null | grep -q 'trading_intel.inference' && "
+        "crontab -l | grep -v 'trading_intel.inference' | crontab -"
     )
     subprocess.run(cmd, shell=True)
-    logger.info("\u2705 Scheduled hourly inference (crontab added).")
 
 
-def stop() -> None:
-    cmd = "crontab -l | grep -v 'trading_intel.inference' | crontab -"
-    subprocess.run(cmd, shell=True)
-    logger.info("\U0001f6d1 Stopped hourly inference.")
+def run() -> int:
+    """Run the daemon in the foreground, e.g. under systemd."""
+    validate_env()
+    try:
+        run_daemon()
+    except AlreadyRunning as exc:
+        logger.error("%s", exc)
+        return 1
+    return 0
+
+
+def start() -> int:
+    pid = running_pid(DAEMON_PIDFILE)
+    if pid is not None:
+        logger.info("Daemon already running (pid %d).", pid)
+        return 0
+    _remove_legacy_cron()
+    with open(DAEMON_LOG, "ab") as log:
+        proc = subprocess.Popen(
+            [sys.executable, "-m", "trading_intel.cli", "run"],
+            stdin=subprocess.DEVNULL,
+            stdout=log,
+            stderr=subprocess.STDOUT,
+            start_new_session=True,
+        )
+    deadline = time.monotonic() + START_TIMEOUT
+    while running_pid(DAEMON_PIDFILE) is None:
+        code = proc.poll()
+        if code is not None:
+            logger.error("Daemon exited with code %d; see %s.", code, DAEMON_LOG)
+            return 1
+        if time.monotonic() > deadline:
+            logger.error(
+                "Daemon (pid %d) did not take %s in time; see %s.",
+                proc.pid,
+                DAEMON_PIDFILE,
+                DAEMON_LOG,
+            )
+            return 1
+        time.sleep(0.2)
+    logger.info("\u2705 Started inference daemon (pid %d).", proc.pid)
+    return 0
+
+
+def stop() -> int:
+    pid = running_pid(DAEMON_PIDFILE)
+    if pid is None:
+        logger.info("Daemon is not running.")
+        return 0
+    os.kill(pid, signal.SIGTERM)
+    deadline = time.monotonic() + STOP_TIMEOUT
+    while running_pid(DAEMON_PIDFILE) is not None:
+        if time.monotonic() > deadline:
+            logger.error("Daemon (pid %d) did not stop in time.", pid)
+            return 1
+        time.sleep(0.2)
+    logger.info("\U0001f6d1 Stopped inference daemon (pid %d).", pid)
+    return 0
 
 
-def status() -> None:
-    out = subprocess.run(
-        "crontab -l",
-        shell=True,
-        capture_output=True,
-        text=True,
+def status() -> int:
+    pid = running_pid(DAEMON_PIDFILE)
+    if pid is None:
+        logger.info("\U0001f4cb Daemon is not running.")
+    else:
+        logger.info("\U0001f4cb Daemon running (pid %d).", pid)
+    cache = shared_cache()
+    if cache is not None:
+        logger.info("HTTP cache:\n%s", format_stats(cache.stats()) or "(empty)")
+    try:
+        breakers = breaker_status(engine)
+    except Exception as exc:  # noqa: BLE001
+        logger.error("Could not read circuit breaker state: %s", exc)
+        return 0
+    logger.info(
+        "Circuit breakers:\n%s",
+        breakers.to_string(index=False) if len(breakers) else "(none)",
     )
-    logger.info("\U0001f4cb Crontab:\n%s", out.stdout)
+    return 0
+
+
+def maintain(args: list[str]) -> int:
+    """Partition, roll up and expire prices; see ``maintenance.main``."""
+    validate_env()
+    maintenance.main(args)
+    return 0
 
 
 def main(argv: list[str] | None = None) -> int:
@@ -41,19 +124,22 @@ def main(argv: list[str] | None = None) -> int:
     setup_logging()
     args = sys.argv[1:] if argv is None else argv
     if not args:
-        logger.error("usage: cli.py [start|stop|status]")
+        logger.error("usage: cli.py [run|start|stop|status|maintain]")
         return 1
     cmd = args[0]
-    if cmd == "start":
-        start()
+    if cmd == "run":
+        return run()
+    elif cmd == "start":
+        return start()
     elif cmd == "stop":
-        stop()
+        return stop()
     elif cmd == "status":
-        status()
+        return status()
+    elif cmd == "maintain":
+        return maintain(args[1:])
     else:
         print(f"unknown command: {cmd}", file=sys.stderr)
         return 1
-    return 0
 
 
 if __name__ == "__main__":
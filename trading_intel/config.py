@@ -48,5 +48,176 @@ def validate_env() -> None:
         )
 
 
+# Days of history requested from a source that has no stored high-water
+# mark yet (first run or new symbol).
+BACKFILL_DAYS = int(os.getenv("BACKFILL_DAYS", "30"))
+
+# Shared async HTTP client: requests in flight across all sources, pooled
+# connections per host, and attempts per request (including the first, so
+# at least 1).
+HTTP_MAX_CONCURRENCY = int(os.getenv("HTTP_MAX_CONCURRENCY", "64"))
+HTTP_MAX_PER_HOST = int(os.getenv("HTTP_MAX_PER_HOST", "8"))
+HTTP_RETRIES = int(os.getenv("HTTP_RETRIES", "3"))
+
+# On-disk cache of GET responses (empty path disables it). Within a
+# provider's TTL (seconds) a cached body is reused without a request;
+# after it, the body is revalidated with ETag/Last-Modified.
+HTTP_CACHE_PATH = os.getenv(
+    "HTTP_CACHE_PATH", os.path.join(PROJECT_DIR, "http_cache.sqlite")
+)
+HTTP_CACHE_TTLS = {
+    "alpha_vantage": float(os.getenv("ALPHA_VANTAGE_CACHE_TTL", "0")),
+    "coingecko": float(os.getenv("COINGECKO_CACHE_TTL", "0")),
+    "fred": float(os.getenv("FRED_CACHE_TTL", "43200")),
+    "reddit": float(os.getenv("REDDIT_CACHE_TTL", "0")),
+}
+# Entries not stored or revalidated for this long (seconds), or for their
+# provider's TTL if longer, are pruned, e.g. those keyed by a page cursor.
+HTTP_CACHE_RETAIN = float(os.getenv("HTTP_CACHE_RETAIN", "604800"))
+
+
+def available_cpus() -> int:
+    """CPUs this process may run on; a larger pool only adds overhead."""
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def _list(name: str, default: str) -> list[str]:
+    return [s.strip() for s in os.getenv(name, default).split(",") if s.strip()]
+
+
+# Symbols fetched by ``ingestion.fetch_all`` (comma separated).
+CRYPTO_WATCHLIST = _list("CRYPTO_WATCHLIST", "bitcoin")
+STOCK_WATCHLIST = _list("STOCK_WATCHLIST", "AAPL")
+YFINANCE_WATCHLIST = _list("YFINANCE_WATCHLIST", "SPY")
+FRED_SERIES = _list("FRED_SERIES", "DEXUSAL")
+REDDIT_SUBREDDITS = _list("REDDIT_SUBREDDITS", "CryptoCurrency")
+
+# Reddit ``/new`` listings are paged back to each subreddit's newest stored
+# post, at most ``REDDIT_MAX_PAGES`` pages of 100 per run. Ids of recently
+# stored posts are kept in memory to drop re-fetched posts before writing.
+REDDIT_MAX_PAGES = int(os.getenv("REDDIT_MAX_PAGES", "10"))
+REDDIT_SEEN_IDS = int(os.getenv("REDDIT_SEEN_IDS", "100000"))
+
+# Requests per minute allowed per provider; set these to your API key tier.
+# 0 disables limiting for that provider.
+RATE_LIMITS = {
+    "alpha_vantage": float(os.getenv("ALPHA_VANTAGE_RPM", "5")),
+    "coingecko": float(os.getenv("COINGECKO_RPM", "30")),
+    "fred": float(os.getenv("FRED_RPM", "120")),
+    "reddit": float(os.getenv("REDDIT_RPM", "60")),
+    "eth_rpc": float(os.getenv("ETH_RPC_RPM", "60")),
+}
+# Requests per provider that may go out back to back before the rate
+# applies, e.g. when the API key tier allows short bursts.
+RATE_BURSTS = {
+    "alpha_vantage": float(os.getenv("ALPHA_VANTAGE_BURST", "1")),
+    "coingecko": float(os.getenv("COINGECKO_BURST", "1")),
+    "fred": float(os.getenv("FRED_BURST", "1")),
+    "reddit": float(os.getenv("REDDIT_BURST", "1")),
+    "eth_rpc": float(os.getenv("ETH_RPC_BURST", "1")),
+}
+
+# Ethereum JSON-RPC endpoint. Blocks after the newest stored one are pulled
+# in batches of ``ONCHAIN_BATCH_SIZE`` calls per request, at most
+# ``ONCHAIN_MAX_BLOCKS`` per run; an empty table starts
+# ``ONCHAIN_BACKFILL_BLOCKS`` behind the chain head (~1 hour).
+ETH_RPC_URL = os.getenv("ETH_RPC_URL", "https://cloudflare-eth.com")
+ONCHAIN_BATCH_SIZE = int(os.getenv("ONCHAIN_BATCH_SIZE", "100"))
+ONCHAIN_MAX_BLOCKS = int(os.getenv("ONCHAIN_MAX_BLOCKS", "2000"))
+ONCHAIN_BACKFILL_BLOCKS = int(os.getenv("ONCHAIN_BACKFILL_BLOCKS", "300"))
+
+# Ingestion writes: fetchers queue parsed frames (at most
+# ``WRITE_QUEUE_SIZE``, then they wait) for a single writer, which writes
+# them, one transaction per table, once ``WRITE_BATCH_ROWS`` rows are pending or
+# ``WRITE_FLUSH_SECONDS`` after the oldest one arrived.
+WRITE_QUEUE_SIZE = int(os.getenv("WRITE_QUEUE_SIZE", "64"))
+WRITE_BATCH_ROWS = int(os.getenv("WRITE_BATCH_ROWS", "50000"))
+WRITE_FLUSH_SECONDS = float(os.getenv("WRITE_FLUSH_SECONDS", "2"))
+
+# Circuit breaker per ingestion source: consecutive failed runs before the
+# source is skipped, and seconds to wait before probing it again.
+BREAKER_FAILURES = int(os.getenv("BREAKER_FAILURES", "3"))
+BREAKER_COOLDOWN = float(os.getenv("BREAKER_COOLDOWN", "900"))
+
+# Seconds between fetches of each source in the daemon; 0 disables the
+# source. On-chain data is polled at Ethereum's ~12s block time.
+SOURCE_INTERVALS = {
+    "crypto": float(os.getenv("CRYPTO_INTERVAL", "300")),
+    "stock": float(os.getenv("STOCK_INTERVAL", "3600")),
+    "yfinance": float(os.getenv("YFINANCE_INTERVAL", "3600")),
+    "fred": float(os.getenv("FRED_INTERVAL", "86400")),
+    "eth_chain": float(os.getenv("ETH_CHAIN_INTERVAL", "12")),
+    "dune": float(os.getenv("DUNE_INTERVAL", "0")),
+    "reddit": float(os.getenv("REDDIT_INTERVAL", "900")),
+}
+
+# As-of alignment of slower sources onto price rows: the oldest value (in
+# hours) still attached to a row, and the Dune result columns to attach
+# with the column holding their timestamp.
+ALIGN_MAX_STALENESS = {
+    "fred": float(os.getenv("FRED_MAX_STALENESS_HOURS", "96")),
+    "onchain": float(os.getenv("ONCHAIN_MAX_STALENESS_HOURS", "1")),
+    "dune": float(os.getenv("DUNE_MAX_STALENESS_HOURS", "48")),
+}
+DUNE_METRICS = _list("DUNE_METRICS", "")
+DUNE_TIME_COLUMN = os.getenv("DUNE_TIME_COLUMN", "timestamp")
+
+# price_data maintenance (``python -m trading_intel.maintenance``): monthly
+# partitions created ahead of time, months of raw rows kept (0 keeps them
+# all; expired partitions are written to ``PRICE_ARCHIVE_DIR`` first if
+# set), and days of 1h/1d bars re-aggregated on each refresh to pick up
+# late rows.
+PARTITION_MONTHS_AHEAD = int(os.getenv("PARTITION_MONTHS_AHEAD", "3"))
+PRICE_RETENTION_MONTHS = int(os.getenv("PRICE_RETENTION_MONTHS", "0"))
+PRICE_ARCHIVE_DIR = os.getenv("PRICE_ARCHIVE_DIR", "")
+ROLLUP_LOOKBACK_DAYS = float(os.getenv("ROLLUP_LOOKBACK_DAYS", "3"))
+
+# Processes used by feature builds to compute symbols in parallel.
+FEATURE_WORKERS = int(os.getenv("FEATURE_WORKERS", "1"))
+
+# Arrow files of the ``features`` table, one per symbol and month, read by
+# training through memory maps (``python -m trading_intel.feature_store``).
+FEATURE_STORE_DIR = os.getenv(
+    "FEATURE_STORE_DIR", os.path.join(PROJECT_DIR, "feature_store")
+)
+
+# Feature rows per LSTM input sequence, in training and inference.
+SEQ_LEN = int(os.getenv("SEQ_LEN", "24"))
+
+# ``modeling.train``: windows per mini-batch, maximum epochs, epochs
+# without a better held-out loss before stopping, DataLoader worker
+# processes and torch threads (0 keeps torch's default).
+TRAIN_BATCH_SIZE = int(os.getenv("TRAIN_BATCH_SIZE", "256"))
+TRAIN_EPOCHS = int(os.getenv("TRAIN_EPOCHS", "50"))
+TRAIN_PATIENCE = int(os.getenv("TRAIN_PATIENCE", "5"))
+TRAIN_WORKERS = int(os.getenv("TRAIN_WORKERS", "0"))
+TRAIN_THREADS = int(os.getenv("TRAIN_THREADS", "0"))
+
+# ``modeling --incremental``: older windows replayed per new window, drawn
+# from this many days before the checkpoint's watermark.
+RETRAIN_REPLAY_RATIO = float(os.getenv("RETRAIN_REPLAY_RATIO", "1"))
+RETRAIN_REPLAY_DAYS = float(os.getenv("RETRAIN_REPLAY_DAYS", "90"))
+
+# Feature rows kept in memory per symbol by the daemon's pipeline.
+FEATURE_BUFFER_ROWS = int(os.getenv("FEATURE_BUFFER_ROWS", "512"))
+
+# ``ti-cli run`` daemon: the longest sleep between scheduler ticks, the
+# pidfile that guards against a second instance, and where ``ti-cli start``
+# sends its output.
+DAEMON_INTERVAL = float(os.getenv("DAEMON_INTERVAL", "3600"))
+DAEMON_PIDFILE = os.getenv("DAEMON_PIDFILE", os.path.join(PROJECT_DIR, "ti-daemon.pid"))
+DAEMON_LOG = os.getenv("DAEMON_LOG", os.path.join(PROJECT_DIR, "inference.log"))
+
 # Optional log file path for logging.basicConfig
 LOG_FILE = os.getenv("LOG_FILE", "")
+
+# Sentiment scoring: score ``title + selftext`` instead of the title alone,
+# and the process count used when backfilling scores for stored posts.
+SENTIMENT_INCLUDE_SELFTEXT = os.getenv("SENTIMENT_INCLUDE_SELFTEXT", "").lower() in (
+    "1",
+    "true",
+    "yes",
+)
+SENTIMENT_WORKERS = int(os.getenv("SENTIMENT_WORKERS", available_cpus()))
@@ -0,0 +1,158 @@
+import asyncio
+import fcntl
+import logging
+import os
+import signal
+import time
+
+from .config import DAEMON_INTERVAL, DAEMON_PIDFILE
+from .http_client import close_client
+
+logger = logging.getLogger(__name__)
+
+
+class AlreadyRunning(RuntimeError):
+    """Another daemon instance holds the pidfile lock."""
+
+
+class PidFile:
+    """Exclusive ``flock`` on a pidfile holding the daemon's process id.
+
+    The lock, not the file's existence, decides whether a daemon is
+    running: it is released by the kernel when the process dies, so a
+    stale pidfile left behind by a crash does not block a restart.
+    """
+
+    def __init__(self, path: str = DAEMON_PIDFILE) -> None:
+        self.path = path
+        self._fd: int | None = None
+
+    def acquire(self) -> None:
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            raise AlreadyRunning(
+                f"daemon already running (pid {read_pid(self.path)})"
+            ) from None
+        os.ftruncate(fd, 0)
+        os.write(fd, f"{os.getpid()}\n".encode())
+        os.fsync(fd)
+        self._fd = fd
+
+    def release(self) -> None:
+        if self._fd is None:
+            return
+        # Truncate rather than unlink: removing the path while another
+        # process has it open would let two instances lock different files.
+        os.ftruncate(self._fd, 0)
+        fcntl.flock(self._fd, fcntl.LOCK_UN)
+        os.close(self._fd)
+        self._fd = None
+
+    def __enter__(self) -> "PidFile":
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.release()
+
+
+def read_pid(path: str = DAEMON_PIDFILE) -> int | None:
+    """The pid recorded in ``path``, if any."""
+    try:
+        with open(path) as fh:
+            return int(fh.read().strip())
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def running_pid(path: str = DAEMON_PIDFILE) -> int | None:
+    """The pid of the live daemon holding ``path``'s lock, or ``None``."""
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except FileNotFoundError:
+        return None
+    try:
+        fcntl.flock(fd, fcntl.LOCK_SH | fcntl.LOCK_NB)
+    except OSError:
+        return read_pid(path)
+    finally:
+        os.close(fd)
+    return None
+
+
+async def serve(
+    tick, interval: float = DAEMON_INTERVAL, stop: asyncio.Event | None = None
+) -> int:
+    """Await ``tick()`` repeatedly until ``stop`` is set.
+
+    ``tick`` may return the number of seconds until it next has work to
+    do; otherwise, or if that is longer, it runs every ``interval``
+    seconds. SIGTERM and SIGINT set ``stop``: a tick in progress is allowed to
+    finish, then the shared HTTP client is closed. A failing tick is
+    logged and the next one runs on schedule.
+
+    Returns
+    -------
+    int
+        The number of ticks run.
+    """
+    loop = asyncio.get_running_loop()
+    if stop is None:
+        stop = asyncio.Event()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, stop.set)
+    ticks = 0
+    try:
+        while not stop.is_set():
+            t0 = time.monotonic()
+            wait = None
+            try:
+                wait = await tick()
+            except Exception:  # noqa: BLE001
+                logger.exception("Pipeline tick failed")
+            ticks += 1
+            delay = max(0.0, interval - (time.monotonic() - t0))
+            if isinstance(wait, (int, float)):
+                delay = min(delay, wait)
+            try:
+                await asyncio.wait_for(stop.wait(), timeout=delay)
+            except asyncio.TimeoutError:
+                pass
+    finally:
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            loop.remove_signal_handler(sig)
+        await close_client()
+    logger.info("Daemon stopped after %d ticks", ticks)
+    return ticks
+
+
+def run_daemon(pidfile: str = DAEMON_PIDFILE) -> None:
+    """Run the inference pipeline as a single-instance daemon.
+
+    The ONNX session, DB engines and feature buffers are created once on
+    import of :mod:`trading_intel.inference` and reused by every tick, as
+    is the event loop's pooled HTTP client. Pending feature writes are
+    flushed before exiting.
+
+    Raises
+    ------
+    AlreadyRunning
+        If another daemon holds ``pidfile``.
+    """
+    with PidFile(pidfile):
+        from . import inference
+
+        async def main():
+            try:
+                await serve(inference.run_tick)
+            finally:
+                await inference.pipeline.flush()
+
+        logger.info("Daemon started (pid %d)", os.getpid())
+        try:
+            asyncio.run(main())
+        finally:
+            inference.engine.dispose()
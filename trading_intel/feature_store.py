@@ -0,0 +1,370 @@
+import argparse
+import json
+import logging
+import os
+import shutil
+from datetime import datetime
+from pathlib import Path
+from urllib.parse import quote
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import sqlalchemy
+
+from .bulk import read_chunks
+from .config import DATABASE_URL, FEATURE_STORE_DIR, validate_env
+from .indicators import registry_signature
+from .logging_utils import setup_logging
+
+logger = logging.getLogger(__name__)
+
+engine = sqlalchemy.create_engine(DATABASE_URL)
+store_dir = Path(FEATURE_STORE_DIR)
+
+MANIFEST = "manifest.json"
+# Version of the file layout; a store written with another one is rebuilt.
+LAYOUT = 3
+# Appended parts of one month kept before they are compacted into one file.
+MAX_PARTS = 16
+
+# Just the columns the sync queries filter and group on; rows are read
+# with ``SELECT *``.
+FEATURES = sqlalchemy.table(
+    "features",
+    sqlalchemy.column("symbol", sqlalchemy.String),
+    sqlalchemy.column("type", sqlalchemy.String),
+    sqlalchemy.column("timestamp", sqlalchemy.DateTime),
+)
+
+
+def _root(root) -> Path:
+    return store_dir if root is None else Path(root)
+
+
+def _symbol_dir(root: Path, symbol: str) -> Path:
+    return root / f"symbol={quote(str(symbol), safe='')}"
+
+
+def _series_dir(root: Path, symbol: str, type_: str) -> Path:
+    """The directory of one (symbol, type) series, e.g. ``btc`` as crypto."""
+    return _symbol_dir(root, symbol) / f"type={quote(str(type_), safe='')}"
+
+
+def _key(symbol: str, type_: str) -> str:
+    """The manifest key of a series: its directory relative to the root."""
+    return _series_dir(Path(), symbol, type_).as_posix()
+
+
+def _drop(root: Path, symbol: str, type_: str) -> None:
+    """Delete the files of a series, and its symbol directory once empty."""
+    shutil.rmtree(_series_dir(root, symbol, type_), ignore_errors=True)
+    directory = _symbol_dir(root, symbol)
+    if directory.exists() and not any(directory.iterdir()):
+        directory.rmdir()
+
+
+def _month(ts) -> str:
+    return pd.Timestamp(ts).strftime("%Y-%m")
+
+
+def _load_manifest(root: Path) -> dict:
+    path = root / MANIFEST
+    if not path.exists():
+        return {"layout": LAYOUT, "registry": None, "series": {}}
+    return json.loads(path.read_text())
+
+
+def _save_manifest(root: Path, manifest: dict) -> None:
+    tmp = root / f"{MANIFEST}.tmp"
+    tmp.write_text(json.dumps(manifest, indent=1, sort_keys=True))
+    os.replace(tmp, root / MANIFEST)
+
+
+def _to_arrow(df: pd.DataFrame) -> pa.Table:
+    # Float NaN stays a value rather than becoming a null, so float columns
+    # can be handed to NumPy without a copy.
+    return pa.table(
+        {
+            col: pa.array(df[col].to_numpy(), from_pandas=df[col].dtype.kind != "f")
+            for col in df.columns
+        }
+    )
+
+
+def _open(path: Path) -> pa.Table:
+    """Memory-map one Arrow file; its buffers point into the mapping."""
+    with pa.memory_map(str(path)) as source:
+        return pa.ipc.open_file(source).read_all()
+
+
+def _write(path: Path, table: pa.Table) -> None:
+    tmp = path.with_suffix(".tmp")
+    with pa.OSFile(str(tmp), "wb") as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    os.replace(tmp, path)
+
+
+def _parts(directory: Path, month: str) -> list[Path]:
+    """The files of one month, oldest rows first."""
+    return sorted(directory.glob(f"{month}.*.arrow"))
+
+
+def _merge(root: Path, symbol: str, type_: str, df: pd.DataFrame) -> None:
+    """Append ``df`` to the months of a series as new part files.
+
+    Existing files are not read or rewritten, except that a month with
+    ``MAX_PARTS`` parts is compacted into one file, so a month is
+    rewritten once every ``MAX_PARTS`` appends rather than on every sync.
+    """
+    directory = _series_dir(root, symbol, type_)
+    directory.mkdir(parents=True, exist_ok=True)
+    for month, rows in df.groupby(df.timestamp.dt.strftime("%Y-%m")):
+        parts = _parts(directory, month)
+        seq = int(parts[-1].stem.split(".")[1]) + 1 if parts else 0
+        _write(directory / f"{month}.{seq:04d}.arrow", _to_arrow(rows))
+        parts = _parts(directory, month)
+        if len(parts) >= MAX_PARTS:
+            table = pa.concat_tables(
+                [_open(path) for path in parts], promote_options="default"
+            )
+            _write(parts[0], table)
+            for path in parts[1:]:
+                path.unlink()
+
+
+def _after(symbol: str, type_: str, mark: datetime | None):
+    """The condition selecting rows of a series after ``mark``."""
+    condition = (FEATURES.c.symbol == symbol) & (FEATURES.c.type == type_)
+    if mark is not None:
+        condition &= FEATURES.c.timestamp > mark
+    return condition
+
+
+def sync(engine=engine, root=None, full: bool = False) -> int:
+    """Bring the Arrow files under ``root`` up to date with ``features``.
+
+    Rows are stored per series, a symbol with its asset type, in
+    ``symbol=<symbol>/type=<type>/<YYYY-MM>.<part>.arrow`` files. Only
+    rows newer than each series' last synced timestamp are read, one
+    series and chunk at a time, and written as new parts of their months.
+    A series whose row count no longer adds up (its features were rebuilt)
+    is rewritten, and so is the whole store when the indicator registry
+    or the file layout changed or ``full`` is set.
+
+    Parameters
+    ----------
+    root: str or pathlib.Path, optional
+        The store directory, ``store_dir`` (``FEATURE_STORE_DIR``) by
+        default.
+
+    Returns
+    -------
+    int
+        The number of rows written.
+    """
+    root = _root(root)
+    root.mkdir(parents=True, exist_ok=True)
+    manifest = _load_manifest(root)
+    if (
+        full
+        or manifest.get("layout") != LAYOUT
+        or manifest["registry"] != registry_signature()
+    ):
+        for directory in root.glob("symbol=*"):
+            shutil.rmtree(directory)
+        manifest = {"layout": LAYOUT, "registry": registry_signature(), "series": {}}
+        _save_manifest(root, manifest)
+    if not sqlalchemy.inspect(engine).has_table("features"):
+        logger.info("No features table to sync")
+        return 0
+    with engine.connect() as conn:
+        counts = conn.execute(
+            sqlalchemy.select(
+                FEATURES.c.symbol,
+                FEATURES.c.type,
+                sqlalchemy.func.count(),
+                sqlalchemy.func.max(FEATURES.c.timestamp),
+            ).group_by(FEATURES.c.symbol, FEATURES.c.type)
+        ).fetchall()
+    stored = manifest["series"]
+    written = 0
+    for symbol, type_, rows, newest in counts:
+        key = _key(symbol, type_)
+        entry = stored.get(key)
+        if entry is not None and (
+            entry["rows"] == rows and entry["mark"] == newest.isoformat()
+        ):
+            continue
+        mark = None if entry is None else datetime.fromisoformat(entry["mark"])
+        with engine.connect() as conn:
+            if entry is not None:
+                new = conn.execute(
+                    sqlalchemy.select(sqlalchemy.func.count())
+                    .select_from(FEATURES)
+                    .where(_after(symbol, type_, mark))
+                ).scalar()
+                if entry["rows"] + new != rows:
+                    logger.info("Features of %s (%s) were rebuilt", symbol, type_)
+                    _drop(root, symbol, type_)
+                    entry = mark = None
+            synced = 0 if entry is None else entry["rows"]
+            query = (
+                sqlalchemy.select(sqlalchemy.text("*"))
+                .select_from(FEATURES)
+                .where(_after(symbol, type_, mark))
+                .order_by(FEATURES.c.timestamp)
+            )
+            for df in read_chunks(query, conn, parse_dates=["timestamp"]):
+                _merge(root, symbol, type_, df)
+                written += len(df)
+                synced += len(df)
+                stored[key] = {
+                    "symbol": symbol,
+                    "type": type_,
+                    "mark": df.timestamp.max().isoformat(),
+                    "rows": synced,
+                }
+                # Saved per chunk, so an interrupted sync resumes there.
+                _save_manifest(root, manifest)
+    for key in set(stored) - {_key(*row[:2]) for row in counts}:
+        entry = stored.pop(key)
+        _drop(root, entry["symbol"], entry["type"])
+        _save_manifest(root, manifest)
+    logger.info("Synced %d feature rows to %s", written, root)
+    return written
+
+
+def read_table(
+    columns: list[str] | None = None,
+    symbols: list[str] | None = None,
+    start: datetime | None = None,
+    end: datetime | None = None,
+    root=None,
+) -> pa.Table:
+    """Memory-map the stored features without copying them.
+
+    Only the files of ``symbols`` (of every asset type) and of the months
+    overlapping ``[start, end)`` are opened, and only ``columns`` are
+    kept, so the pages of other columns are never read from disk. Rows
+    come ordered by symbol, type, then timestamp.
+
+    Returns
+    -------
+    pyarrow.Table
+        Chunked by file; columns missing from older files are null.
+    """
+    root = _root(root)
+    if columns is not None:
+        columns = list(dict.fromkeys(columns))
+    if symbols is None:
+        directories = sorted(root.glob("symbol=*/type=*"))
+    else:
+        directories = [
+            directory
+            for s in symbols
+            for directory in sorted(_symbol_dir(root, s).glob("type=*"))
+        ]
+    first = None if start is None else _month(start)
+    last = None if end is None else _month(end)
+    tables = []
+    for directory in directories:
+        for path in sorted(directory.glob("*.arrow")):
+            month = path.name[:7]
+            if (first and month < first) or (last and month > last):
+                continue
+            table = _open(path)
+            if columns is not None:
+                keep = {*columns, "timestamp"}
+                table = table.select([c for c in table.column_names if c in keep])
+            if month in (first, last):
+                ts = table.column("timestamp")
+                mask = pc.is_valid(ts)
+                if start is not None:
+                    bound = pa.scalar(start, ts.type)
+                    mask = pc.and_(mask, pc.greater_equal(ts, bound))
+                if end is not None:
+                    mask = pc.and_(mask, pc.less(ts, pa.scalar(end, ts.type)))
+                table = table.filter(mask)
+            if columns is not None:
+                table = table.select([c for c in columns if c in table.column_names])
+            tables.append(table)
+    if not tables:
+        return pa.table({c: pa.array([], pa.float64()) for c in columns or []})
+    return pa.concat_tables(tables, promote_options="default")
+
+
+def feature_matrix(
+    table: pa.Table,
+    columns: list[str],
+    order: np.ndarray | None = None,
+    dtype=np.float32,
+    out: np.ndarray | None = None,
+) -> np.ndarray:
+    """Stack ``columns`` of ``table`` into a ``(rows, columns)`` array.
+
+    Float columns are viewed straight from the memory-mapped buffers and
+    written into the result, which is the only copy made; nulls become
+    NaN. ``order`` optionally reorders the rows on the way. Pass ``out``
+    (e.g. a ``numpy.memmap``) to write into an existing array.
+    """
+    if out is None:
+        out = np.empty((table.num_rows, len(columns)), dtype=dtype)
+    for j, col in enumerate(columns):
+        chunks = [
+            c if pa.types.is_floating(c.type) else c.cast(pa.float64())
+            for c in table.column(col).chunks
+        ]
+        if order is not None:
+            values = np.concatenate(
+                [c.to_numpy(zero_copy_only=False) for c in chunks] or [np.empty(0)]
+            )
+            out[:, j] = values[order]
+            continue
+        stop = 0
+        for chunk in chunks:
+            start, stop = stop, stop + len(chunk)
+            out[start:stop, j] = chunk.to_numpy(zero_copy_only=False)
+    return out
+
+
+def codes(table: pa.Table, column: str) -> np.ndarray:
+    """``column`` of ``table`` as integer codes of its distinct values.
+
+    Codes follow the sorted values, so sorting by codes sorts by value.
+    """
+    values = table.column(column)
+    distinct = pc.unique(values).sort()
+    return pc.index_in(values, value_set=distinct).to_numpy()
+
+
+def read_frame(
+    columns: list[str] | None = None,
+    symbols: list[str] | None = None,
+    start: datetime | None = None,
+    end: datetime | None = None,
+    root=None,
+) -> pd.DataFrame:
+    """:func:`read_table` as a DataFrame, e.g. for backtests."""
+    return read_table(columns, symbols, start, end, root).to_pandas()
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(
+        description="Sync the features table to the Arrow feature store."
+    )
+    parser.add_argument(
+        "--full",
+        action="store_true",
+        help="rewrite the whole store instead of appending new rows",
+    )
+    args = parser.parse_args(argv)
+    sync(full=args.full)
+
+
+if __name__ == "__main__":
+    validate_env()
+    setup_logging()
+    main()
@@ -1,51 +1,366 @@
+import argparse
+import json
 import logging
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from multiprocessing import shared_memory
 
+import numpy as np
 import pandas as pd
 import sqlalchemy
 from sqlalchemy.exc import DatabaseError
-from vaderSentiment.vaderSentiment import SentimentIntensityAnalyzer
 
-from .config import DATABASE_URL, validate_env
+from . import indicators
+from .alignment import align
+from .bulk import read_frame, write_frame
+from .config import DATABASE_URL, FEATURE_WORKERS, available_cpus, validate_env
+from .init_db import feature_state
 from .logging_utils import setup_logging
 
 logger = logging.getLogger(__name__)
 
 
 engine = sqlalchemy.create_engine(DATABASE_URL)
-vader = SentimentIntensityAnalyzer()
 
+KEY_COLUMNS = ["symbol", "type"]
 
-def _sentiment(text: str) -> float:
+# Below this many rows a process pool costs more than it saves. Starting
+# the pool and copying through shared memory costs about 0.15 s plus
+# 0.35 us per row, against about 1.9 us per row of serial work, so the
+# pool breaks even near 125k rows on 4 cores and 225k on 2.
+POOL_MIN_ROWS = 250_000
+
+
+# Price rows past the per-(symbol, type) watermark; symbols without a
+# watermark yet are read in full.
+WATERMARK_JOIN = """
+    LEFT JOIN feature_state s
+      ON s.symbol = p.symbol AND s.type = p.type
+"""
+PAST_WATERMARK = "(s.watermark IS NULL OR p.timestamp > s.watermark)"
+
+FULL_BOUNDS = sqlalchemy.text("SELECT MIN(timestamp), MAX(timestamp) FROM price_data")
+INCREMENTAL_BOUNDS = sqlalchemy.text(
+    f"""
+    SELECT MIN(p.timestamp), MAX(p.timestamp)
+    FROM price_data p
+    {WATERMARK_JOIN}
+    WHERE {PAST_WATERMARK}
+    """
+)
+
+# Post-weighted mean sentiment across subreddits, one row per hour, read
+# from the rollup maintained at ingestion time. Only the hours between
+# ``:start`` and ``:end``, the bounds of the price rows being read, are
+# aggregated (a range scan on the indexed ``hour``), so an incremental run
+# does not regroup the whole table. Rows arriving after the bounds were
+# taken are left for the next run.
+HOURLY_SENTIMENT = """
+    LEFT JOIN (
+        SELECT hour,
+               SUM(compound_mean * post_count) / SUM(post_count) AS sentiment
+        FROM sentiment_hourly
+        WHERE hour >= :start AND hour <= :end
+        GROUP BY hour
+    ) h
+      ON h.hour = DATE_TRUNC('hour', p.timestamp)
+"""
+
+
+def _bounded(query: str) -> sqlalchemy.TextClause:
+    return sqlalchemy.text(query).bindparams(
+        sqlalchemy.bindparam("start", type_=sqlalchemy.DateTime),
+        sqlalchemy.bindparam("end", type_=sqlalchemy.DateTime),
+    )
+
+
+FULL_QUERY = _bounded(
+    f"""
+    SELECT p.*, COALESCE(h.sentiment, 0.0) AS sentiment_score
+    FROM price_data p
+    {HOURLY_SENTIMENT}
+    WHERE p.timestamp >= :start AND p.timestamp <= :end
+    ORDER BY p.timestamp
+    """
+)
+
+INCREMENTAL_QUERY = _bounded(
+    f"""
+    SELECT p.*, COALESCE(h.sentiment, 0.0) AS sentiment_score
+    FROM price_data p
+    {WATERMARK_JOIN}
+    {HOURLY_SENTIMENT}
+    WHERE {PAST_WATERMARK}
+      AND p.timestamp >= :start AND p.timestamp <= :end
+    ORDER BY p.timestamp
+    """
+)
+
+
+def _compute_block(
+    inputs: np.ndarray, outputs: np.ndarray, lo: int, hi: int, state
+) -> dict:
+    """Fill ``outputs[:, lo:hi]`` with the indicators of one symbol block.
+
+    ``inputs`` holds the price and volume rows, ``outputs`` one row per
+    indicator column, both in symbol-sorted order.
+    """
+    values, new_state = indicators.compute_symbol(
+        inputs[0, lo:hi], inputs[1, lo:hi], state
+    )
+    for i, col in enumerate(indicators.indicator_columns()):
+        outputs[i, lo:hi] = values[col]
+    return new_state
+
+
+def _shared_block(args) -> dict:
+    """Process-pool entry point: :func:`_compute_block` on shared arrays."""
+    (in_name, out_name, n_rows, n_cols), lo, hi, state = args
+    in_shm = shared_memory.SharedMemory(name=in_name)
+    out_shm = shared_memory.SharedMemory(name=out_name)
+    try:
+        inputs = np.ndarray((2, n_rows), dtype=np.float64, buffer=in_shm.buf)
+        outputs = np.ndarray((n_cols, n_rows), dtype=np.float64, buffer=out_shm.buf)
+        state = _compute_block(inputs, outputs, lo, hi, state)
+        del inputs, outputs  # release the buffers before closing
+        return state
+    finally:
+        in_shm.close()
+        out_shm.close()
+
+
+def _compute_parallel(
+    inputs: np.ndarray, blocks: list, states: dict, workers: int
+) -> tuple[np.ndarray, list]:
+    """Compute symbol blocks on a process pool over shared memory.
+
+    The input and output arrays live in ``multiprocessing.shared_memory``
+    segments; workers attach to them by name, so each task only pickles
+    its block bounds and indicator state.
+    """
+    n_cols = len(indicators.indicator_columns())
+    n_rows = inputs.shape[1]
+    in_shm = shared_memory.SharedMemory(create=True, size=inputs.nbytes)
+    out_shm = shared_memory.SharedMemory(create=True, size=max(1, n_cols * n_rows * 8))
+    try:
+        shared_in = np.ndarray(inputs.shape, np.float64, buffer=in_shm.buf)
+        shared_in[:] = inputs
+        shared_out = np.ndarray((n_cols, n_rows), np.float64, buffer=out_shm.buf)
+        shared_out[:] = np.nan
+        spec = (in_shm.name, out_shm.name, n_rows, n_cols)
+        tasks = [(spec, lo, hi, states.get(key)) for lo, hi, key in blocks]
+        chunksize = max(1, len(tasks) // (workers * 4))
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            new_states = list(pool.map(_shared_block, tasks, chunksize=chunksize))
+        outputs = shared_out.copy()
+        del shared_in, shared_out
+    finally:
+        in_shm.close()
+        in_shm.unlink()
+        out_shm.close()
+        out_shm.unlink()
+    logger.info(
+        "Computed features for %d symbols on %d processes",
+        len(blocks),
+        workers,
+    )
+    return outputs, new_states
+
+
+def compute_features(
+    df: pd.DataFrame, states: dict | None = None, workers: int = 1
+) -> tuple[pd.DataFrame, dict]:
+    """Add the registered indicators to ``df``, one symbol at a time.
+
+    Rows are sorted once into contiguous per-``(symbol, type)`` blocks and
+    each block's price and volume arrays go through every indicator in
+    :data:`~trading_intel.indicators.INDICATORS`, so values never mix
+    across assets. The price is ``price``, or ``close`` where that is
+    missing (stock and yfinance rows).
+
+    Parameters
+    ----------
+    df: pandas.DataFrame
+        Rows ordered by timestamp, with ``symbol``, ``type`` and ``price``
+        or ``close``.
+    states: dict, optional
+        Saved state per ``(symbol, type)`` from a previous call. Missing
+        keys start from scratch.
+    workers: int
+        Processes to spread the symbols over, at most the available
+        CPUs. Batches smaller than ``POOL_MIN_ROWS`` rows are always
+        computed in-process.
+
+    Returns
+    -------
+    tuple
+        The feature rows (in the input order) and the updated states.
+    """
+    states = dict(states or {})
+    out = df.copy()
+    columns = indicators.indicator_columns()
+    if out.empty:
+        return out.reindex(columns=[*out.columns, "hour", *columns]), states
+    out["hour"] = out.timestamp.dt.hour
+    nan = pd.Series(np.nan, index=out.index)
+    price = out.get("price", nan).astype(float)
+    if "close" in out:
+        price = price.fillna(out.close.astype(float))
+    volume = out.get("volume", nan).astype(float)
+
+    order = np.lexsort(
+        (
+            np.arange(len(out)),
+            out.type.astype(str).to_numpy(),
+            out.symbol.astype(str).to_numpy(),
+        )
+    )
+    symbol = out.symbol.to_numpy()[order]
+    type_ = out.type.to_numpy()[order]
+    starts = np.flatnonzero((symbol[1:] != symbol[:-1]) | (type_[1:] != type_[:-1]))
+    bounds = np.concatenate([[0], starts + 1, [len(out)]])
+    blocks = [
+        (int(lo), int(hi), (symbol[lo], type_[lo]))
+        for lo, hi in zip(bounds[:-1], bounds[1:])
+    ]
+    inputs = np.vstack([price.to_numpy()[order], volume.to_numpy()[order]])
+    workers = min(workers, available_cpus())
+    if workers > 1 and len(blocks) > 1 and len(out) >= POOL_MIN_ROWS:
+        outputs, new_states = _compute_parallel(inputs, blocks, states, workers)
+    else:
+        outputs = np.full((len(columns), len(out)), np.nan)
+        new_states = [
+            _compute_block(inputs, outputs, lo, hi, states.get(key))
+            for lo, hi, key in blocks
+        ]
+    for (_, _, key), state in zip(blocks, new_states):
+        states[key] = state
+    inverse = np.empty_like(order)
+    inverse[order] = np.arange(len(order))
+    for col, values in zip(columns, outputs):
+        out[col] = values[inverse]
+    return out, states
+
+
+def load_states(conn) -> dict:
+    """The stored indicator states, keyed by ``(symbol, type)``."""
+    rows = conn.execute(sqlalchemy.select(feature_state)).fetchall()
+    return {(r.symbol, r.type): json.loads(r.state) for r in rows}
+
+
+def save_states(conn, df: pd.DataFrame, states: dict, full: bool) -> None:
+    """Store ``states`` with the newest timestamp of each series in ``df``.
+
+    With ``full`` the stored states of every series are replaced.
+    """
+    watermarks = df.groupby(KEY_COLUMNS, sort=False).timestamp.max()
+    if full:
+        conn.execute(feature_state.delete())
+    for key, watermark in watermarks.items():
+        symbol, type_ = key
+        conn.execute(
+            feature_state.delete().where(
+                (feature_state.c.symbol == symbol) & (feature_state.c.type == type_)
+            )
+        )
+        conn.execute(
+            feature_state.insert().values(
+                symbol=symbol,
+                type=type_,
+                watermark=watermark.to_pydatetime(),
+                state=json.dumps(states[key]),
+            )
+        )
+
+
+def _time_bounds(full: bool) -> tuple[datetime, datetime] | None:
+    """The first hour and last timestamp of the price rows to read.
+
+    Returns ``None`` when there are no rows to read.
+    """
+    with engine.connect() as conn:
+        low, high = conn.execute(FULL_BOUNDS if full else INCREMENTAL_BOUNDS).one()
+    if low is None:
+        return None
     return (
-        vader.polarity_scores(text)["compound"]
-        if isinstance(text, str) and text
-        else 0.0
+        pd.Timestamp(low).floor("h").to_pydatetime(),
+        pd.Timestamp(high).to_pydatetime(),
     )
 
 
-def create_features():
-    query = """
-        SELECT p.*, r.title
-        FROM price_data p
-        LEFT JOIN reddit_data r
-          ON DATE_TRUNC('hour', p.timestamp) = DATE_TRUNC('hour', r.timestamp)
-        ORDER BY p.timestamp
+def create_features(
+    full_rebuild: bool = False, workers: int = FEATURE_WORKERS
+) -> pd.DataFrame:
+    """Build the ``features`` table from prices, sentiment and aligned data.
+
+    By default only rows newer than each symbol's watermark are computed
+    and appended, continuing from the saved indicator state. A full
+    rebuild recomputes everything and replaces the table in a single
+    transaction, so readers never observe it missing; it also happens
+    automatically when the registered indicators have changed since the
+    state was saved.
     """
     try:
-        df = pd.read_sql(query, engine)
+        feature_state.create(engine, checkfirst=True)
+        with engine.connect() as conn:
+            states = {} if full_rebuild else load_states(conn)
+        stale = not all(map(indicators.state_is_current, states.values()))
+        if stale:
+            logger.info("Indicator set changed; rebuilding all features")
+        full = (
+            full_rebuild
+            or stale
+            or not states
+            or not sqlalchemy.inspect(engine).has_table("features")
+        )
+        bounds = _time_bounds(full)
+        df = (
+            pd.DataFrame()
+            if bounds is None
+            else read_frame(
+                FULL_QUERY if full else INCREMENTAL_QUERY,
+                engine,
+                params=dict(zip(["start", "end"], bounds)),
+            )
+        )
     except DatabaseError as exc:  # tables may not exist
         logger.error("Failed to read tables for features: %s", exc)
         return pd.DataFrame()
-    df["hour"] = df.timestamp.dt.hour
-    df["price_diff"] = df.price.pct_change()
-    df["ema_12"] = df.price.ewm(span=12).mean()
-    df["sentiment_score"] = df.title.apply(_sentiment)
-    df.dropna(subset=["price_diff", "ema_12"], inplace=True)
-    df.to_sql("features", engine, if_exists="replace", index=False)
-    logger.info("Features table created with %d rows", len(df))
+    if df.empty:
+        logger.info("No new rows for features")
+        return df
+    df, states = compute_features(df, {} if full else states, workers)
+    df = align(df, engine)
+    rows = df.dropna(subset=indicators.REQUIRED_COLUMNS)
+    with engine.begin() as conn:
+        write_frame(rows, "features", conn, if_exists="replace" if full else "append")
+        save_states(conn, df, states, full)
+    logger.info(
+        "Features table %s with %d rows",
+        "rebuilt" if full else "extended",
+        len(rows),
+    )
+    return rows
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Build the features table.")
+    parser.add_argument(
+        "--full-rebuild",
+        action="store_true",
+        help="recompute all features instead of appending new rows",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=FEATURE_WORKERS,
+        help="processes used to compute symbols in parallel",
+    )
+    args = parser.parse_args(argv)
+    create_features(full_rebuild=args.full_rebuild, workers=args.workers)
 
 
 if __name__ == "__main__":
     validate_env()
     setup_logging()
-    create_features()
+    main()
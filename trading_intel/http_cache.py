@@ -0,0 +1,234 @@
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+from typing import NamedTuple
+
+from .config import HTTP_CACHE_PATH, HTTP_CACHE_RETAIN, HTTP_CACHE_TTLS
+
+logger = logging.getLogger(__name__)
+
+# Outcomes counted per provider. ``hit`` and ``revalidated`` responses were
+# not downloaded again; ``unchanged`` ones were, but matched the stored hash.
+OUTCOMES = ("hit", "revalidated", "unchanged", "miss")
+
+# Query parameters carrying credentials. They are left out of cache keys,
+# so the cache file never holds an API key and rotating one keeps entries.
+SECRET_PARAMS = frozenset({"apikey", "api_key", "access_token", "token"})
+
+# Seconds between prunes of expired entries by a long-lived cache.
+PRUNE_INTERVAL = 3600
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    provider TEXT,
+    stored_at REAL NOT NULL,
+    etag TEXT,
+    last_modified TEXT,
+    digest TEXT NOT NULL,
+    body BLOB
+);
+CREATE TABLE IF NOT EXISTS stats (
+    provider TEXT NOT NULL,
+    outcome TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (provider, outcome)
+);
+"""
+
+
+class Entry(NamedTuple):
+    stored_at: float
+    etag: str | None
+    last_modified: str | None
+    digest: str
+    body: bytes | None
+
+
+def cache_key(method: str, url: str, params: dict | None = None) -> str:
+    """Identify a request by method, URL and (sorted) query parameters.
+
+    Credential parameters (:data:`SECRET_PARAMS`) are not part of the key.
+    """
+    params = {k: v for k, v in (params or {}).items() if k.lower() not in SECRET_PARAMS}
+    query = json.dumps(params, sort_keys=True, default=str)
+    return f"{method} {url} {query}"
+
+
+def digest(body: bytes) -> str:
+    return hashlib.sha256(body).hexdigest()
+
+
+class ResponseCache:
+    """SQLite store of HTTP response bodies and their validators.
+
+    Each entry keeps the body, its SHA-256 digest and the ``ETag`` and
+    ``Last-Modified`` headers it was served with. Entries younger than the
+    provider's TTL are served without a request; older ones are
+    revalidated with a conditional request. Outcome counts are kept in the
+    same file, so they accumulate across runs. Entries unused for
+    ``retain`` seconds are pruned on opening and then hourly.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        ttls: dict[str, float] | None = None,
+        retain: float = HTTP_CACHE_RETAIN,
+    ):
+        self.path = path
+        self.ttls = HTTP_CACHE_TTLS if ttls is None else ttls
+        self.retain = retain
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.executescript(_SCHEMA)
+        with self._conn:
+            # Keys written before credentials were left out of them.
+            for name in SECRET_PARAMS:
+                self._conn.execute(
+                    "DELETE FROM responses WHERE key LIKE ?", (f'%"{name}":%',)
+                )
+        self.prune()
+
+    def ttl(self, provider: str | None) -> float:
+        return self.ttls.get(provider, 0.0)
+
+    def get(self, key: str) -> Entry | None:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT stored_at, etag, last_modified, digest, body "
+                "FROM responses WHERE key = ?",
+                (key,),
+            ).fetchone()
+        return None if row is None else Entry(*row)
+
+    def is_fresh(self, entry: Entry, provider: str | None) -> bool:
+        return time.time() - entry.stored_at < self.ttl(provider)
+
+    def put(
+        self,
+        key: str,
+        provider: str | None,
+        body: bytes | None,
+        body_digest: str,
+        etag: str | None = None,
+        last_modified: str | None = None,
+    ) -> None:
+        if time.time() - self._pruned_at >= PRUNE_INTERVAL:
+            self.prune()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (
+                    key,
+                    provider,
+                    time.time(),
+                    etag,
+                    last_modified,
+                    body_digest,
+                    body,
+                ),
+            )
+
+    def touch(self, key: str) -> None:
+        """Restart an entry's TTL after the server confirmed it (304)."""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE responses SET stored_at = ? WHERE key = ?",
+                (time.time(), key),
+            )
+
+    def seen(self, key: str, provider: str, body_digest: str) -> bool:
+        """Record content fetched outside the HTTP client by its digest.
+
+        Returns whether ``key`` already had the same digest, counting an
+        ``unchanged`` or ``miss`` outcome for ``provider``.
+        """
+        entry = self.get(key)
+        if entry is not None and entry.digest == body_digest:
+            self.touch(key)
+            self.count(provider, "unchanged")
+            return True
+        self.put(key, provider, None, body_digest)
+        self.count(provider, "miss")
+        return False
+
+    def prune(self) -> int:
+        """Drop entries older than ``retain`` and their provider's TTL.
+
+        Returns the number of entries dropped.
+        """
+        now = time.time()
+        dropped = 0
+        with self._lock, self._conn:
+            providers = self._conn.execute(
+                "SELECT DISTINCT provider FROM responses"
+            ).fetchall()
+            for (provider,) in providers:
+                cutoff = now - max(self.retain, self.ttl(provider))
+                dropped += self._conn.execute(
+                    "DELETE FROM responses WHERE provider IS ? AND stored_at < ?",
+                    (provider, cutoff),
+                ).rowcount
+            self._pruned_at = now
+        if dropped:
+            logger.info("Pruned %d expired HTTP cache entries", dropped)
+        return dropped
+
+    def invalidate(self, provider: str) -> int:
+        """Drop a provider's entries, e.g. after its data failed to store."""
+        with self._lock, self._conn:
+            return self._conn.execute(
+                "DELETE FROM responses WHERE provider = ?", (provider,)
+            ).rowcount
+
+    def count(self, provider: str | None, outcome: str) -> None:
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO stats VALUES (?, ?, 1) "
+                "ON CONFLICT (provider, outcome) DO UPDATE "
+                "SET count = count + 1",
+                (provider or "", outcome),
+            )
+
+    def stats(self) -> dict[str, dict[str, int]]:
+        """Outcome counts per provider since the cache file was created."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT provider, outcome, count FROM stats"
+            ).fetchall()
+        out: dict[str, dict[str, int]] = {}
+        for provider, outcome, n in rows:
+            out.setdefault(provider, dict.fromkeys(OUTCOMES, 0))[outcome] = n
+        return out
+
+    def close(self) -> None:
+        self._conn.close()
+
+
+_shared: ResponseCache | None = None
+
+
+def shared_cache() -> ResponseCache | None:
+    """The process-wide cache at ``HTTP_CACHE_PATH``; None if disabled."""
+    global _shared
+    if _shared is None and HTTP_CACHE_PATH:
+        _shared = ResponseCache(HTTP_CACHE_PATH)
+    return _shared
+
+
+def format_stats(stats: dict[str, dict[str, int]]) -> str:
+    """One line per provider with its outcome counts and saved share."""
+    lines = []
+    for provider, counts in sorted(stats.items()):
+        total = sum(counts.values())
+        saved = counts["hit"] + counts["revalidated"]
+        lines.append(
+            f"{provider}: "
+            + ", ".join(f"{k} {counts[k]}" for k in OUTCOMES)
+            + f" ({saved / total:.0%} not downloaded)"
+        )
+    return "\n".join(lines)
@@ -0,0 +1,319 @@
+import asyncio
+import logging
+import random
+import time
+from json import loads
+from typing import Any, NamedTuple
+
+import aiohttp
+
+from .config import (
+    HTTP_MAX_CONCURRENCY,
+    HTTP_MAX_PER_HOST,
+    HTTP_RETRIES,
+    RATE_BURSTS,
+    RATE_LIMITS,
+)
+from .http_cache import ResponseCache, cache_key, digest, shared_cache
+
+logger = logging.getLogger(__name__)
+
+# Statuses worth retrying; any other 4xx is raised immediately.
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+BACKOFF_BASE = 1.0
+BACKOFF_CAP = 30.0
+
+# Returned by ``request_json(..., if_changed=True)`` for a body that is the
+# same as the last one received for the request.
+UNCHANGED = object()
+
+
+class _Response(NamedTuple):
+    status: int
+    body: bytes
+    etag: str | None
+    last_modified: str | None
+
+
+def backoff_delay(attempt: int, retry_after: float | None = None) -> float:
+    """Seconds to wait before retry ``attempt`` (0-based), with full jitter.
+
+    A server-provided ``Retry-After`` takes precedence.
+    """
+    if retry_after is not None:
+        return retry_after
+    return random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2**attempt))
+
+
+def _retry_after(resp: aiohttp.ClientResponse) -> float | None:
+    try:
+        return float(resp.headers["Retry-After"])
+    except (KeyError, ValueError):
+        return None
+
+
+class TokenBucket:
+    """Async token bucket allowing ``per_minute`` requests per minute.
+
+    Up to ``burst`` requests may go out back to back; after that callers
+    wait in FIFO order until a token has been refilled, so a provider's
+    quota is respected up front instead of being discovered through 429s.
+    """
+
+    def __init__(self, per_minute: float, burst: float = 1.0) -> None:
+        if burst < 1:
+            # A bucket that never holds a whole token would wait forever.
+            raise ValueError(f"burst must be at least 1, got {burst}")
+        self.rate = per_minute / 60.0
+        self.capacity = burst
+        self._tokens = burst
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(
+                    self.capacity,
+                    self._tokens + (now - self._updated) * self.rate,
+                )
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+class AsyncHTTP:
+    """Pooled keep-alive HTTP client shared by all async fetchers.
+
+    One ``aiohttp.ClientSession`` is reused for every request so TCP and
+    TLS connections stay open between calls. A semaphore caps the number
+    of requests in flight across all sources, each provider has its own
+    :class:`TokenBucket`, and retries back off with ``asyncio.sleep``
+    instead of blocking a thread. GET responses are kept in ``cache``, if
+    given, and revalidated instead of downloaded again.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int = HTTP_MAX_CONCURRENCY,
+        max_per_host: int = HTTP_MAX_PER_HOST,
+        retries: int = HTTP_RETRIES,
+        rate_limits: dict[str, float] | None = None,
+        bursts: dict[str, float] | None = None,
+        cache: ResponseCache | None = None,
+    ) -> None:
+        if retries < 1:
+            # The count includes the first attempt; with none, a request
+            # would never be sent.
+            raise ValueError(f"retries must be at least 1, got {retries}")
+        self.max_per_host = max_per_host
+        self.cache = cache
+        self.retries = retries
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._session: aiohttp.ClientSession | None = None
+        limits = RATE_LIMITS if rate_limits is None else rate_limits
+        bursts = RATE_BURSTS if bursts is None else bursts
+        self.limiters = {
+            provider: TokenBucket(per_minute, bursts.get(provider, 1.0))
+            for provider, per_minute in limits.items()
+            if per_minute > 0
+        }
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=0,  # the semaphore is the global limit
+                limit_per_host=self.max_per_host,
+                keepalive_timeout=60,
+                ttl_dns_cache=300,
+            )
+            self._session = aiohttp.ClientSession(connector=connector)
+        return self._session
+
+    async def _request(
+        self,
+        method: str,
+        url: str,
+        params: dict | None,
+        headers: dict | None,
+        json: Any,
+        timeout: float,
+        provider: str | None,
+    ) -> _Response:
+        """Send a request, retrying transient errors; returns the raw body.
+
+        Every attempt first takes a token from ``provider``'s rate limiter,
+        when one is configured.
+
+        Raises
+        ------
+        aiohttp.ClientError or asyncio.TimeoutError
+            When the last attempt fails.
+        """
+        limiter = self.limiters.get(provider)
+        for attempt in range(self.retries):
+            retry_after = None
+            if limiter is not None:
+                await limiter.acquire()
+            try:
+                async with self._semaphore:
+                    async with self.session.request(
+                        method,
+                        url,
+                        params=params,
+                        headers=headers,
+                        json=json,
+                        timeout=aiohttp.ClientTimeout(total=timeout),
+                    ) as resp:
+                        if resp.status in RETRY_STATUSES:
+                            retry_after = _retry_after(resp)
+                        resp.raise_for_status()
+                        return _Response(
+                            resp.status,
+                            await resp.read(),
+                            resp.headers.get("ETag"),
+                            resp.headers.get("Last-Modified"),
+                        )
+            except aiohttp.ClientResponseError as exc:
+                if exc.status not in RETRY_STATUSES:
+                    raise
+                error: Exception = exc
+            except (aiohttp.ClientError, asyncio.TimeoutError) as exc:
+                error = exc
+            if attempt + 1 == self.retries:
+                raise error
+            delay = backoff_delay(attempt, retry_after)
+            logger.warning(
+                "Attempt %d for %s failed (%s); retrying in %.1fs",
+                attempt + 1,
+                url,
+                error,
+                delay,
+            )
+            await asyncio.sleep(delay)
+
+    async def _cached_get(
+        self,
+        url: str,
+        params: dict | None,
+        headers: dict | None,
+        timeout: float,
+        provider: str | None,
+    ) -> tuple[bytes, str]:
+        """GET through the response cache; returns the body and outcome."""
+        cache = self.cache
+        key = cache_key("GET", url, params)
+        entry = await asyncio.to_thread(cache.get, key)
+        cached = entry is not None and entry.body is not None
+        if cached and cache.is_fresh(entry, provider):
+            return entry.body, "hit"
+        headers = dict(headers or {})
+        if cached and entry.etag:
+            headers["If-None-Match"] = entry.etag
+        if cached and entry.last_modified:
+            headers["If-Modified-Since"] = entry.last_modified
+        resp = await self._request("GET", url, params, headers, None, timeout, provider)
+        if resp.status == 304 and cached:
+            await asyncio.to_thread(cache.touch, key)
+            return entry.body, "revalidated"
+        body_digest = digest(resp.body)
+        await asyncio.to_thread(
+            cache.put,
+            key,
+            provider,
+            resp.body,
+            body_digest,
+            resp.etag,
+            resp.last_modified,
+        )
+        if entry is not None and entry.digest == body_digest:
+            return resp.body, "unchanged"
+        return resp.body, "miss"
+
+    async def request_json(
+        self,
+        method: str,
+        url: str,
+        *,
+        params: dict | None = None,
+        headers: dict | None = None,
+        json: Any = None,
+        timeout: float = 15,
+        provider: str | None = None,
+        if_changed: bool = False,
+    ) -> Any:
+        """Send a request and decode the JSON body, retrying transient errors.
+
+        GET requests go through the response cache when the client has
+        one. With ``if_changed``, :data:`UNCHANGED` is returned instead of
+        the decoded body when it is the same as the last one received for
+        the request, so the caller can skip processing it again.
+
+        Raises
+        ------
+        aiohttp.ClientError or asyncio.TimeoutError
+            When the last attempt fails.
+        """
+        if self.cache is None or method != "GET":
+            resp = await self._request(
+                method, url, params, headers, json, timeout, provider
+            )
+            return loads(resp.body)
+        body, outcome = await self._cached_get(url, params, headers, timeout, provider)
+        await asyncio.to_thread(self.cache.count, provider, outcome)
+        if if_changed and outcome != "miss":
+            return UNCHANGED
+        return loads(body)
+
+    async def get_json(self, url: str, **kwargs) -> Any:
+        return await self.request_json("GET", url, **kwargs)
+
+    async def post_json(self, url: str, json: Any, **kwargs) -> Any:
+        return await self.request_json("POST", url, json=json, **kwargs)
+
+    async def close(self) -> None:
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+
+# Sessions and semaphores belong to one event loop, so each loop gets its
+# own client.
+_clients: dict[asyncio.AbstractEventLoop, AsyncHTTP] = {}
+
+
+def get_client() -> AsyncHTTP:
+    """The shared client for the running event loop."""
+    loop = asyncio.get_running_loop()
+    for stale in [lp for lp in _clients if lp.is_closed()]:
+        del _clients[stale]
+    if loop not in _clients:
+        _clients[loop] = AsyncHTTP(cache=shared_cache())
+    return _clients[loop]
+
+
+async def close_client() -> None:
+    """Close the running loop's client, if one was created."""
+    client = _clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.close()
+
+
+def run_sync(coro):
+    """Run ``coro`` to completion from blocking code.
+
+    Used by the synchronous ``fetch_*`` wrappers; the loop's client is
+    closed afterwards.
+    """
+
+    async def runner():
+        try:
+            return await coro
+        finally:
+            await close_client()
+
+    return asyncio.run(runner())
@@ -0,0 +1,242 @@
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+from .alignment import aligned_columns
+
+EMA_SPANS = (12, 26)
+SMA_WINDOWS = (10, 20, 50)
+RSI_PERIOD = 14
+MACD_SPANS = (12, 26, 9)
+VOLATILITY_WINDOW = 24
+VOLUME_Z_WINDOW = 24
+
+# Feature rows missing any of these are not stored.
+REQUIRED_COLUMNS = ["price_diff", "ema_12"]
+# Model inputs that are not price indicators.
+EXTRA_FEATURES = ["sentiment_score"]
+
+
+class Window:
+    """NumPy view of one symbol's data handed to each indicator.
+
+    ``close`` and ``volume`` hold the saved warm-up tail followed by the new
+    rows (prices forward-filled), so rolling indicators can look back across
+    the boundary; ``start`` is the index of the first new row. ``raw`` holds
+    the new, unfilled prices for the exponential averages, which carry their
+    own state instead of a tail.
+    """
+
+    def __init__(self, close, volume, raw, start):
+        self.close = close
+        self.volume = volume
+        self.raw = raw
+        self.start = start
+
+    def new(self, values: np.ndarray) -> np.ndarray:
+        """The part of a tail-plus-new array covering the new rows."""
+        return values[self.start :]  # noqa: E203
+
+
+class Indicator:
+    def __init__(self, name, columns, fn, lookback):
+        self.name = name
+        self.columns = columns
+        self.fn = fn
+        self.lookback = lookback
+
+
+# Indicators by name, in registration order; see :func:`register`.
+INDICATORS: dict[str, Indicator] = {}
+
+
+def register(name: str, columns: list[str] | None = None, lookback: int = 0):
+    """Register ``fn(window, state)`` as the indicator ``name``.
+
+    ``fn`` returns one array per name in ``columns`` (default ``[name]``),
+    each covering the window's new rows, and may keep running values in
+    ``state`` (a JSON-serialisable dict private to the indicator) to
+    continue exactly on the next batch. ``lookback`` is the number of rows
+    before the batch that the indicator needs to see.
+    """
+
+    def decorator(fn):
+        INDICATORS[name] = Indicator(name, columns or [name], fn, lookback)
+        return fn
+
+    return decorator
+
+
+def indicator_columns() -> list[str]:
+    return [c for ind in INDICATORS.values() for c in ind.columns]
+
+
+def feature_columns() -> list[str]:
+    """Model inputs: registered indicators, aligned sources and sentiment."""
+    return indicator_columns() + aligned_columns() + EXTRA_FEATURES
+
+
+def registry_signature() -> list[str]:
+    """Identifies the feature set a saved state was computed for."""
+    return list(INDICATORS) + aligned_columns()
+
+
+def tail_length() -> int:
+    """Rows of history kept per symbol for the rolling indicators."""
+    return max((ind.lookback for ind in INDICATORS.values()), default=0) + 1
+
+
+def ewm(values: np.ndarray, alpha: float, state: dict, key: str) -> np.ndarray:
+    """Adjusted exponential moving average continuing from ``state[key]``.
+
+    ``pandas.Series.ewm(alpha=alpha).mean()`` is the ratio of two decaying
+    sums, ``num / den``. Carrying both sums across calls makes chunked
+    evaluation produce the same values as a single pass over the history.
+    """
+    num, den = state.get(key, (0.0, 0.0))
+    n = len(values)
+    if n == 0:
+        return np.empty(0)
+    series = pd.Series(values, dtype=float)
+    chunk_num = series.fillna(0.0).ewm(alpha=alpha).sum().to_numpy()
+    chunk_den = series.notna().astype(float).ewm(alpha=alpha).sum().to_numpy()
+    carry = (1.0 - alpha) ** np.arange(1, n + 1)
+    total_num = chunk_num + carry * num
+    total_den = chunk_den + carry * den
+    state[key] = [float(total_num[-1]), float(total_den[-1])]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(total_den > 0, total_num / total_den, np.nan)
+
+
+def span_alpha(span: int) -> float:
+    return 2.0 / (span + 1.0)
+
+
+def rolling(values: np.ndarray, window: int, func) -> np.ndarray:
+    """``func`` over each trailing ``window``; NaN until the window fills."""
+    out = np.full(len(values), np.nan)
+    if len(values) >= window:
+        with np.errstate(invalid="ignore", divide="ignore"):
+            out[window - 1 :] = func(  # noqa: E203
+                sliding_window_view(values, window), axis=-1
+            )
+    return out
+
+
+def _std(values: np.ndarray, axis: int) -> np.ndarray:
+    return np.std(values, axis=axis, ddof=1)
+
+
+def pct_change(close: np.ndarray) -> np.ndarray:
+    out = np.full(len(close), np.nan)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        out[1:] = close[1:] / close[:-1] - 1
+    return out
+
+
+@register("price_diff", lookback=1)
+def returns(w: Window, state: dict) -> list[np.ndarray]:
+    return [w.new(pct_change(w.close))]
+
+
+def _ema_indicator(span: int):
+    def ema(w: Window, state: dict) -> list[np.ndarray]:
+        return [ewm(w.raw, span_alpha(span), state, "ema")]
+
+    return ema
+
+
+def _sma_indicator(window: int):
+    def sma(w: Window, state: dict) -> list[np.ndarray]:
+        return [w.new(rolling(w.close, window, np.mean))]
+
+    return sma
+
+
+for _span in EMA_SPANS:
+    register(f"ema_{_span}")(_ema_indicator(_span))
+for _window in SMA_WINDOWS:
+    register(f"sma_{_window}", lookback=_window - 1)(_sma_indicator(_window))
+
+
+@register(f"rsi_{RSI_PERIOD}", lookback=1)
+def rsi(w: Window, state: dict) -> list[np.ndarray]:
+    """Relative strength index with Wilder's ``1 / period`` smoothing."""
+    delta = w.new(np.diff(w.close, prepend=np.nan))
+    alpha = 1.0 / RSI_PERIOD
+    gain = ewm(np.clip(delta, 0, None), alpha, state, "gain")
+    loss = ewm(np.clip(-delta, 0, None), alpha, state, "loss")
+    with np.errstate(invalid="ignore", divide="ignore"):
+        value = 100 - 100 / (1 + gain / loss)
+    flat = np.where(gain > 0, 100.0, 50.0)
+    return [np.where(loss == 0, flat, value)]
+
+
+@register("macd", columns=["macd", "macd_signal", "macd_hist"])
+def macd(w: Window, state: dict) -> list[np.ndarray]:
+    fast, slow, signal = MACD_SPANS
+    line = ewm(w.raw, span_alpha(fast), state, "fast") - ewm(
+        w.raw, span_alpha(slow), state, "slow"
+    )
+    sig = ewm(line, span_alpha(signal), state, "signal")
+    return [line, sig, line - sig]
+
+
+@register(f"volatility_{VOLATILITY_WINDOW}", lookback=VOLATILITY_WINDOW)
+def volatility(w: Window, state: dict) -> list[np.ndarray]:
+    """Rolling (sample) standard deviation of returns."""
+    return [w.new(rolling(pct_change(w.close), VOLATILITY_WINDOW, _std))]
+
+
+@register(f"volume_z_{VOLUME_Z_WINDOW}", lookback=VOLUME_Z_WINDOW - 1)
+def volume_z(w: Window, state: dict) -> list[np.ndarray]:
+    """Volume in standard deviations from its rolling mean."""
+    mean = rolling(w.volume, VOLUME_Z_WINDOW, np.mean)
+    std = rolling(w.volume, VOLUME_Z_WINDOW, _std)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        z = (w.volume - mean) / std
+    return [w.new(np.where(std == 0, 0.0, z))]
+
+
+def compute_symbol(
+    price: np.ndarray, volume: np.ndarray, state: dict | None
+) -> tuple[dict[str, np.ndarray], dict]:
+    """Run every registered indicator over one symbol's new rows.
+
+    Parameters
+    ----------
+    price, volume: numpy.ndarray
+        The symbol's new rows, ordered by timestamp.
+    state: dict, optional
+        The state returned by the previous call for this symbol.
+
+    Returns
+    -------
+    tuple
+        Column arrays covering the new rows, and the updated state.
+    """
+    state = state or {}
+    tail_close = np.asarray(state.get("close", []), dtype=float)
+    tail_volume = np.asarray(state.get("volume", []), dtype=float)
+    close = pd.Series(np.concatenate([tail_close, price])).ffill().to_numpy()
+    volume = np.concatenate([tail_volume, volume])
+    window = Window(close, volume, price, len(tail_close))
+    saved = state.get("indicators", {})
+    columns, indicators = {}, {}
+    for name, ind in INDICATORS.items():
+        indicators[name] = dict(saved.get(name, {}))
+        values = ind.fn(window, indicators[name])
+        columns.update(zip(ind.columns, values))
+    keep = tail_length()
+    new_state = {
+        "registry": registry_signature(),
+        "close": close[-keep:].tolist(),
+        "volume": volume[-keep:].tolist(),
+        "indicators": indicators,
+    }
+    return columns, new_state
+
+
+def state_is_current(state: dict) -> bool:
+    """Whether ``state`` was produced for the current feature set."""
+    return state.get("registry") == registry_signature()
@@ -2,15 +2,24 @@ import logging
 import time
 from pathlib import Path
 
-import numpy as np
 import onnxruntime as ort
 import pandas as pd
 import sqlalchemy
 
-from .config import DATABASE_URL, validate_env
-from .features import create_features
-from .ingestion import fetch_crypto, fetch_eth_chain, fetch_reddit, fetch_stock
+from .config import (
+    DATABASE_URL,
+    FEATURE_BUFFER_ROWS,
+    SEQ_LEN,
+    SOURCE_INTERVALS,
+    validate_env,
+)
+from .http_client import run_sync
+from .indicators import feature_columns
+from .ingestion import fetch_all
 from .logging_utils import setup_logging
+from .pipeline import FeaturePipeline
+from .scheduler import CadenceScheduler
+from .sequences import last_windows
 
 logger = logging.getLogger(__name__)
 
@@ -21,25 +30,83 @@ if not onnx_path.exists():
     raise SystemExit(1)
 sess = ort.InferenceSession(str(onnx_path))
 
+# Sources whose rows are price observations; their fetched frames feed the
+# feature pipeline directly. Reddit posts reach it through the hourly
+# sentiment rollup.
+PRICE_SOURCES = {"crypto", "stock", "yfinance", "fred"}
+
+scheduler = CadenceScheduler(SOURCE_INTERVALS)
+# Buffers hold at least one model input sequence per symbol.
+pipeline = FeaturePipeline(engine, max(FEATURE_BUFFER_ROWS, SEQ_LEN))
+
+
+def predict(pipeline: FeaturePipeline, keys) -> pd.Series:
+    """Run the ONNX model on the last ``SEQ_LEN`` rows of each symbol.
+
+    Returns
+    -------
+    pandas.Series
+        One prediction per ``(symbol, type)`` of ``keys`` with enough
+        buffered rows.
+    """
+    keys = list(keys)
+    windows, found = last_windows(
+        [pipeline.recent(*key) for key in keys], feature_columns(), SEQ_LEN
+    )
+    if not found:
+        return pd.Series(dtype=float)
+    out = sess.run(None, {"input": windows})[0].reshape(-1)
+    return pd.Series(out, index=pd.MultiIndex.from_tuples([keys[i] for i in found]))
+
+
+async def run_tick() -> float:
+    """Fetch the sources that are due, then update features and predict.
+
+    Fetched prices go straight into the in-memory :class:`FeaturePipeline`
+    and the model reads the newest buffered rows, so a tick never reads the
+    ``features`` table back; new rows are persisted in the background.
+    The model only runs when new feature rows were produced. Runs on the
+    caller's event loop, so a long-lived loop (``ti-cli run``) keeps its
+    HTTP connections, DB pool and ONNX session between ticks.
+
+    Returns
+    -------
+    float
+        Seconds until the next source is due.
+    """
+    due = scheduler.due()
+    if due:
+        results = await fetch_all(due)
+        prices = [
+            df for name, df in results.items() if name in PRICE_SOURCES and not df.empty
+        ]
+        if prices:
+            rows = await pipeline.update(pd.concat(prices, ignore_index=True))
+            if not rows.empty:
+                keys = rows[["symbol", "type"]].drop_duplicates()
+                pred = predict(pipeline, keys.itertuples(index=False))
+                for (symbol, type_), value in pred.items():
+                    logger.info(
+                        "%s \u2192 Prediction for %s (%s): %s",
+                        time.asctime(),
+                        symbol,
+                        type_,
+                        value,
+                    )
+    return scheduler.next_due_in()
+
+
+async def run_once() -> None:
+    """One tick, then wait for its feature rows to be persisted."""
+    try:
+        await run_tick()
+    finally:
+        await pipeline.flush()
+
 
 def main() -> None:
-    """Run the hourly inference loop."""
-    while True:
-        t0 = time.time()
-        fetch_crypto()
-        fetch_stock()
-        fetch_eth_chain()
-        fetch_reddit()
-        create_features()
-        df = pd.read_sql("features", engine).iloc[-1:]
-        features = ["price_diff", "ema_12", "sentiment_score"]
-        X = np.expand_dims(
-            df[features].values.astype(np.float32),
-            axis=1,
-        )
-        pred = sess.run(None, {"input": X})[0].squeeze()
-        logger.info("%s \u2192 Prediction: %s", time.asctime(), pred)
-        time.sleep(max(0, 3600 - (time.time() - t0)))
+    """Fetch every enabled source once, then update features and predict."""
+    run_sync(run_once())
 
 
 if __name__ == "__main__":
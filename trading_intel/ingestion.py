@@ -1,213 +1,664 @@
 import asyncio
 import logging
-import time
-from datetime import datetime
+import math
+from collections import OrderedDict
+from datetime import datetime, timedelta
 
 import pandas as pd
-import requests
 import sqlalchemy
 from dune_client.client import DuneClient
 from dune_client.query import QueryBase
-from web3 import Web3
 
-from .config import API_KEYS, DATABASE_URL, validate_env
+from .breaker import registry as breakers
+from .bulk import insert_new, transaction, upsert, write_frame
+from .config import (
+    API_KEYS,
+    BACKFILL_DAYS,
+    CRYPTO_WATCHLIST,
+    DATABASE_URL,
+    ETH_RPC_URL,
+    FRED_SERIES,
+    ONCHAIN_BACKFILL_BLOCKS,
+    ONCHAIN_BATCH_SIZE,
+    ONCHAIN_MAX_BLOCKS,
+    REDDIT_MAX_PAGES,
+    REDDIT_SEEN_IDS,
+    REDDIT_SUBREDDITS,
+    STOCK_WATCHLIST,
+    YFINANCE_WATCHLIST,
+    validate_env,
+)
+from .http_cache import digest, shared_cache
+from .http_client import UNCHANGED, get_client, run_sync
+from .init_db import (
+    DUNE_KEYS,
+    PRICE_KEYS,
+    ensure_dune_key,
+    onchain_data,
+    reddit_data,
+    source_state,
+)
 from .logging_utils import setup_logging
+from .sentiment import ingest_posts
+from .writer import BatchWriter
 
 logger = logging.getLogger(__name__)
 
 engine = sqlalchemy.create_engine(DATABASE_URL)
 
+# yfinance history columns (lower-cased) that map onto ``price_data``.
+YFINANCE_COLUMNS = [
+    "timestamp",
+    "open",
+    "high",
+    "low",
+    "close",
+    "volume",
+    "dividends",
+    "stock_splits",
+]
+
 
 def _handle_error(msg: str, exc: Exception) -> None:
     """Log the error message and exception details."""
     logger.error("%s: %s", msg, exc)
 
 
-# Crypto
-def fetch_crypto(coin: str = "bitcoin", vs: str = "usd") -> pd.DataFrame:
-    """Fetch recent cryptocurrency prices from CoinGecko.
+def _circuit_open(source: str) -> bool:
+    """Whether ``source``'s breaker is refusing calls; logs the skip."""
+    if breakers.get(source).allow():
+        return False
+    logger.warning("Skipping %s: circuit open after repeated failures", source)
+    return True
 
-    Returns an empty ``DataFrame`` on failure.
+
+# Only ever moves the mark forward, so a short or out-of-order response
+# cannot rewind it.
+_RECORD_TIMESTAMP = sqlalchemy.text(
     """
-    url = f"https://api.coingecko.com/api/v3/coins/{coin}/market_chart"
+    INSERT INTO source_state (source, symbol, last_timestamp)
+    VALUES (:source, :symbol, :last_timestamp)
+    ON CONFLICT (source, symbol) DO UPDATE SET
+        last_timestamp = CASE
+            WHEN excluded.last_timestamp > source_state.last_timestamp
+            THEN excluded.last_timestamp ELSE source_state.last_timestamp
+        END
+    """
+).bindparams(sqlalchemy.bindparam("last_timestamp", type_=sqlalchemy.DateTime))
+
+
+def _last_timestamps(source: str, symbols: list[str], con=None) -> dict[str, datetime]:
+    """The newest stored timestamp per symbol of ``source``, where known."""
+    con = engine if con is None else con
+    source_state.create(con, checkfirst=True)
+    with transaction(con) as conn:
+        rows = conn.execute(
+            sqlalchemy.select(
+                source_state.c.symbol, source_state.c.last_timestamp
+            ).where(
+                (source_state.c.source == source) & source_state.c.symbol.in_(symbols)
+            )
+        )
+        return dict(rows.all())
+
+
+def _start_after(last: datetime | None) -> datetime:
+    """Where a request should start: the mark, or the backfill window."""
+    if last is not None:
+        return last
+    return datetime.utcnow() - timedelta(days=BACKFILL_DAYS)
+
+
+def _record_timestamps(source: str, df: pd.DataFrame, conn) -> None:
+    """Advance each symbol's high-water mark to its newest row in ``df``."""
+    if df.empty:
+        return
+    marks = df.groupby("symbol").timestamp.max()
+    conn.execute(
+        _RECORD_TIMESTAMP,
+        [
+            {
+                "source": source,
+                "symbol": symbol,
+                "last_timestamp": ts.to_pydatetime(),
+            }
+            for symbol, ts in marks.items()
+        ],
+    )
+
+
+def _by_source(items: list[tuple[str, pd.DataFrame]]) -> dict:
+    frames: dict[str, list[pd.DataFrame]] = {}
+    for source, df in items:
+        frames.setdefault(source, []).append(df)
+    return {s: pd.concat(f, ignore_index=True) for s, f in frames.items()}
+
+
+def _write_prices(conn, items: list[tuple[str, pd.DataFrame]]) -> None:
+    """Upsert queued prices and advance their sources' high-water marks.
+
+    Re-fetched observations overwrite the stored values instead of adding
+    duplicate rows. Frames with the same columns share one upsert, so a
+    provider's rows never set another provider's columns to NULL.
+    """
+    by_columns: dict[tuple, list[pd.DataFrame]] = {}
+    for _, df in items:
+        by_columns.setdefault(tuple(df.columns), []).append(df)
+    for frames in by_columns.values():
+        df = pd.concat(frames, ignore_index=True)
+        upsert(df, "price_data", conn, PRICE_KEYS, update=True)
+    for source, df in _by_source(items).items():
+        _record_timestamps(source, df, conn)
+
+
+def _from_mark(df: pd.DataFrame, last: datetime | None) -> pd.DataFrame:
+    """Drop rows older than the mark.
+
+    The row at the mark itself is kept: providers revise their latest
+    observation (today's bar, the current price) until it is final, and
+    the upsert overwrites it.
+    """
+    return df if last is None else df[df.timestamp >= last]
+
+
+def _forget_responses(providers: list[str], exc: Exception) -> None:
+    """Drop cached responses of sources whose rows failed to store.
+
+    They would be reported unchanged on the next run, so the rows would
+    never be fetched again.
+    """
+    cache = shared_cache()
+    if cache is not None:
+        for provider in providers:
+            cache.invalidate(provider)
+
+
+async def _fan_out(
+    source: str, symbols: list[str], fetch_one, target: str = "prices"
+) -> pd.DataFrame:
+    """Fetch many symbols of one provider concurrently, then queue them.
+
+    ``fetch_one(symbol, last)`` returns the parsed rows of one symbol
+    newer than its mark ``last``. Symbols that fail are logged and left
+    out; the rest are combined into one frame for the writer's
+    ``target``. The provider's circuit breaker records a failure when
+    every symbol failed or the run itself did, e.g. reading the marks.
+    """
+    if _circuit_open(source):
+        return pd.DataFrame()
+    breaker = breakers.get(source)
     try:
-        resp = requests.get(
-            url,
-            params={"vs_currency": vs, "days": "7"},
-            timeout=10,
+        marks = await asyncio.to_thread(_last_timestamps, source, symbols)
+        results = await asyncio.gather(
+            *(fetch_one(symbol, marks.get(symbol)) for symbol in symbols),
+            return_exceptions=True,
         )
-        resp.raise_for_status()
-        df = pd.DataFrame(
-            resp.json()["prices"], columns=["timestamp", "price"]
-        )  # noqa: E501
-        df["timestamp"] = pd.to_datetime(df["timestamp"], unit="ms")
-        df["type"] = "crypto"
-        df["symbol"] = coin
-        df.to_sql("price_data", engine, if_exists="append", index=False)
-        logger.info("Fetched crypto data for %s", coin)
-        return df
+        frames, errors = [], []
+        for symbol, result in zip(symbols, results):
+            if isinstance(result, Exception):
+                _handle_error(f"Failed to fetch {source} data for {symbol}", result)
+                errors.append(result)
+            elif isinstance(result, BaseException):
+                raise result
+            elif not result.empty:
+                frames.append(result)
     except Exception as exc:  # noqa: BLE001
-        _handle_error("Failed to fetch crypto data", exc)
+        breaker.record_failure(exc)
+        _handle_error(f"Failed to fetch {source} data", exc)
+        return pd.DataFrame()
+    if errors and len(errors) == len(symbols):
+        breaker.record_failure(errors[-1])
+    else:
+        breaker.record_success()
+    if not frames:
         return pd.DataFrame()
+    df = pd.concat(frames, ignore_index=True)
+    await get_writer().put(target, source, df)
+    logger.info(
+        "Fetched %s data for %d of %d symbols",
+        source,
+        len(frames),
+        len(symbols),
+    )
+    return df
+
+
+# Crypto
+async def _coingecko_prices(coin: str, last: datetime | None, vs: str) -> pd.DataFrame:
+    url = f"https://api.coingecko.com/api/v3/coins/{coin}/market_chart"
+    elapsed = datetime.utcnow() - _start_after(last)
+    # CoinGecko switches to 5-minute points for windows under 2 days;
+    # keep requesting at least 2 so the series stays hourly.
+    days = max(2, math.ceil(elapsed / timedelta(days=1)))
+    payload = await get_client().get_json(
+        url,
+        params={"vs_currency": vs, "days": str(days)},
+        timeout=10,
+        provider="coingecko",
+        if_changed=True,
+    )
+    if payload is UNCHANGED:
+        return pd.DataFrame()
+    df = pd.DataFrame(payload["prices"], columns=["timestamp", "price"])
+    df["timestamp"] = pd.to_datetime(df["timestamp"], unit="ms")
+    df = _from_mark(df, last).copy()
+    df["type"] = "crypto"
+    df["symbol"] = coin
+    return df
+
+
+async def afetch_crypto_many(coins: list[str], vs: str = "usd") -> pd.DataFrame:
+    """Fetch prices newer than each coin's mark from CoinGecko.
+
+    CoinGecko has no multi-coin history endpoint, so coins are requested
+    concurrently under the ``coingecko`` rate limit.
+    """
+
+    async def fetch_one(coin, last):
+        return await _coingecko_prices(coin, last, vs)
+
+    return await _fan_out("coingecko", coins, fetch_one)
+
+
+async def afetch_crypto(coin: str = "bitcoin", vs: str = "usd") -> pd.DataFrame:
+    """Fetch cryptocurrency prices newer than the stored mark from CoinGecko.
+
+    Returns an empty ``DataFrame`` on failure.
+    """
+    return await afetch_crypto_many([coin], vs)
+
+
+def fetch_crypto(coin: str = "bitcoin", vs: str = "usd") -> pd.DataFrame:
+    """Blocking wrapper around :func:`afetch_crypto`."""
+    return _run(afetch_crypto(coin, vs))
+
+
+def fetch_crypto_many(coins: list[str], vs: str = "usd") -> pd.DataFrame:
+    """Blocking wrapper around :func:`afetch_crypto_many`."""
+    return _run(afetch_crypto_many(coins, vs))
 
 
 # Stocks
-def fetch_stock(symbol: str = "AAPL") -> pd.DataFrame:
-    """Fetch hourly stock data using Alpha Vantage."""
-    url = "https://www.alphavantage.co/query"
+# 100 hourly bars span at least four calendar days of trading sessions.
+ALPHA_VANTAGE_COMPACT_SPAN = timedelta(days=4)
+
+
+async def _alpha_vantage_prices(symbol: str, last: datetime | None) -> pd.DataFrame:
+    gap = datetime.utcnow() - _start_after(last)
     params = {
         "function": "TIME_SERIES_INTRADAY",
         "symbol": symbol,
         "interval": "60min",
         "apikey": API_KEYS["ALPHA_VANTAGE"],
-        "outputsize": "compact",
+        "outputsize": ("compact" if gap <= ALPHA_VANTAGE_COMPACT_SPAN else "full"),
     }
-    for attempt in range(3):
-        try:
-            resp = requests.get(url, params=params, timeout=15)
-            resp.raise_for_status()
-            data = resp.json()["Time Series (60min)"]
-            df = (
-                pd.DataFrame.from_dict(data, orient="index")
-                .rename(
-                    columns={
-                        "1. open": "open",
-                        "2. high": "high",
-                        "3. low": "low",
-                        "4. close": "close",
-                        "5. volume": "volume",
-                    }
-                )
-                .reset_index()
-                .rename(columns={"index": "timestamp"})
-            )
-            df["timestamp"] = pd.to_datetime(df["timestamp"])
-            df["symbol"] = symbol
-            df["type"] = "stock"
-            df.to_sql("price_data", engine, if_exists="append", index=False)
-            logger.info("Fetched stock data for %s", symbol)
-            return df
-        except Exception as exc:  # noqa: BLE001
-            logger.error(
-                "Attempt %d failed to fetch stock data for %s: %s",
-                attempt + 1,
-                symbol,
-                exc,
-            )
-            time.sleep(2**attempt)
-    _handle_error(
-        f"Failed to fetch stock data for {symbol}",
-        Exception("max retries"),
+    payload = await get_client().get_json(
+        "https://www.alphavantage.co/query",
+        params=params,
+        timeout=15,
+        provider="alpha_vantage",
+        if_changed=True,
     )
-    return pd.DataFrame()
+    if payload is UNCHANGED:
+        return pd.DataFrame()
+    if "Time Series (60min)" not in payload:
+        # Quota and argument errors arrive as HTTP 200 with a message.
+        raise RuntimeError(
+            payload.get("Note")
+            or payload.get("Information")
+            or payload.get("Error Message")
+            or "unexpected response"
+        )
+    df = (
+        pd.DataFrame.from_dict(payload["Time Series (60min)"], orient="index")
+        .rename(
+            columns={
+                "1. open": "open",
+                "2. high": "high",
+                "3. low": "low",
+                "4. close": "close",
+                "5. volume": "volume",
+            }
+        )
+        .reset_index()
+        .rename(columns={"index": "timestamp"})
+    )
+    df["timestamp"] = pd.to_datetime(df["timestamp"])
+    df = df.astype({c: float for c in ["open", "high", "low", "close", "volume"]})
+    df = _from_mark(df, last).copy()
+    df["symbol"] = symbol
+    df["type"] = "stock"
+    return df
+
+
+async def afetch_stock_many(symbols: list[str]) -> pd.DataFrame:
+    """Fetch hourly bars newer than each symbol's mark from Alpha Vantage.
+
+    The ``compact`` output (latest 100 bars) covers the gap in steady
+    state; ``full`` is only requested when the gap is wider than that.
+    Requests are spaced by the ``alpha_vantage`` rate limit.
+    """
+    return await _fan_out("alpha_vantage", symbols, _alpha_vantage_prices)
+
+
+async def afetch_stock(symbol: str = "AAPL") -> pd.DataFrame:
+    """Fetch hourly stock data newer than the stored mark via Alpha Vantage."""
+    return await afetch_stock_many([symbol])
+
+
+def fetch_stock(symbol: str = "AAPL") -> pd.DataFrame:
+    """Blocking wrapper around :func:`afetch_stock`."""
+    return _run(afetch_stock(symbol))
+
+
+def fetch_stock_many(symbols: list[str]) -> pd.DataFrame:
+    """Blocking wrapper around :func:`afetch_stock_many`."""
+    return _run(afetch_stock_many(symbols))
 
 
 # yfinance
-def fetch_yfinance(symbol: str = "SPY", period: str = "1mo") -> pd.DataFrame:
-    """Fetch historical stock data using the yfinance library.
+def _yfinance_frame(
+    raw: pd.DataFrame, symbol: str, last: datetime | None
+) -> pd.DataFrame:
+    """Normalise one ticker's yfinance history to ``price_data`` columns."""
+    df = raw.dropna(how="all").reset_index()
+    df.columns = [str(c).lower().replace(" ", "_") for c in df.columns]
+    df = df.rename(columns={"date": "timestamp", "datetime": "timestamp"})
+    df = df[[c for c in YFINANCE_COLUMNS if c in df]].copy()
+    if df.timestamp.dt.tz is not None:
+        df["timestamp"] = df.timestamp.dt.tz_convert(None)
+    df = _from_mark(df, last).copy()
+    df["symbol"] = symbol
+    df["type"] = "yfinance"
+    return df
+
+
+def _download_yfinance(
+    symbols: list[str], period: str | None, marks: dict
+) -> pd.DataFrame:
+    """Download ``symbols`` with one blocking ``yf.download`` call.
+
+    Returns an empty frame when there is nothing new or the download is
+    the same as the previous one.
+    """
+    import yfinance as yf
+
+    if period:
+        window = {"period": period}
+    else:
+        start = min(_start_after(marks.get(s)) for s in symbols)
+        window = {"start": start.date()}
+    raw = yf.download(
+        symbols,
+        group_by="ticker",
+        auto_adjust=True,
+        actions=True,
+        progress=False,
+        threads=True,
+        **window,
+    )
+    if raw.empty:
+        if marks:
+            logger.info("No new yfinance data for %s", symbols)
+            return raw
+        raise RuntimeError("No data returned")
+    if not isinstance(raw.columns, pd.MultiIndex):
+        raw = pd.concat({symbols[0]: raw}, axis=1)
+    cache = shared_cache()
+    content = digest(pd.util.hash_pandas_object(raw).to_numpy().tobytes())
+    key = f"yfinance {sorted(symbols)} {window}"
+    if cache is not None and cache.seen(key, "yfinance", content):
+        logger.info("yfinance data for %s is unchanged", symbols)
+        return pd.DataFrame()
+    tickers = set(raw.columns.get_level_values(0))
+    frames = [
+        _yfinance_frame(raw[symbol], symbol, marks.get(symbol))
+        for symbol in symbols
+        if symbol in tickers
+    ]
+    logger.info("Fetched yfinance data for %d symbols", len(frames))
+    return pd.concat(frames, ignore_index=True)
+
+
+async def afetch_yfinance_many(
+    symbols: list[str], period: str | None = None
+) -> pd.DataFrame:
+    """Fetch historical data for many tickers in one ``yf.download`` call.
+
+    yfinance is blocking, so the download runs in a worker thread.
 
     Parameters
     ----------
-    symbol: str
-        Stock ticker symbol.
-    period: str
-        Data period, defaults to one month.
+    symbols: list of str
+        Stock ticker symbols.
+    period: str, optional
+        Fixed data period such as ``"1mo"``. By default the download
+        starts at the oldest stored mark among ``symbols`` (or
+        ``BACKFILL_DAYS`` back for symbols without one), and each ticker
+        keeps only rows from its own mark onwards.
 
     Returns
     -------
     pandas.DataFrame
         Price data or an empty DataFrame on failure.
     """
+    if _circuit_open("yfinance"):
+        return pd.DataFrame()
+    breaker = breakers.get("yfinance")
     try:
-        import yfinance as yf
-
-        ticker = yf.Ticker(symbol)
-        df = ticker.history(period=period)
-        if df.empty:
-            raise RuntimeError("No data returned")
-        df = df.reset_index().rename(columns={"Date": "timestamp"})
-        df["symbol"] = symbol
-        df["type"] = "yfinance"
-        df.to_sql("price_data", engine, if_exists="append", index=False)
-        logger.info("Fetched yfinance data for %s", symbol)
-        return df
+        marks = {}
+        if not period:
+            marks = await asyncio.to_thread(_last_timestamps, "yfinance", symbols)
+        df = await asyncio.to_thread(_download_yfinance, symbols, period, marks)
+        breaker.record_success()
     except Exception as exc:  # noqa: BLE001
+        breaker.record_failure(exc)
         _handle_error("Failed to fetch yfinance data", exc)
         return pd.DataFrame()
+    await get_writer().put("prices", "yfinance", df)
+    return df
+
+
+async def afetch_yfinance(
+    symbol: str = "SPY", period: str | None = None
+) -> pd.DataFrame:
+    return await afetch_yfinance_many([symbol], period)
+
+
+def fetch_yfinance_many(symbols: list[str], period: str | None = None) -> pd.DataFrame:
+    """Blocking wrapper around :func:`afetch_yfinance_many`."""
+    return _run(afetch_yfinance_many(symbols, period))
+
+
+def fetch_yfinance(symbol: str = "SPY", period: str | None = None) -> pd.DataFrame:
+    """Fetch one ticker's history; see :func:`afetch_yfinance_many`."""
+    return fetch_yfinance_many([symbol], period)
 
 
 # FRED
-def fetch_fred(series: str = "DEXUSAL") -> pd.DataFrame:
-    """Fetch a macroeconomic series from FRED."""
-    api_key = API_KEYS.get("FRED", "")
-    if not api_key:
+async def _fred_observations(series: str, last: datetime | None) -> pd.DataFrame:
+    params = {
+        "series_id": series,
+        "api_key": API_KEYS["FRED"],
+        "file_type": "json",
+        "observation_start": _start_after(last).strftime("%Y-%m-%d"),
+    }
+    payload = await get_client().get_json(
+        "https://api.stlouisfed.org/fred/series/observations",
+        params=params,
+        timeout=10,
+        provider="fred",
+        if_changed=True,
+    )
+    if payload is UNCHANGED:
+        return pd.DataFrame()
+    df = pd.DataFrame(payload.get("observations", []))
+    if df.empty:
+        if last is not None:
+            logger.info("No new FRED observations for %s", series)
+            return df
+        raise RuntimeError("No observations")
+    df = df.rename(columns={"value": "price", "date": "timestamp"})
+    df = df[["timestamp", "price"]].copy()
+    df["timestamp"] = pd.to_datetime(df["timestamp"])
+    # FRED marks missing observations with "."
+    df["price"] = pd.to_numeric(df["price"], errors="coerce")
+    df = _from_mark(df, last).copy()
+    df["symbol"] = series
+    df["type"] = "fred"
+    return df
+
+
+async def afetch_fred_many(series: list[str]) -> pd.DataFrame:
+    """Fetch observations of FRED series from their stored marks onwards."""
+    if not API_KEYS.get("FRED", ""):
         _handle_error("FRED_API_KEY not configured", Exception("missing key"))
         return pd.DataFrame()
-    url = "https://api.stlouisfed.org/fred/series/observations"
-    params = {"series_id": series, "api_key": api_key, "file_type": "json"}
+    return await _fan_out("fred", series, _fred_observations)
+
+
+async def afetch_fred(series: str = "DEXUSAL") -> pd.DataFrame:
+    """Fetch observations of a FRED series from the stored mark onwards."""
+    return await afetch_fred_many([series])
+
+
+def fetch_fred(series: str = "DEXUSAL") -> pd.DataFrame:
+    """Blocking wrapper around :func:`afetch_fred`."""
+    return _run(afetch_fred(series))
+
+
+def fetch_fred_many(series: list[str]) -> pd.DataFrame:
+    """Blocking wrapper around :func:`afetch_fred_many`."""
+    return _run(afetch_fred_many(series))
+
+
+# On-chain (Ethereum)
+def _rpc_int(value) -> int | None:
+    return None if value is None else int(value, 16)
+
+
+def _block_row(block: dict) -> dict:
+    return {
+        "number": _rpc_int(block["number"]),
+        "timestamp": datetime.utcfromtimestamp(_rpc_int(block["timestamp"])),
+        "gas_used": _rpc_int(block["gasUsed"]),
+        "gas_limit": _rpc_int(block["gasLimit"]),
+        "base_fee": _rpc_int(block.get("baseFeePerGas")),
+        "tx_count": len(block["transactions"]),
+        "size": _rpc_int(block["size"]),
+    }
+
+
+async def _rpc_batch(calls: list[tuple[str, list]]) -> list:
+    """Send ``(method, params)`` calls as one JSON-RPC batch request.
+
+    Raises
+    ------
+    RuntimeError
+        If any call in the batch returned an error.
+    """
+    payload = [
+        {"jsonrpc": "2.0", "id": i, "method": method, "params": params}
+        for i, (method, params) in enumerate(calls)
+    ]
+    replies = await get_client().post_json(
+        ETH_RPC_URL, payload, timeout=30, provider="eth_rpc"
+    )
+    if isinstance(replies, dict):  # a batch-level error
+        replies = [replies]
+    by_id = {reply.get("id"): reply for reply in replies}
+    results = []
+    for i, (method, _) in enumerate(calls):
+        reply = by_id.get(i, {})
+        if "result" not in reply:
+            raise RuntimeError(f"{method} failed: {reply.get('error')}")
+        results.append(reply["result"])
+    return results
+
+
+def _last_block() -> int | None:
+    onchain_data.create(engine, checkfirst=True)
+    with engine.connect() as conn:
+        return conn.execute(
+            sqlalchemy.select(sqlalchemy.func.max(onchain_data.c.number))
+        ).scalar()
+
+
+async def afetch_eth_chain() -> pd.DataFrame:
+    """Fetch every Ethereum block after the newest stored one.
+
+    Block headers are requested with batched ``eth_getBlockByNumber``
+    JSON-RPC calls over the shared keep-alive HTTP session, oldest first
+    and at most ``ONCHAIN_MAX_BLOCKS`` per run, so a lagging table
+    catches up over successive runs. An empty table starts
+    ``ONCHAIN_BACKFILL_BLOCKS`` behind the head.
+
+    Returns
+    -------
+    pandas.DataFrame
+        The newly stored blocks, or an empty DataFrame on failure.
+    """
+    if _circuit_open("eth_chain"):
+        return pd.DataFrame()
+    breaker = breakers.get("eth_chain")
     try:
-        resp = requests.get(url, params=params, timeout=10)
-        resp.raise_for_status()
-        data = resp.json().get("observations", [])
-        df = pd.DataFrame(data)
-        if df.empty:
-            raise RuntimeError("No observations")
-        df = df.rename(columns={"value": "price", "date": "timestamp"})
-        df["timestamp"] = pd.to_datetime(df["timestamp"])
-        df["symbol"] = series
-        df["type"] = "fred"
-        df.to_sql("price_data", engine, if_exists="append", index=False)
-        logger.info("Fetched FRED data for %s", series)
-        return df
+        last = await asyncio.to_thread(_last_block)
+        (head,) = await _rpc_batch([("eth_blockNumber", [])])
+        head = int(head, 16)
+        first = head - ONCHAIN_BACKFILL_BLOCKS + 1 if last is None else last + 1
+        numbers = list(range(first, min(head, first + ONCHAIN_MAX_BLOCKS - 1) + 1))
+        batches = [
+            numbers[i : i + ONCHAIN_BATCH_SIZE]  # noqa: E203
+            for i in range(0, len(numbers), ONCHAIN_BATCH_SIZE)
+        ]
+        results = await asyncio.gather(
+            *(
+                _rpc_batch([("eth_getBlockByNumber", [hex(n), False]) for n in batch])
+                for batch in batches
+            )
+        )
+        blocks = [block for batch in results for block in batch]
+        if None in blocks:
+            # A node behind the reported head returns null for blocks it
+            # has not seen; stop there and fetch the rest next run, so
+            # stored block numbers stay contiguous.
+            blocks = blocks[: blocks.index(None)]
+            numbers = numbers[: len(blocks)]
+        df = pd.DataFrame(
+            [_block_row(block) for block in blocks],
+            columns=[c.name for c in onchain_data.columns],
+        )
     except Exception as exc:  # noqa: BLE001
-        _handle_error("Failed to fetch FRED data", exc)
+        breaker.record_failure(exc)
+        _handle_error("Failed to fetch Ethereum blocks", exc)
         return pd.DataFrame()
+    breaker.record_success()
+    await get_writer().put("onchain", "eth_chain", df)
+    logger.info(
+        "Fetched %d Ethereum blocks up to %d (head %d)",
+        len(df),
+        numbers[-1] if numbers else last,
+        head,
+    )
+    return df
 
 
-# On-chain (Ethereum)
 def fetch_eth_chain() -> pd.DataFrame:
-    """Fetch the latest Ethereum block information."""
-    for attempt in range(3):
-        try:
-            w3 = Web3(
-                Web3.HTTPProvider(
-                    "https://cloudflare-eth.com",
-                    request_kwargs={"timeout": 15},
-                )
-            )
-            block = w3.eth.get_block("latest")
-            ts = datetime.utcfromtimestamp(block.timestamp)
-            df = pd.DataFrame(
-                [
-                    {
-                        **dict(block),
-                        "timestamp": ts,
-                        "symbol": "ETH",
-                        "type": "onchain",
-                    }
-                ]
-            )
-            df.to_sql("onchain_data", engine, if_exists="append", index=False)
-            logger.info("Fetched latest Ethereum block")
-            return df
-        except Exception as exc:  # noqa: BLE001
-            logger.error(
-                "Attempt %d failed to fetch Ethereum block: %s",
-                attempt + 1,
-                exc,
-            )
-            time.sleep(2**attempt)
-    _handle_error(
-        "Failed to fetch Ethereum block",
-        Exception("max retries"),
-    )
-    return pd.DataFrame()
+    """Blocking wrapper around :func:`afetch_eth_chain`."""
+    return _run(afetch_eth_chain())
 
 
 # Dune Analytics
-def fetch_dune(query_id: int = 0) -> pd.DataFrame:
+def _run_dune_query(api_key: str, query_id: int) -> pd.DataFrame:
+    client = DuneClient(api_key)
+    return client.run_query_dataframe(QueryBase(query_id=query_id))
+
+
+async def afetch_dune(query_id: int = 0) -> pd.DataFrame:
     """Fetch query results from Dune Analytics.
 
+    The Dune client is blocking, so the query runs in a worker thread.
+
     Parameters
     ----------
     query_id: int
@@ -222,91 +673,307 @@ def fetch_dune(query_id: int = 0) -> pd.DataFrame:
     if not api_key:
         _handle_error("DUNE_API_KEY not configured", Exception("missing key"))
         return pd.DataFrame()
+    if _circuit_open("dune"):
+        return pd.DataFrame()
+    breaker = breakers.get("dune")
     try:
-        client = DuneClient(api_key)
-        query = QueryBase(query_id=query_id)
-        df = client.run_query_dataframe(query)
-        df["query_id"] = query_id
-        df.to_sql("dune_data", engine, if_exists="append", index=False)
-        logger.info("Fetched Dune data for query %s", query_id)
-        return df
+        df = await asyncio.to_thread(_run_dune_query, api_key, query_id)
+        breaker.record_success()
     except Exception as exc:  # noqa: BLE001
+        breaker.record_failure(exc)
         _handle_error("Failed to fetch Dune data", exc)
         return pd.DataFrame()
+    df["query_id"] = query_id
+    await get_writer().put("dune", "dune", df)
+    logger.info("Fetched Dune data for query %s", query_id)
+    return df
+
+
+def fetch_dune(query_id: int = 0) -> pd.DataFrame:
+    """Blocking wrapper around :func:`afetch_dune`."""
+    return _run(afetch_dune(query_id))
 
 
 # Reddit
-def fetch_reddit(sub: str = "CryptoCurrency", limit: int = 50) -> pd.DataFrame:
-    """Fetch recent Reddit submissions from ``sub``."""
-    url = f"https://www.reddit.com/r/{sub}/new.json"
-    headers = {"User-Agent": "ti-app"}
-    params = {"limit": limit}
-    for attempt in range(3):
-        try:
-            resp = requests.get(
-                url,
-                headers=headers,
-                params=params,
-                timeout=15,
-            )
-            resp.raise_for_status()
-            posts = resp.json()["data"]["children"]
-            df = pd.DataFrame(
-                [
-                    {
-                        "id": p["data"]["id"],
-                        "timestamp": datetime.utcfromtimestamp(
-                            p["data"]["created_utc"]
-                        ),
-                        "title": p["data"]["title"],
-                        "selftext": p["data"].get("selftext", ""),
-                        "sub": sub,
-                    }
-                    for p in posts
-                ]
-            )
-            df.to_sql("reddit_data", engine, if_exists="append", index=False)
-            logger.info("Fetched %d Reddit posts from %s", len(df), sub)
-            return df
-        except Exception as exc:  # noqa: BLE001
-            logger.error(
-                "Attempt %d failed to fetch Reddit posts from %s: %s",
-                attempt + 1,
-                sub,
-                exc,
+class SeenIds:
+    """Bounded set of recently stored post ids.
+
+    Filters re-fetched posts before they reach the database. Ids are
+    evicted oldest first once ``capacity`` is reached, which only costs a
+    redundant insert attempt (``insert_new`` still skips stored ids).
+    """
+
+    def __init__(self, capacity: int = REDDIT_SEEN_IDS):
+        self.capacity = capacity
+        self._ids: OrderedDict[str, None] = OrderedDict()
+        self.warmed: set[str] = set()
+
+    def __contains__(self, post_id: str) -> bool:
+        return post_id in self._ids
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def add(self, ids) -> None:
+        for post_id in ids:
+            self._ids[post_id] = None
+            self._ids.move_to_end(post_id)
+        while len(self._ids) > self.capacity:
+            self._ids.popitem(last=False)
+
+
+seen_posts = SeenIds()
+
+
+def _warm_seen(subs: list[str], marks: dict[str, datetime], conn) -> None:
+    """Load the stored ids a first fetch of each sub can overlap with.
+
+    Pagination stops at the sub's mark, so only posts at or after it can
+    be fetched again.
+    """
+    subs = [s for s in subs if s not in seen_posts.warmed and s in marks]
+    for sub in subs:
+        rows = conn.execute(
+            sqlalchemy.select(reddit_data.c.id).where(
+                (reddit_data.c.sub == sub) & (reddit_data.c.timestamp >= marks[sub])
             )
-            time.sleep(2**attempt)
-    _handle_error(
-        f"Failed to fetch Reddit posts from {sub}",
-        Exception("max retries"),
+        )
+        seen_posts.add(rows.scalars())
+    seen_posts.warmed.update(subs)
+
+
+def _post_row(post: dict, sub: str) -> dict:
+    return {
+        "id": post["id"],
+        "timestamp": datetime.utcfromtimestamp(post["created_utc"]),
+        "title": post["title"],
+        "selftext": post.get("selftext", ""),
+        "sub": sub,
+    }
+
+
+async def _reddit_posts(sub: str, last: datetime | None, limit: int) -> pd.DataFrame:
+    """Page through ``/new`` until reaching posts older than the mark.
+
+    Follows the listing's ``after`` cursor for at most
+    ``REDDIT_MAX_PAGES`` pages of ``limit`` posts.
+    """
+    url = f"https://www.reddit.com/r/{sub}/new.json"
+    stop = _start_after(last)
+    rows, after = [], None
+    for _ in range(REDDIT_MAX_PAGES):
+        params = {"limit": limit}
+        if after:
+            params["after"] = after
+        payload = await get_client().get_json(
+            url,
+            headers={"User-Agent": "ti-app"},
+            params=params,
+            timeout=15,
+            provider="reddit",
+            if_changed=after is None,
+        )
+        if payload is UNCHANGED:  # no new posts since the last run
+            break
+        page = [_post_row(p["data"], sub) for p in payload["data"]["children"]]
+        rows.extend(page)
+        after = payload["data"].get("after")
+        if not page or not after or page[-1]["timestamp"] < stop:
+            break
+    df = pd.DataFrame(rows, columns=[c.name for c in reddit_data.columns])
+    return df[df.timestamp >= stop]
+
+
+def _write_posts(conn, items: list[tuple[str, pd.DataFrame]]):
+    """Insert unseen posts, score them and advance each sub's mark."""
+    df = pd.concat([df for _, df in items], ignore_index=True)
+    subs = df["sub"].unique().tolist()
+    _warm_seen(subs, _last_timestamps("reddit", subs, conn), conn)
+    df = df.drop_duplicates("id")
+    unseen = df[[i not in seen_posts for i in df.id]]
+    new = insert_new(unseen, "reddit_data", conn, ["id"])
+    ingest_posts(new, conn)
+    for source, posts in _by_source(items).items():
+        _record_timestamps(source, posts.rename(columns={"sub": "symbol"}), conn)
+    logger.info(
+        "Stored %d new Reddit posts (%d fetched, %d already seen)",
+        len(new),
+        len(df),
+        len(df) - len(unseen),
     )
-    return pd.DataFrame()
-
-
-async def fetch_all() -> dict[str, pd.DataFrame]:
-    """Fetch all data sources concurrently."""
-    fetchers = {
-        "crypto": fetch_crypto,
-        "stock": fetch_stock,
-        "yfinance": fetch_yfinance,
-        "fred": fetch_fred,
-        "eth_chain": fetch_eth_chain,
-        "dune": fetch_dune,
-        "reddit": fetch_reddit,
+    # Mark them seen only once the transaction has committed, or a failed
+    # write would hide these posts from the next run.
+    return lambda: seen_posts.add(unseen.id)
+
+
+async def afetch_reddit_many(subs: list[str], limit: int = 100) -> pd.DataFrame:
+    """Fetch the posts submitted to each sub since its mark.
+
+    Subreddits are requested concurrently under the ``reddit`` rate limit,
+    and posts already stored are dropped before the write.
+    """
+
+    async def fetch_one(sub, last):
+        return await _reddit_posts(sub, last, limit)
+
+    return await _fan_out("reddit", subs, fetch_one, target="posts")
+
+
+async def afetch_reddit(sub: str = "CryptoCurrency", limit: int = 100) -> pd.DataFrame:
+    """Fetch recent Reddit submissions from ``sub``."""
+    return await afetch_reddit_many([sub], limit)
+
+
+def fetch_reddit(sub: str = "CryptoCurrency", limit: int = 100) -> pd.DataFrame:
+    """Blocking wrapper around :func:`afetch_reddit`."""
+    return _run(afetch_reddit(sub, limit))
+
+
+def _write_onchain(conn, items: list[tuple[str, pd.DataFrame]]) -> None:
+    df = pd.concat([df for _, df in items], ignore_index=True)
+    upsert(df, "onchain_data", conn, ["number"])
+
+
+def _write_dune(conn, items: list[tuple[str, pd.DataFrame]]) -> None:
+    """Upsert Dune results on :data:`DUNE_KEYS`.
+
+    Each run returns the query's whole result, so rows already stored are
+    updated in place. A result without ``DUNE_TIME_COLUMN`` has no key and
+    replaces the query's previous rows instead.
+    """
+    for _, df in items:
+        keyed = set(DUNE_KEYS) <= set(df.columns)
+        if not sqlalchemy.inspect(conn).has_table("dune_data"):
+            if keyed:
+                df = df.drop_duplicates(DUNE_KEYS, keep="last")
+            write_frame(df, "dune_data", conn)
+            ensure_dune_key(conn)
+        elif keyed:
+            ensure_dune_key(conn)
+            upsert(df, "dune_data", conn, DUNE_KEYS, update=True)
+        else:
+            conn.execute(
+                sqlalchemy.text("DELETE FROM dune_data WHERE query_id = :query_id"),
+                {"query_id": int(df.query_id.iloc[0])},
+            )
+            write_frame(df, "dune_data", conn)
+
+
+# Writer target per kind of fetched frame; see :class:`BatchWriter`.
+WRITE_HANDLERS = {
+    "prices": _write_prices,
+    "onchain": _write_onchain,
+    "posts": _write_posts,
+    "dune": _write_dune,
+}
+
+# The writer's queue and task belong to one event loop, so each loop gets
+# its own writer.
+_writers: dict[asyncio.AbstractEventLoop, BatchWriter] = {}
+
+
+def get_writer() -> BatchWriter:
+    """The batching database writer for the running event loop."""
+    loop = asyncio.get_running_loop()
+    for stale in [lp for lp in _writers if lp.is_closed()]:
+        del _writers[stale]
+    if loop not in _writers:
+        _writers[loop] = BatchWriter(engine, WRITE_HANDLERS, on_error=_forget_responses)
+    return _writers[loop]
+
+
+async def close_writer() -> None:
+    """Write everything queued on the running loop and stop its writer."""
+    writer = _writers.pop(asyncio.get_running_loop(), None)
+    if writer is not None:
+        await writer.close()
+
+
+def _run(coro):
+    """Run a fetch coroutine from blocking code, writing its rows."""
+
+    async def runner():
+        try:
+            return await coro
+        finally:
+            await close_writer()
+
+    return run_sync(runner())
+
+
+# The provider each source's rows are queued under in the writer.
+_PROVIDERS = {
+    "crypto": "coingecko",
+    "stock": "alpha_vantage",
+    "yfinance": "yfinance",
+    "fred": "fred",
+    "eth_chain": "eth_chain",
+    "dune": "dune",
+    "reddit": "reddit",
+}
+
+
+def _source_fetchers() -> dict:
+    """Coroutine factory per source name, as run by :func:`fetch_all`."""
+    return {
+        "crypto": lambda: afetch_crypto_many(CRYPTO_WATCHLIST),
+        "stock": lambda: afetch_stock_many(STOCK_WATCHLIST),
+        "yfinance": lambda: afetch_yfinance_many(YFINANCE_WATCHLIST),
+        "fred": lambda: afetch_fred_many(FRED_SERIES),
+        "eth_chain": afetch_eth_chain,
+        "dune": afetch_dune,
+        "reddit": lambda: afetch_reddit_many(REDDIT_SUBREDDITS),
     }
 
-    async def run(name: str, func) -> tuple[str, pd.DataFrame]:
-        return name, await asyncio.to_thread(func)
 
-    tasks = [run(n, f) for n, f in fetchers.items()]
-    results: dict[str, pd.DataFrame] = {}
-    for coro in asyncio.as_completed(tasks):
-        name, df = await coro
-        results[name] = df
-    return results
+async def fetch_all(
+    sources: list[str] | None = None,
+) -> dict[str, pd.DataFrame]:
+    """Fetch data sources concurrently on the running event loop.
+
+    Price sources cover their configured watchlists. Fetchers queue their
+    rows for the loop's single batching writer, which coalesces them per
+    table; the run returns once everything fetched has been written. A
+    source whose rows failed to write returns an empty frame, so callers
+    never act on rows that were not stored.
+    Circuit breaker state is loaded before and persisted after the run,
+    so sources that keep failing are skipped without waiting on their
+    timeouts.
+
+    Parameters
+    ----------
+    sources: list of str, optional
+        Names of the sources to fetch (``"crypto"``, ``"stock"``,
+        ``"yfinance"``, ``"fred"``, ``"eth_chain"``, ``"dune"``,
+        ``"reddit"``); all of them by default.
+    """
+    try:
+        await asyncio.to_thread(breakers.load, engine)
+    except Exception as exc:  # noqa: BLE001
+        _handle_error("Failed to load circuit breaker state", exc)
+    factories = _source_fetchers()
+    names = list(factories) if sources is None else sources
+    fetchers = {name: factories[name]() for name in names}
+    writer = get_writer()
+    writer.failed.clear()
+    frames = await asyncio.gather(*fetchers.values())
+    await writer.flush()
+    frames = [
+        pd.DataFrame() if _PROVIDERS[name] in writer.failed else df
+        for name, df in zip(fetchers, frames)
+    ]
+    status = breakers.snapshot()
+    open_sources = [b["source"] for b in status if b["state"] != "closed"]
+    if open_sources:
+        logger.warning("Open circuits: %s", ", ".join(open_sources))
+    try:
+        await asyncio.to_thread(breakers.save, engine)
+    except Exception as exc:  # noqa: BLE001
+        _handle_error("Failed to save circuit breaker state", exc)
+    return dict(zip(fetchers, frames))
 
 
 if __name__ == "__main__":
     validate_env()
     setup_logging()
-    asyncio.run(fetch_all())
+    run_sync(fetch_all())
@@ -1,28 +1,38 @@
+import argparse
 import logging
+from datetime import datetime
 
+import pandas as pd
 import sqlalchemy
 from sqlalchemy import (
+    BigInteger,
     Column,
     DateTime,
     Float,
+    Index,
     Integer,
     MetaData,
     String,
     Table,
+    Text,
 )
 
-from .config import DATABASE_URL, validate_env
+from .bulk import transaction
+from .config import DATABASE_URL, DUNE_TIME_COLUMN, PARTITION_MONTHS_AHEAD, validate_env
 from .logging_utils import setup_logging
 
 logger = logging.getLogger(__name__)
 engine = sqlalchemy.create_engine(DATABASE_URL)
 metadata = MetaData()
 
+# On PostgreSQL ``price_data`` is range-partitioned by month on
+# ``timestamp`` (see :func:`ensure_partitions`); the partition key has to be
+# part of every unique index, so the table has no surrogate id. BRIN keeps
+# the timestamp index tiny for rows that arrive in time order.
 price_data = Table(
     "price_data",
     metadata,
-    Column("id", Integer, primary_key=True),
-    Column("timestamp", DateTime, index=True),
+    Column("timestamp", DateTime, nullable=False),
     Column("open", Float),
     Column("high", Float),
     Column("low", Float),
@@ -33,7 +43,48 @@ price_data = Table(
     Column("stock_splits", Float),
     Column("symbol", String(50), nullable=False),
     Column("type", String(50), nullable=False),
+    # Natural key: one observation per symbol, source type and timestamp.
+    Index(
+        "uq_price_data_symbol_type_timestamp",
+        "symbol",
+        "type",
+        "timestamp",
+        unique=True,
+    ),
+    Index("ix_price_data_timestamp", "timestamp", postgresql_using="brin"),
+    Index("ix_price_data_symbol_timestamp", "symbol", "timestamp"),
+    postgresql_partition_by="RANGE (timestamp)",
 )
+PRICE_KEYS = ["symbol", "type", "timestamp"]
+# ``dune_data`` takes its columns from the query results (see
+# :func:`ensure_dune_key`); a metric row is identified by its time and query.
+DUNE_KEYS = [DUNE_TIME_COLUMN, "query_id"]
+DUNE_KEY_INDEX = "uq_dune_data_key"
+# Receives rows outside every monthly partition.
+DEFAULT_PARTITION = "price_data_default"
+
+
+def _rollup_table(name: str) -> Table:
+    return Table(
+        name,
+        metadata,
+        Column("symbol", String(50), nullable=False),
+        Column("type", String(50), nullable=False),
+        Column("bucket", DateTime, nullable=False),
+        Column("open", Float),
+        Column("high", Float),
+        Column("low", Float),
+        Column("close", Float),
+        Column("volume", Float),
+        Column("count", Integer, nullable=False),
+        Index(f"uq_{name}", "symbol", "type", "bucket", unique=True),
+    )
+
+
+# OHLCV bars of ``price_data`` per symbol, maintained by
+# ``trading_intel.maintenance``; ``count`` is the number of raw rows.
+ROLLUPS = {"1h": _rollup_table("price_1h"), "1d": _rollup_table("price_1d")}
+ROLLUP_KEYS = ["symbol", "type", "bucket"]
 
 reddit_data = Table(
     "reddit_data",
@@ -45,14 +96,361 @@ reddit_data = Table(
     Column("sub", String(100)),
 )
 
+# VADER compound score per Reddit post, computed once at ingestion. ``mode``
+# records which text was scored ("title" or "title_selftext").
+reddit_sentiment = Table(
+    "reddit_sentiment",
+    metadata,
+    Column("id", String(30), primary_key=True),
+    Column("compound", Float, nullable=False),
+    Column("mode", String(20), nullable=False),
+)
+
+# Hourly rollup of post sentiment per subreddit, maintained by ingestion so
+# feature builds can join one row per hour instead of every post.
+sentiment_hourly = Table(
+    "sentiment_hourly",
+    metadata,
+    Column("sub", String(100), primary_key=True),
+    Column("hour", DateTime, primary_key=True, index=True),
+    Column("compound_mean", Float, nullable=False),
+    Column("post_count", Integer, nullable=False),
+    Column("compound_min", Float, nullable=False),
+    Column("compound_max", Float, nullable=False),
+)
+
+# High-water mark per ingestion source and symbol: the newest timestamp
+# stored so far, used to request only newer data on the next run.
+source_state = Table(
+    "source_state",
+    metadata,
+    Column("source", String(50), primary_key=True),
+    Column("symbol", String(100), primary_key=True),
+    Column("last_timestamp", DateTime, nullable=False),
+)
+
+# Per-(symbol, type) bookkeeping for incremental feature builds: the newest
+# timestamp already folded into ``features`` plus the JSON-encoded indicator
+# state (EMA accumulators, last price) needed to continue from it.
+feature_state = Table(
+    "feature_state",
+    metadata,
+    Column("symbol", String(50), primary_key=True),
+    Column("type", String(50), primary_key=True),
+    Column("watermark", DateTime, nullable=False),
+    Column("state", Text, nullable=False),
+)
+
+# One row per Ethereum block with the stats used as features. Amounts are
+# in wei; ``base_fee`` is NULL before the London fork.
+onchain_data = Table(
+    "onchain_data",
+    metadata,
+    Column("number", BigInteger, primary_key=True, autoincrement=False),
+    Column("timestamp", DateTime, nullable=False, index=True),
+    Column("gas_used", BigInteger, nullable=False),
+    Column("gas_limit", BigInteger, nullable=False),
+    Column("base_fee", BigInteger),
+    Column("tx_count", Integer, nullable=False),
+    Column("size", Integer, nullable=False),
+)
+
+# Circuit breaker per ingestion source, persisted so a dead upstream stays
+# skipped across runs until its cool-down expires. ``skipped`` counts the
+# runs that did not call the source because its breaker was open.
+circuit_breaker = Table(
+    "circuit_breaker",
+    metadata,
+    Column("source", String(50), primary_key=True),
+    Column("state", String(10), nullable=False),
+    Column("failures", Integer, nullable=False),
+    Column("opened_at", DateTime),
+    Column("skipped", Integer, nullable=False),
+    Column("last_error", Text),
+)
+
+
+def month_start(ts: datetime) -> datetime:
+    return datetime(ts.year, ts.month, 1)
+
+
+def add_months(month: datetime, n: int) -> datetime:
+    index = month.year * 12 + month.month - 1 + n
+    return datetime(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month: datetime) -> str:
+    return f"price_data_{month:%Y_%m}"
+
+
+def is_partitioned(conn) -> bool:
+    """Whether ``price_data`` is a PostgreSQL partitioned table."""
+    if conn.dialect.name != "postgresql":
+        return False
+    kind = conn.exec_driver_sql(
+        "SELECT relkind FROM pg_class WHERE oid = to_regclass('price_data')"
+    ).scalar()
+    return kind == "p"
+
+
+def price_partitions(conn) -> dict[datetime, str]:
+    """The monthly partitions of ``price_data`` by first day of month."""
+    names = conn.exec_driver_sql(
+        "SELECT c.relname FROM pg_inherits i "
+        "JOIN pg_class c ON c.oid = i.inhrelid "
+        "WHERE i.inhparent = to_regclass('price_data')"
+    ).scalars()
+    return {
+        datetime.strptime(name.removeprefix("price_data_"), "%Y_%m"): name
+        for name in names
+        if name != DEFAULT_PARTITION
+    }
+
+
+def _create_partition(conn, month: datetime) -> None:
+    """Create ``month``'s partition, moving its rows out of the default."""
+    bounds = {"lo": month, "hi": add_months(month, 1)}
+    in_month = "timestamp >= :lo AND timestamp < :hi"
+    conn.execute(
+        sqlalchemy.text(
+            "CREATE TEMPORARY TABLE _moving_prices ON COMMIT DROP AS "
+            f"SELECT * FROM {DEFAULT_PARTITION} WHERE {in_month}"
+        ),
+        bounds,
+    )
+    conn.execute(
+        sqlalchemy.text(f"DELETE FROM {DEFAULT_PARTITION} WHERE {in_month}"),
+        bounds,
+    )
+    conn.exec_driver_sql(
+        f"CREATE TABLE {partition_name(month)} PARTITION OF price_data "
+        f"FOR VALUES FROM ('{bounds['lo']:%Y-%m-%d}') "
+        f"TO ('{bounds['hi']:%Y-%m-%d}')"
+    )
+    conn.exec_driver_sql("INSERT INTO price_data SELECT * FROM _moving_prices")
+    conn.exec_driver_sql("DROP TABLE _moving_prices")
+
+
+def ensure_partitions(
+    con=None, months_ahead: int = PARTITION_MONTHS_AHEAD
+) -> list[str]:
+    """Create missing monthly partitions of ``price_data``.
+
+    Covers the current month, ``months_ahead`` future months and every
+    month with rows in the default partition (where rows outside all
+    partitions land, e.g. from an old backfill); those rows are moved to
+    their new partition. Does nothing unless ``price_data`` is
+    partitioned, i.e. on databases other than PostgreSQL.
+
+    Returns
+    -------
+    list of str
+        The names of the partitions created.
+    """
+    with transaction(engine if con is None else con) as conn:
+        if not is_partitioned(conn):
+            return []
+        conn.exec_driver_sql(
+            f"CREATE TABLE IF NOT EXISTS {DEFAULT_PARTITION} "
+            "PARTITION OF price_data DEFAULT"
+        )
+        current = month_start(datetime.utcnow())
+        months = {add_months(current, n) for n in range(months_ahead + 1)}
+        stray = conn.exec_driver_sql(
+            "SELECT DISTINCT date_trunc('month', timestamp) "
+            f"FROM {DEFAULT_PARTITION}"
+        ).scalars()
+        months.update(stray)
+        existing = price_partitions(conn)
+        created = []
+        for month in sorted(months - set(existing)):
+            _create_partition(conn, month)
+            created.append(partition_name(month))
+    if created:
+        logger.info("Created price_data partitions: %s", ", ".join(created))
+    return created
+
 
 def create_tables() -> None:
     """Create database tables defined in this module."""
     metadata.create_all(engine)
+    ensure_partitions()
     logger.info("\u2705 Database tables created.")
 
 
+def dedup_tables() -> int:
+    """Remove duplicate prices and add the natural-key unique index.
+
+    One-shot migration for databases created before ``price_data`` had a
+    unique ``(symbol, type, timestamp)`` key. The most recently inserted
+    row of each duplicate group is kept. ``dune_data`` gets its key too,
+    see :func:`ensure_dune_key`.
+
+    Returns
+    -------
+    int
+        The number of rows deleted.
+    """
+    with engine.begin() as conn:
+        dune = ensure_dune_key(conn)
+    columns = sqlalchemy.inspect(engine).get_columns("price_data")
+    if "id" not in {c["name"] for c in columns}:
+        logger.info("price_data already has its natural key.")
+        return dune
+    with engine.begin() as conn:
+        deleted = conn.execute(
+            sqlalchemy.text(
+                """
+                DELETE FROM price_data
+                WHERE id NOT IN (
+                    SELECT MAX(id) FROM price_data
+                    GROUP BY symbol, type, timestamp
+                )
+                """
+            )
+        ).rowcount
+        for index in price_data.indexes:
+            if index.unique:
+                index.create(conn, checkfirst=True)
+    logger.info(
+        "Removed %d duplicate price rows; rebuild features with "
+        "'python -m trading_intel.features --full-rebuild'.",
+        deleted,
+    )
+    return deleted + dune
+
+
+def ensure_dune_key(conn) -> int:
+    """Give ``dune_data`` its unique :data:`DUNE_KEYS` index.
+
+    ``dune_data`` is created by ``to_sql`` from the first query result, so
+    the index is added afterwards. Duplicate rows left by earlier versions,
+    which appended every result, are removed first, keeping the last one
+    read. Does nothing when the table is missing, already indexed or has
+    no ``DUNE_TIME_COLUMN``.
+
+    Returns
+    -------
+    int
+        The number of rows deleted.
+    """
+    inspector = sqlalchemy.inspect(conn)
+    if not inspector.has_table("dune_data"):
+        return 0
+    if any(ix["name"] == DUNE_KEY_INDEX for ix in inspector.get_indexes("dune_data")):
+        return 0
+    if not set(DUNE_KEYS) <= {c["name"] for c in inspector.get_columns("dune_data")}:
+        return 0
+    rows = pd.read_sql("SELECT * FROM dune_data", conn)
+    unique = rows.drop_duplicates(DUNE_KEYS, keep="last")
+    if len(unique) < len(rows):
+        conn.exec_driver_sql("DELETE FROM dune_data")
+        unique.to_sql("dune_data", conn, if_exists="append", index=False)
+    columns = ", ".join(f'"{c}"' for c in DUNE_KEYS)
+    conn.exec_driver_sql(
+        f'CREATE UNIQUE INDEX "{DUNE_KEY_INDEX}" ON dune_data ({columns})'
+    )
+    logger.info("Removed %d duplicate Dune rows.", len(rows) - len(unique))
+    return len(rows) - len(unique)
+
+
+def migrate_onchain() -> bool:
+    """Move an untyped ``onchain_data`` table aside and create the typed one.
+
+    Earlier versions let ``to_sql`` create ``onchain_data`` from whole block
+    dicts. Such a table is renamed to ``onchain_data_legacy`` (kept for
+    manual inspection) and replaced by the typed table, which the next
+    ingestion run backfills.
+
+    Returns
+    -------
+    bool
+        Whether a legacy table was moved.
+    """
+    inspector = sqlalchemy.inspect(engine)
+    if not inspector.has_table("onchain_data"):
+        onchain_data.create(engine)
+        return False
+    columns = {c["name"] for c in inspector.get_columns("onchain_data")}
+    if {c.name for c in onchain_data.columns} <= columns:
+        return False
+    with engine.begin() as conn:
+        conn.exec_driver_sql("ALTER TABLE onchain_data RENAME TO onchain_data_legacy")
+        onchain_data.create(conn)
+    logger.info("Renamed untyped onchain_data to onchain_data_legacy.")
+    return True
+
+
+def partition_prices() -> bool:
+    """Move an unpartitioned PostgreSQL ``price_data`` into partitions.
+
+    The old table and its indexes are renamed with a ``_legacy`` suffix
+    and kept for manual inspection; its rows are copied into a new
+    partitioned table with one partition per month that has data.
+
+    Returns
+    -------
+    bool
+        Whether a table was migrated.
+    """
+    with engine.begin() as conn:
+        if conn.dialect.name != "postgresql" or is_partitioned(conn):
+            return False
+        inspector = sqlalchemy.inspect(conn)
+        migrated = inspector.has_table("price_data")
+        if migrated:
+            conn.exec_driver_sql("ALTER TABLE price_data RENAME TO price_data_legacy")
+            for index in inspector.get_indexes("price_data_legacy"):
+                conn.exec_driver_sql(
+                    f'ALTER INDEX "{index["name"]}" '
+                    f'RENAME TO "{index["name"]}_legacy"'
+                )
+        price_data.create(conn)
+        if migrated:
+            columns = ", ".join(f'"{c.name}"' for c in price_data.columns)
+            conn.exec_driver_sql(
+                f"CREATE TABLE {DEFAULT_PARTITION} PARTITION OF price_data DEFAULT"
+            )
+            conn.exec_driver_sql(
+                f"INSERT INTO price_data ({columns}) "
+                f"SELECT {columns} FROM price_data_legacy "
+                "WHERE timestamp IS NOT NULL "
+                "ON CONFLICT (symbol, type, timestamp) DO NOTHING"
+            )
+        ensure_partitions(conn)
+    if migrated:
+        logger.info("Moved price_data rows into monthly partitions.")
+    return migrated
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Create database tables.")
+    parser.add_argument(
+        "--dedup",
+        action="store_true",
+        help="remove duplicate prices and add unique natural-key indexes",
+    )
+    parser.add_argument(
+        "--migrate-onchain",
+        action="store_true",
+        help="replace an untyped onchain_data table with the typed schema",
+    )
+    parser.add_argument(
+        "--partition-prices",
+        action="store_true",
+        help="move an unpartitioned PostgreSQL price_data into partitions",
+    )
+    args = parser.parse_args(argv)
+    if args.partition_prices:
+        partition_prices()
+    if args.migrate_onchain:
+        migrate_onchain()
+    create_tables()
+    if args.dedup:
+        dedup_tables()
+
+
 if __name__ == "__main__":
     validate_env()
     setup_logging()
-    create_tables()
+    main()
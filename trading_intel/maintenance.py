@@ -0,0 +1,256 @@
+import argparse
+import gzip
+import logging
+import os
+from datetime import datetime, timedelta
+
+import pandas as pd
+import sqlalchemy
+
+from .bulk import read_frame, upsert
+from .config import (
+    DATABASE_URL,
+    PARTITION_MONTHS_AHEAD,
+    PRICE_ARCHIVE_DIR,
+    PRICE_RETENTION_MONTHS,
+    ROLLUP_LOOKBACK_DAYS,
+    validate_env,
+)
+from .init_db import (
+    ROLLUP_KEYS,
+    ROLLUPS,
+    add_months,
+    ensure_partitions,
+    is_partitioned,
+    month_start,
+    price_data,
+    price_partitions,
+    source_state,
+)
+from .logging_utils import setup_logging
+
+logger = logging.getLogger(__name__)
+
+engine = sqlalchemy.create_engine(DATABASE_URL)
+
+# pandas offset of each rollup's bucket.
+FREQUENCIES = {"1h": "h", "1d": "D"}
+
+RAW_ROWS = sqlalchemy.text(
+    """
+    SELECT symbol, type, timestamp, open, high, low, close, price, volume
+    FROM price_data
+    WHERE timestamp >= :start AND timestamp < :end
+    """
+).bindparams(
+    sqlalchemy.bindparam("start", type_=sqlalchemy.DateTime),
+    sqlalchemy.bindparam("end", type_=sqlalchemy.DateTime),
+)
+
+
+def bars(rows: pd.DataFrame, interval: str) -> pd.DataFrame:
+    """Aggregate raw price rows into OHLCV bars of ``interval``.
+
+    Rows with only a ``price`` (crypto, FRED) use it for every field;
+    ``volume`` stays empty for bars without any volume.
+    """
+    rows = rows.sort_values("timestamp", kind="stable").astype(
+        {c: float for c in ["open", "high", "low", "close", "price", "volume"]}
+    )
+    px = rows.close.fillna(rows.price)
+    frame = pd.DataFrame(
+        {
+            "symbol": rows.symbol,
+            "type": rows.type,
+            "bucket": rows.timestamp.dt.floor(FREQUENCIES[interval]),
+            "open": rows.open.fillna(px),
+            "high": rows.high.fillna(px),
+            "low": rows.low.fillna(px),
+            "close": px,
+            "volume": rows.volume,
+        }
+    )
+    out = frame.groupby(ROLLUP_KEYS, sort=False).agg(
+        open=("open", "first"),
+        high=("high", "max"),
+        low=("low", "min"),
+        close=("close", "last"),
+        volume=("volume", lambda v: v.sum(min_count=1)),
+        count=("close", "size"),
+    )
+    return out.reset_index()
+
+
+def _rollup_mark(conn, interval: str) -> datetime | None:
+    return conn.execute(
+        sqlalchemy.select(source_state.c.last_timestamp).where(
+            (source_state.c.source == "rollup") & (source_state.c.symbol == interval)
+        )
+    ).scalar()
+
+
+def refresh_rollups(engine=engine, rebuild: bool = False) -> dict[str, int]:
+    """Bring the 1h and 1d OHLCV rollups up to date with ``price_data``.
+
+    Each refresh re-aggregates from ``ROLLUP_LOOKBACK_DAYS`` before the
+    newest stored bar, so revised and late rows of recent bars are picked
+    up; ``rebuild`` recomputes every bar, e.g. after backfilling older
+    history. Raw rows are read one month at a time, which touches one
+    partition per query.
+
+    Returns
+    -------
+    dict
+        The number of bars written per interval.
+    """
+    written = {}
+    now = datetime.utcnow()
+    for interval, table in ROLLUPS.items():
+        table.create(engine, checkfirst=True)
+        source_state.create(engine, checkfirst=True)
+        with engine.connect() as conn:
+            mark = None if rebuild else _rollup_mark(conn, interval)
+            if mark is None:
+                mark = conn.execute(
+                    sqlalchemy.select(sqlalchemy.func.min(price_data.c.timestamp))
+                ).scalar()
+                lookback = timedelta(0)
+            else:
+                lookback = timedelta(days=ROLLUP_LOOKBACK_DAYS)
+        if mark is None:
+            continue
+        start = pd.Timestamp(mark - lookback).floor(FREQUENCIES[interval])
+        start = start.to_pydatetime()
+        total, newest = 0, None
+        while start <= now:
+            end = add_months(month_start(start), 1)
+            with engine.begin() as conn:
+                rows = read_frame(
+                    RAW_ROWS,
+                    conn,
+                    params={"start": start, "end": end},
+                    parse_dates=["timestamp"],
+                )
+                if not rows.empty:
+                    out = bars(rows, interval)
+                    total += upsert(out, table.name, conn, ROLLUP_KEYS, update=True)
+                    newest = out.bucket.max().to_pydatetime()
+                    upsert(
+                        pd.DataFrame(
+                            {
+                                "source": ["rollup"],
+                                "symbol": [interval],
+                                "last_timestamp": [newest],
+                            }
+                        ),
+                        "source_state",
+                        conn,
+                        ["source", "symbol"],
+                        update=True,
+                    )
+            start = end
+        written[interval] = total
+        logger.info("Refreshed %d %s bars up to %s", total, interval, newest)
+    return written
+
+
+def _archive(conn, name: str, archive_dir: str) -> str:
+    """Write a partition to ``<archive_dir>/<name>.csv.gz`` with COPY."""
+    os.makedirs(archive_dir, exist_ok=True)
+    path = os.path.join(archive_dir, f"{name}.csv.gz")
+    with gzip.open(path, "wb") as out:
+        with conn.connection.cursor() as cur:
+            cur.copy_expert(f'COPY "{name}" TO STDOUT WITH (FORMAT csv, HEADER)', out)
+    return path
+
+
+def expire_prices(
+    engine=engine,
+    retention_months: int = PRICE_RETENTION_MONTHS,
+    archive_dir: str = PRICE_ARCHIVE_DIR,
+) -> list[str]:
+    """Remove raw price rows older than ``retention_months`` months.
+
+    Whole monthly partitions are dropped, after being archived to
+    ``archive_dir`` when it is set. Databases without partitions delete
+    the expired rows instead. The rollups keep their bars. Does nothing
+    when ``retention_months`` is 0.
+
+    Returns
+    -------
+    list of str
+        The dropped partitions (or ``["price_data"]`` if rows were
+        deleted from an unpartitioned table).
+    """
+    if retention_months <= 0:
+        return []
+    cutoff = add_months(month_start(datetime.utcnow()), -retention_months)
+    with engine.begin() as conn:
+        if not is_partitioned(conn):
+            deleted = conn.execute(
+                sqlalchemy.text(
+                    "DELETE FROM price_data WHERE timestamp < :cutoff"
+                ).bindparams(sqlalchemy.bindparam("cutoff", type_=sqlalchemy.DateTime)),
+                {"cutoff": cutoff},
+            ).rowcount
+            logger.info("Deleted %d price rows before %s", deleted, cutoff)
+            return ["price_data"] if deleted else []
+        expired = [
+            name
+            for month, name in sorted(price_partitions(conn).items())
+            if add_months(month, 1) <= cutoff
+        ]
+    dropped = []
+    for name in expired:
+        # One transaction per partition, so an archive failure keeps it.
+        with engine.begin() as conn:
+            if archive_dir:
+                path = _archive(conn, name, archive_dir)
+                logger.info("Archived %s to %s", name, path)
+            conn.exec_driver_sql(f'DROP TABLE "{name}"')
+        dropped.append(name)
+    if dropped:
+        logger.info("Dropped expired partitions: %s", ", ".join(dropped))
+    return dropped
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(
+        description=(
+            "Create price_data partitions, refresh OHLCV rollups and "
+            "expire old prices."
+        )
+    )
+    parser.add_argument(
+        "--months-ahead",
+        type=int,
+        default=PARTITION_MONTHS_AHEAD,
+        help="future monthly partitions to create",
+    )
+    parser.add_argument(
+        "--retention-months",
+        type=int,
+        default=PRICE_RETENTION_MONTHS,
+        help="months of raw prices to keep (0 keeps everything)",
+    )
+    parser.add_argument(
+        "--archive-dir",
+        default=PRICE_ARCHIVE_DIR,
+        help="write expired partitions here before dropping them",
+    )
+    parser.add_argument(
+        "--rebuild-rollups",
+        action="store_true",
+        help="recompute every rollup bar instead of the recent ones",
+    )
+    args = parser.parse_args(argv)
+    ensure_partitions(engine, args.months_ahead)
+    # Before expiring, so the bars of expired months are kept.
+    refresh_rollups(engine, rebuild=args.rebuild_rollups)
+    expire_prices(engine, args.retention_months, args.archive_dir)
+
+
+if __name__ == "__main__":
+    validate_env()
+    setup_logging()
+    main()
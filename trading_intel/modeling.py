@@ -1,14 +1,35 @@
+import argparse
+import copy
 import logging
+import os
+import time
+from datetime import datetime, timedelta
 from pathlib import Path
 
+import numpy as np
 import pandas as pd
 import sqlalchemy
 import torch
 import torch.nn as nn
 from sklearn.model_selection import train_test_split
+from torch.utils.data import BatchSampler, DataLoader, SubsetRandomSampler
 
-from .config import DATABASE_URL, validate_env
+from . import feature_store
+from .config import (
+    DATABASE_URL,
+    RETRAIN_REPLAY_DAYS,
+    RETRAIN_REPLAY_RATIO,
+    SEQ_LEN,
+    TRAIN_BATCH_SIZE,
+    TRAIN_EPOCHS,
+    TRAIN_PATIENCE,
+    TRAIN_THREADS,
+    TRAIN_WORKERS,
+    validate_env,
+)
+from .indicators import feature_columns
 from .logging_utils import setup_logging
+from .sequences import SequenceDataset, blocks
 
 logger = logging.getLogger(__name__)
 
@@ -27,29 +48,296 @@ class SimpleLSTM(nn.Module):
         return self.fc(self.lstm(x)[0][:, -1, :])
 
 
-def train():
-    df = pd.read_sql("features", engine)
-    X = df[["price_diff", "ema_12", "sentiment_score"]].values
-    y = df["price_diff"].shift(-1).fillna(0).values
-    X_train, X_test, y_train, y_test = train_test_split(
-        X, y, test_size=0.2, shuffle=False
+class _Batches:
+    """DataLoader source whose items are whole batches of windows."""
+
+    def __init__(self, dataset: SequenceDataset) -> None:
+        self.dataset = dataset
+
+    def __len__(self) -> int:
+        return len(self.dataset)
+
+    def __getitem__(self, idx):
+        return self.dataset.batch(np.asarray(idx))
+
+
+def _loader(
+    dataset: SequenceDataset,
+    idx: np.ndarray,
+    batch_size: int,
+    workers: int,
+    shuffle: bool,
+) -> DataLoader:
+    """Batches of the windows ``idx``, gathered on ``workers`` processes."""
+    sampler = BatchSampler(
+        SubsetRandomSampler(idx) if shuffle else idx,
+        batch_size,
+        drop_last=False,
+    )
+    return DataLoader(
+        _Batches(dataset),
+        sampler=sampler,
+        batch_size=None,
+        num_workers=workers,
+        persistent_workers=workers > 0,
+    )
+
+
+def load_checkpoint(path: Path | None = None) -> dict | None:
+    """Read a checkpoint written by :func:`save_checkpoint`.
+
+    Older files holding only the model's ``state_dict`` come back as
+    ``{"model": state_dict}``. Returns None if there is no checkpoint.
+    """
+    path = lstm_path if path is None else path
+    if not path.exists():
+        return None
+    data = torch.load(path)
+    return data if "model" in data else {"model": data}
+
+
+def save_checkpoint(
+    model: nn.Module, optimizer, watermark, path: Path | None = None
+) -> None:
+    """Atomically write the model, optimizer state and data watermark.
+
+    The checkpoint goes to a temporary file that then replaces ``path``,
+    so readers never see a partly written file.
+    """
+    path = lstm_path if path is None else path
+    tmp = path.with_name(path.name + ".tmp")
+    torch.save(
+        {
+            "model": model.state_dict(),
+            "optimizer": optimizer.state_dict(),
+            "watermark": pd.Timestamp(watermark).isoformat(),
+            "columns": feature_columns(),
+            "seq_len": SEQ_LEN,
+        },
+        tmp,
+    )
+    os.replace(tmp, path)
+
+
+def _training_set(
+    start: datetime | None = None,
+) -> tuple[SequenceDataset, np.ndarray] | None:
+    """Windows of the feature store and the time of every row.
+
+    Only rows from ``start`` on are read. The feature matrix is written
+    to a memory-mapped scratch file in the store, so it is paged from
+    disk rather than held in memory.
+    """
+    feature_store.sync(engine)
+    columns = feature_columns()
+    table = feature_store.read_table(
+        ["symbol", "type", "timestamp", "price_diff", *columns], start=start
+    )
+    if not table.num_rows:
+        return None
+    symbol = feature_store.codes(table, "symbol")
+    type_ = feature_store.codes(table, "type")
+    timestamp = table.column("timestamp").to_numpy()
+    # Each symbol's rows contiguous and in time order.
+    order = np.lexsort((timestamp, type_, symbol))
+    X = np.lib.format.open_memmap(
+        feature_store.store_dir / "training.npy",
+        mode="w+",
+        dtype=np.float32,
+        shape=(table.num_rows, len(columns)),
+    )
+    feature_store.feature_matrix(table, columns, order, out=X)
+    # Indicators without enough history yet (or without volume) are NaN.
+    np.nan_to_num(X, copy=False)
+    diff = feature_store.feature_matrix(table, ["price_diff"], order)[:, 0]
+    np.nan_to_num(diff, copy=False)
+    dataset = SequenceDataset(
+        X, blocks(symbol[order], type_[order]), SEQ_LEN, target=diff
     )
-    X_train = torch.FloatTensor(X_train).unsqueeze(1)
-    y_train = torch.FloatTensor(y_train)
-    model = SimpleLSTM(X_train.shape[-1])
+    return dataset, timestamp[order]
+
+
+def _warm_start(checkpoint: dict | None) -> dict | None:
+    """``checkpoint`` if it can be fine-tuned with the current settings."""
+    if checkpoint is None or "watermark" not in checkpoint:
+        logger.info("No incremental checkpoint; training from scratch")
+        return None
+    if checkpoint["columns"] != feature_columns() or checkpoint["seq_len"] != SEQ_LEN:
+        logger.info("Features or SEQ_LEN changed; training from scratch")
+        return None
+    return checkpoint
+
+
+def _split_new(
+    dataset: SequenceDataset, times: np.ndarray, watermark, replay: float
+) -> tuple[np.ndarray, np.ndarray]:
+    """Fine-tuning windows: new ones plus a replay sample of older ones.
+
+    Windows labelled with a row after ``watermark`` are new; the 20% of
+    them that end last are held out. ``replay`` times as many windows
+    labelled before it are drawn at random and trained on as well.
+    """
+    labelled = times[dataset.ends + 1]
+    new = np.flatnonzero(labelled > np.datetime64(watermark))
+    new = new[np.argsort(times[dataset.ends[new]], kind="stable")]
+    if len(new) > 1:
+        fit_idx, test_idx = train_test_split(new, test_size=0.2, shuffle=False)
+    else:
+        fit_idx, test_idx = new, new[:0]
+    old = np.flatnonzero(labelled <= np.datetime64(watermark))
+    size = min(len(old), int(round(replay * len(fit_idx))))
+    sample = np.random.default_rng().choice(old, size, replace=False)
+    logger.info(
+        "Fine-tuning on %d new windows and %d replayed ones",
+        len(fit_idx),
+        size,
+    )
+    return np.concatenate([fit_idx, sample]), test_idx
+
+
+def _evaluate(model, loader, criterion) -> float:
+    model.eval()
+    total, count = 0.0, 0
+    with torch.no_grad():
+        for windows, labels in loader:
+            loss = criterion(model(windows).squeeze(-1), labels)
+            total += loss.item() * len(labels)
+            count += len(labels)
+    return total / count
+
+
+def train(
+    epochs: int = TRAIN_EPOCHS,
+    batch_size: int = TRAIN_BATCH_SIZE,
+    patience: int = TRAIN_PATIENCE,
+    workers: int = TRAIN_WORKERS,
+    threads: int = TRAIN_THREADS,
+    incremental: bool = False,
+) -> None:
+    """Train the LSTM on mini-batches of windows from the feature store.
+
+    Each epoch visits the training windows once in shuffled batches of
+    ``batch_size``, gathered by ``workers`` DataLoader processes. Training
+    stops once the loss on the held-out windows (the 20% that end last)
+    has not improved for ``patience`` epochs, and the best model is
+    saved with its optimizer state and the newest row trained on.
+
+    With ``incremental``, the saved model and optimizer continue from that
+    checkpoint on the windows labelled with newer rows, plus a replay
+    sample of ``RETRAIN_REPLAY_RATIO`` times as many older windows from
+    the last ``RETRAIN_REPLAY_DAYS`` days. Only those days of the store
+    are read. The model is kept unless fine-tuning lowers its held-out
+    loss; without a usable checkpoint it trains from scratch.
+    """
+    if threads > 0:
+        torch.set_num_threads(threads)
+    checkpoint = _warm_start(load_checkpoint()) if incremental else None
+    start = None
+    if checkpoint is not None:
+        watermark = pd.Timestamp(checkpoint["watermark"])
+        start = watermark - timedelta(days=RETRAIN_REPLAY_DAYS)
+    loaded = _training_set(start)
+    if loaded is None or not len(loaded[0]):
+        logger.error("No symbol has %d feature rows to train on", SEQ_LEN + 1)
+        return
+    dataset, times = loaded
+    model = SimpleLSTM(dataset.X.shape[-1])
     criterion = nn.MSELoss()
     optimizer = torch.optim.Adam(model.parameters(), lr=1e-3)
-    for epoch in range(50):
+    if checkpoint is None:
+        by_time = np.argsort(times[dataset.ends], kind="stable")
+        train_idx, test_idx = train_test_split(by_time, test_size=0.2, shuffle=False)
+    else:
+        train_idx, test_idx = _split_new(
+            dataset, times, watermark, RETRAIN_REPLAY_RATIO
+        )
+        if not len(train_idx):
+            logger.info("No new feature rows since %s", watermark)
+            return
+        model.load_state_dict(checkpoint["model"])
+        optimizer.load_state_dict(checkpoint["optimizer"])
+    train_loader = _loader(dataset, train_idx, batch_size, workers, True)
+    test_loader = _loader(dataset, test_idx, batch_size, workers, False)
+    best, best_state, stale = float("inf"), None, 0
+    if checkpoint is not None and len(test_idx):
+        # Fine-tuning has to beat the model it starts from.
+        best = _evaluate(model, test_loader, criterion)
+        best_state = copy.deepcopy((model.state_dict(), optimizer.state_dict()))
+    for epoch in range(epochs):
         model.train()
-        optimizer.zero_grad()
-        loss = criterion(model(X_train).squeeze(), y_train)
-        loss.backward()
-        optimizer.step()
-    torch.save(model.state_dict(), lstm_path)
-    logger.info("\U0001f389 Model trained, loss: %s", loss.item())
+        t0, total = time.perf_counter(), 0.0
+        for windows, labels in train_loader:
+            optimizer.zero_grad()
+            loss = criterion(model(windows).squeeze(-1), labels)
+            loss.backward()
+            optimizer.step()
+            total += loss.item() * len(labels)
+        elapsed = time.perf_counter() - t0
+        train_loss = total / len(train_idx)
+        val_loss = (
+            _evaluate(model, test_loader, criterion) if len(test_idx) else train_loss
+        )
+        logger.info(
+            "Epoch %d: train loss %.6g, held-out loss %.6g, %.0f samples/s",
+            epoch + 1,
+            train_loss,
+            val_loss,
+            len(train_idx) / elapsed if elapsed > 0 else float("inf"),
+        )
+        if val_loss < best:
+            best, stale = val_loss, 0
+            best_state = copy.deepcopy((model.state_dict(), optimizer.state_dict()))
+        else:
+            stale += 1
+            if stale >= patience:
+                logger.info("No improvement for %d epochs; stopping", stale)
+                break
+    if best_state is not None:
+        model.load_state_dict(best_state[0])
+        optimizer.load_state_dict(best_state[1])
+    save_checkpoint(model, optimizer, times.max())
+    logger.info("\U0001f389 Model trained, held-out loss: %s", best)
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Train the LSTM.")
+    parser.add_argument("--epochs", type=int, default=TRAIN_EPOCHS)
+    parser.add_argument("--batch-size", type=int, default=TRAIN_BATCH_SIZE)
+    parser.add_argument(
+        "--patience",
+        type=int,
+        default=TRAIN_PATIENCE,
+        help="epochs without a better held-out loss before stopping",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=TRAIN_WORKERS,
+        help="DataLoader processes gathering batches",
+    )
+    parser.add_argument(
+        "--threads",
+        type=int,
+        default=TRAIN_THREADS,
+        help="torch intra-op threads (0 keeps the default)",
+    )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="fine-tune the saved model on rows since its checkpoint",
+    )
+    args = parser.parse_args(argv)
+    train(
+        epochs=args.epochs,
+        batch_size=args.batch_size,
+        patience=args.patience,
+        workers=args.workers,
+        threads=args.threads,
+        incremental=args.incremental,
+    )
 
 
 if __name__ == "__main__":
     validate_env()
     setup_logging()
-    train()
+    main()
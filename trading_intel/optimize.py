@@ -5,8 +5,10 @@ import torch
 import torch.nn.utils.prune as prune
 import torch.quantization
 
+from .config import SEQ_LEN
+from .indicators import feature_columns
 from .logging_utils import setup_logging
-from .modeling import SimpleLSTM
+from .modeling import SimpleLSTM, load_checkpoint
 
 logger = logging.getLogger(__name__)
 setup_logging()
@@ -16,9 +18,10 @@ lstm_path = base_dir / "lstm.pth"
 if not lstm_path.exists():
     logger.error("LSTM state not found at %s", lstm_path)
     raise SystemExit(1)
-state = torch.load(lstm_path)
+state = load_checkpoint(lstm_path)["model"]
 
-model = SimpleLSTM(input_dim=3)
+input_dim = len(feature_columns())
+model = SimpleLSTM(input_dim=input_dim)
 model.load_state_dict(state)
 
 prune.l1_unstructured(model.lstm, name="weight_ih_l0", amount=0.5)
@@ -31,14 +34,18 @@ torch.backends.quantized.engine = backend
 logger.info("Using quantization backend: %s", backend)
 model.qconfig = torch.quantization.get_default_qconfig(backend)
 model_prepared = torch.quantization.prepare(model)
-model_prepared(torch.randn(1, 1, 3))
+model_prepared(torch.randn(1, SEQ_LEN, input_dim))
 model_int8 = torch.quantization.convert(model_prepared)
 
-dummy = torch.randn(1, 1, 3)
+dummy = torch.randn(1, SEQ_LEN, input_dim)
 torch.onnx.export(
     model_int8,
     dummy,
     base_dir / "lstm_model.onnx",
     opset_version=13,
+    input_names=["input"],
+    output_names=["output"],
+    # One window per symbol, so the batch size varies between ticks.
+    dynamic_axes={"input": {0: "batch"}, "output": {0: "batch"}},
 )
 logger.info("\u2705 ONNX export complete.")
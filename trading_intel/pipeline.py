@@ -0,0 +1,232 @@
+import asyncio
+import logging
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+import sqlalchemy
+
+from .alignment import align
+from .bulk import write_frame
+from .config import DATABASE_URL, FEATURE_BUFFER_ROWS
+from .features import (
+    KEY_COLUMNS,
+    compute_features,
+    create_features,
+    load_states,
+    save_states,
+)
+from .indicators import REQUIRED_COLUMNS, state_is_current
+from .init_db import feature_state
+
+logger = logging.getLogger(__name__)
+
+engine = sqlalchemy.create_engine(DATABASE_URL)
+
+# Hourly sentiment for a bounded time range only, so the lookup cost does
+# not grow with the rollup table.
+SENTIMENT_WINDOW = sqlalchemy.text(
+    """
+    SELECT hour,
+           SUM(compound_mean * post_count) / SUM(post_count) AS sentiment
+    FROM sentiment_hourly
+    WHERE hour >= :start AND hour <= :end
+    GROUP BY hour
+    """
+).bindparams(
+    sqlalchemy.bindparam("start", type_=sqlalchemy.DateTime),
+    sqlalchemy.bindparam("end", type_=sqlalchemy.DateTime),
+)
+
+RECENT_FEATURES = sqlalchemy.text(
+    """
+    SELECT * FROM features
+    WHERE symbol = :symbol AND type = :type
+    ORDER BY timestamp DESC
+    LIMIT :limit
+    """
+)
+
+
+class FeaturePipeline:
+    """In-process fetch, features and predict path for the daemon.
+
+    Fetched price rows are turned into feature rows in memory, continuing
+    from the per-``(symbol, type)`` indicator state, and the newest rows of
+    each symbol are kept in a bounded ring buffer for the model to read.
+    The database is only written for persistence: new feature rows and
+    states are handed to a single background writer thread, which keeps
+    them in order without blocking the event loop.
+
+    When a write fails, it and every write queued behind it are dropped,
+    and the next :meth:`update` reloads the committed states, watermarks
+    and buffers and recomputes the dropped price rows together with the
+    new ones, so a failed write never leaves a gap in ``features``.
+    """
+
+    def __init__(self, engine=engine, buffer_rows: int = FEATURE_BUFFER_ROWS):
+        self.engine = engine
+        self.buffer_rows = buffer_rows
+        self.states: dict = {}
+        self.watermarks: dict = {}
+        self.buffers: dict[tuple, deque] = {}
+        self.loaded = False
+        self._writer = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="feature-writer"
+        )
+        self._pending: set[asyncio.Future] = set()
+        # Writes are tagged with the generation they were computed in; a
+        # failed write bumps it, so the writes computed on top of it are
+        # skipped until the pipeline has reloaded.
+        self._generation = 0
+        self._failed_generation = -1
+        self._retry: list[pd.DataFrame] = []
+
+    def load(self) -> None:
+        """Restore states, watermarks and buffers from the database.
+
+        Bootstraps the ``features`` table with a full build first when no
+        feature state has been saved yet, or when it was saved for a
+        different set of indicators.
+        """
+        feature_state.create(self.engine, checkfirst=True)
+        with self.engine.connect() as conn:
+            states = load_states(conn)
+        if not states or not all(map(state_is_current, states.values())):
+            create_features()
+            with self.engine.connect() as conn:
+                states = load_states(conn)
+        self.buffers = {}
+        with self.engine.connect() as conn:
+            rows = conn.execute(sqlalchemy.select(feature_state)).fetchall()
+            self.watermarks = {(r.symbol, r.type): r.watermark for r in rows}
+            if not sqlalchemy.inspect(conn).has_table("features"):
+                rows = []
+            for r in rows:
+                recent = pd.read_sql(
+                    RECENT_FEATURES,
+                    conn,
+                    params={
+                        "symbol": r.symbol,
+                        "type": r.type,
+                        "limit": self.buffer_rows,
+                    },
+                    parse_dates=["timestamp"],
+                )
+                self._buffer((r.symbol, r.type)).extend(
+                    recent.iloc[::-1].to_dict("records")
+                )
+        self.states = states
+        self.loaded = True
+        logger.info("Feature pipeline loaded state for %d symbols", len(self.states))
+
+    def _buffer(self, key: tuple) -> deque:
+        if key not in self.buffers:
+            self.buffers[key] = deque(maxlen=self.buffer_rows)
+        return self.buffers[key]
+
+    def _new_rows(self, prices: pd.DataFrame) -> pd.DataFrame:
+        """Rows of ``prices`` past their symbol's watermark, oldest first."""
+        if prices.empty:
+            return prices
+        marks = pd.Series(
+            [self.watermarks.get(key) for key in zip(prices.symbol, prices.type)],
+            index=prices.index,
+            dtype="datetime64[ns]",
+        )
+        new = prices[marks.isna() | (prices.timestamp > marks)]
+        new = new.drop_duplicates(KEY_COLUMNS + ["timestamp"], keep="last")
+        return new.sort_values("timestamp", kind="stable").reset_index(drop=True)
+
+    def _sentiment(self, timestamps: pd.Series) -> pd.Series:
+        hours = timestamps.dt.floor("h")
+        with self.engine.connect() as conn:
+            hourly = pd.read_sql(
+                SENTIMENT_WINDOW,
+                conn,
+                params={
+                    "start": hours.min().to_pydatetime(),
+                    "end": hours.max().to_pydatetime(),
+                },
+            )
+        lookup = hourly.set_index(pd.to_datetime(hourly.hour)).sentiment
+        return hours.map(lookup).fillna(0.0).astype(float)
+
+    def _persist(
+        self, generation: int, rows: pd.DataFrame, df: pd.DataFrame, states
+    ) -> None:
+        if generation <= self._failed_generation:
+            raise RuntimeError("an earlier feature write failed")
+        try:
+            with self.engine.begin() as conn:
+                write_frame(rows, "features", conn)
+                save_states(conn, df, states, full=False)
+        except Exception:
+            self._failed_generation = generation
+            raise
+
+    async def update(self, prices: pd.DataFrame) -> pd.DataFrame:
+        """Compute features for the new rows of freshly fetched ``prices``.
+
+        Returns
+        -------
+        pandas.DataFrame
+            The feature rows added to the buffers; empty if nothing was
+            newer than the stored watermarks.
+        """
+        if self._retry:
+            prices = pd.concat([*self._retry, prices], ignore_index=True)
+            self._retry = []
+        if not self.loaded:
+            try:
+                await asyncio.to_thread(self.load)
+            except Exception:
+                self._retry.append(prices)
+                raise
+        new = self._new_rows(prices)
+        if new.empty:
+            return new
+        fetched = new.copy()
+        new["sentiment_score"] = await asyncio.to_thread(self._sentiment, new.timestamp)
+        df, states = compute_features(new, self.states)
+        df = await asyncio.to_thread(align, df, self.engine)
+        rows = df.dropna(subset=REQUIRED_COLUMNS)
+        self.states = states
+        for key, watermark in (
+            df.groupby(KEY_COLUMNS, sort=False).timestamp.max().items()
+        ):
+            self.watermarks[key] = watermark
+        for key, group in rows.groupby(KEY_COLUMNS, sort=False):
+            self._buffer(key).extend(group.to_dict("records"))
+        # Snapshot the states: later updates replace entries of the dict.
+        snapshot = {key: dict(value) for key, value in states.items()}
+        generation = self._generation
+        future = asyncio.get_running_loop().run_in_executor(
+            self._writer, self._persist, generation, rows, df, snapshot
+        )
+        self._pending.add(future)
+        future.add_done_callback(lambda f: self._written(f, generation, fetched))
+        return rows
+
+    def _written(
+        self, future: asyncio.Future, generation: int, fetched: pd.DataFrame
+    ) -> None:
+        self._pending.discard(future)
+        if future.exception() is None:
+            return
+        logger.error("Failed to persist features: %s", future.exception())
+        # Keep the prices for the next update, which reloads the committed
+        # state and computes them again.
+        self._retry.append(fetched)
+        if generation == self._generation:
+            self._generation += 1
+            self.loaded = False
+
+    def recent(self, symbol: str, type_: str) -> pd.DataFrame:
+        """The buffered feature rows of one symbol, oldest first."""
+        return pd.DataFrame(list(self.buffers.get((symbol, type_), ())))
+
+    async def flush(self) -> None:
+        """Wait for all queued database writes to finish."""
+        if self._pending:
+            await asyncio.gather(*self._pending, return_exceptions=True)
@@ -0,0 +1,31 @@
+import time
+
+
+class CadenceScheduler:
+    """Track when each source is next due, given per-source intervals.
+
+    ``intervals`` maps a source name to seconds between runs; sources with
+    an interval of 0 or less are never due. Every source is due on the
+    first call to :meth:`due`.
+    """
+
+    def __init__(self, intervals: dict[str, float], clock=time.monotonic):
+        self.intervals = {
+            name: seconds for name, seconds in intervals.items() if seconds > 0
+        }
+        self.clock = clock
+        self._next_run = {name: 0.0 for name in self.intervals}
+
+    def due(self) -> list[str]:
+        """Sources whose interval has elapsed, marked as run now."""
+        now = self.clock()
+        names = [n for n, at in self._next_run.items() if at <= now]
+        for name in names:
+            self._next_run[name] = now + self.intervals[name]
+        return names
+
+    def next_due_in(self) -> float:
+        """Seconds until the next source is due (0 if one already is)."""
+        if not self._next_run:
+            return float("inf")
+        return max(0.0, min(self._next_run.values()) - self.clock())
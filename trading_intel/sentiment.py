@@ -0,0 +1,237 @@
+import argparse
+import logging
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+import sqlalchemy
+from vaderSentiment.vaderSentiment import SentimentIntensityAnalyzer
+
+from .bulk import read_frame, transaction, write_frame
+from .config import (
+    DATABASE_URL,
+    SENTIMENT_INCLUDE_SELFTEXT,
+    SENTIMENT_WORKERS,
+    validate_env,
+)
+from .init_db import reddit_sentiment, sentiment_hourly
+from .logging_utils import setup_logging
+
+logger = logging.getLogger(__name__)
+
+engine = sqlalchemy.create_engine(DATABASE_URL)
+vader = SentimentIntensityAnalyzer()
+
+# Below this many posts a process pool costs more than it saves.
+POOL_MIN_POSTS = 2000
+POOL_CHUNK_SIZE = 500
+
+ROLLUP_COLUMNS = [
+    "sub",
+    "hour",
+    "compound_mean",
+    "post_count",
+    "compound_min",
+    "compound_max",
+]
+
+# Merges a partial rollup into the stored one. Every right-hand side sees
+# the pre-update row, so the weighted mean uses the old count.
+UPSERT_HOURLY = sqlalchemy.text(
+    """
+    INSERT INTO sentiment_hourly
+        (sub, hour, compound_mean, post_count, compound_min, compound_max)
+    VALUES
+        (:sub, :hour, :compound_mean, :post_count, :compound_min,
+         :compound_max)
+    ON CONFLICT (sub, hour) DO UPDATE SET
+        compound_mean = (
+            sentiment_hourly.compound_mean * sentiment_hourly.post_count
+            + excluded.compound_mean * excluded.post_count
+        ) / (sentiment_hourly.post_count + excluded.post_count),
+        post_count = sentiment_hourly.post_count + excluded.post_count,
+        compound_min = CASE
+            WHEN excluded.compound_min < sentiment_hourly.compound_min
+            THEN excluded.compound_min ELSE sentiment_hourly.compound_min
+        END,
+        compound_max = CASE
+            WHEN excluded.compound_max > sentiment_hourly.compound_max
+            THEN excluded.compound_max ELSE sentiment_hourly.compound_max
+        END
+    """
+).bindparams(sqlalchemy.bindparam("hour", type_=sqlalchemy.DateTime))
+
+
+def score(text: str) -> float:
+    """Return the VADER compound score of ``text`` (0.0 when empty)."""
+    return (
+        vader.polarity_scores(text)["compound"]
+        if isinstance(text, str) and text
+        else 0.0
+    )
+
+
+def _score_chunk(texts: list[str]) -> list[float]:
+    return [score(t) for t in texts]
+
+
+def score_mode(include_selftext: bool = SENTIMENT_INCLUDE_SELFTEXT) -> str:
+    return "title_selftext" if include_selftext else "title"
+
+
+def post_text(
+    posts: pd.DataFrame, include_selftext: bool = SENTIMENT_INCLUDE_SELFTEXT
+) -> pd.Series:
+    """The text scored for each post: the title, optionally with selftext."""
+    title = posts.title.fillna("")
+    if not include_selftext or "selftext" not in posts:
+        return title
+    return (title + "\n" + posts.selftext.fillna("")).str.strip()
+
+
+def score_posts(
+    posts: pd.DataFrame,
+    include_selftext: bool = SENTIMENT_INCLUDE_SELFTEXT,
+    workers: int = SENTIMENT_WORKERS,
+) -> pd.Series:
+    """Score ``posts``, fanning large batches out over a process pool.
+
+    Returns
+    -------
+    pandas.Series
+        Compound scores aligned with ``posts.index``.
+    """
+    texts = post_text(posts, include_selftext).tolist()
+    if workers > 1 and len(texts) >= POOL_MIN_POSTS:
+        chunks = [
+            texts[i : i + POOL_CHUNK_SIZE]  # noqa: E203
+            for i in range(0, len(texts), POOL_CHUNK_SIZE)
+        ]
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            scores = [s for chunk in pool.map(_score_chunk, chunks) for s in chunk]
+    else:
+        scores = _score_chunk(texts)
+    return pd.Series(scores, index=posts.index, dtype=float)
+
+
+def hourly_rollup(posts: pd.DataFrame) -> pd.DataFrame:
+    """Aggregate scored posts into one row per ``(sub, hour)``.
+
+    ``posts`` needs ``sub``, ``timestamp`` and ``compound`` columns.
+    """
+    if posts.empty:
+        return pd.DataFrame(columns=ROLLUP_COLUMNS)
+    hour = posts.timestamp.dt.floor("h").rename("hour")
+    rollup = (
+        posts.groupby([posts["sub"], hour])
+        .compound.agg(["mean", "count", "min", "max"])
+        .reset_index()
+    )
+    rollup.columns = ROLLUP_COLUMNS
+    return rollup
+
+
+def _store_scores(conn, posts: pd.DataFrame, mode: str) -> None:
+    reddit_sentiment.create(conn, checkfirst=True)
+    scores = posts[["id", "compound"]].assign(mode=mode)
+    write_frame(scores, "reddit_sentiment", conn)
+
+
+def ingest_posts(posts: pd.DataFrame, engine=engine) -> int:
+    """Score newly stored ``posts`` once and update the derived tables.
+
+    Scores go to ``reddit_sentiment`` and are merged into the hourly
+    rollup. Posts must only be passed once; re-adding a post counts it
+    twice in the rollup. ``engine`` may be a connection, to join the
+    transaction that stored the posts.
+
+    Returns
+    -------
+    int
+        The number of ``(sub, hour)`` rows touched.
+    """
+    if posts.empty:
+        return 0
+    posts = posts.assign(compound=score_posts(posts))
+    rollup = hourly_rollup(posts)
+    with transaction(engine) as conn:
+        _store_scores(conn, posts, score_mode())
+        sentiment_hourly.create(conn, checkfirst=True)
+        conn.execute(UPSERT_HOURLY, rollup.to_dict("records"))
+    return len(rollup)
+
+
+def backfill_scores(
+    engine=engine,
+    workers: int = SENTIMENT_WORKERS,
+    rescore: bool = False,
+) -> int:
+    """Score stored posts that have no entry in ``reddit_sentiment``.
+
+    With ``rescore`` every post is scored again, e.g. after switching
+    ``SENTIMENT_INCLUDE_SELFTEXT``.
+    """
+    reddit_sentiment.create(engine, checkfirst=True)
+    query = "SELECT r.id, r.title, r.selftext FROM reddit_data r"
+    if not rescore:
+        query += """
+        LEFT JOIN reddit_sentiment s ON s.id = r.id
+        WHERE s.id IS NULL
+        """
+    posts = read_frame(query, engine)
+    if posts.empty:
+        return 0
+    posts["compound"] = score_posts(posts, workers=workers)
+    # The old scores are replaced in the same transaction, so a failure
+    # while scoring or writing keeps them.
+    with engine.begin() as conn:
+        if rescore:
+            conn.execute(reddit_sentiment.delete())
+        _store_scores(conn, posts, score_mode())
+    logger.info("Scored %d stored Reddit posts", len(posts))
+    return len(posts)
+
+
+def rebuild_hourly(engine=engine) -> int:
+    """Recompute ``sentiment_hourly`` from the stored post scores."""
+    posts = read_frame(
+        """
+        SELECT r.sub, r.timestamp, s.compound
+        FROM reddit_data r
+        JOIN reddit_sentiment s ON s.id = r.id
+        """,
+        engine,
+        parse_dates=["timestamp"],
+    )
+    rollup = hourly_rollup(posts)
+    with transaction(engine) as conn:
+        sentiment_hourly.create(conn, checkfirst=True)
+        conn.execute(sentiment_hourly.delete())
+        write_frame(rollup, "sentiment_hourly", conn)
+    logger.info("Sentiment rollup rebuilt with %d hours", len(rollup))
+    return len(rollup)
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(
+        description="Score stored Reddit posts and rebuild the rollup."
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=SENTIMENT_WORKERS,
+        help="scoring processes (default: SENTIMENT_WORKERS)",
+    )
+    parser.add_argument(
+        "--rescore",
+        action="store_true",
+        help="discard stored scores and score every post again",
+    )
+    args = parser.parse_args(argv)
+    backfill_scores(workers=args.workers, rescore=args.rescore)
+    rebuild_hourly()
+
+
+if __name__ == "__main__":
+    validate_env()
+    setup_logging()
+    main()
@@ -0,0 +1,111 @@
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+
+def blocks(*keys: np.ndarray) -> np.ndarray:
+    """Bounds of the runs of equal ``keys``, e.g. symbol and type.
+
+    Returns
+    -------
+    numpy.ndarray
+        ``[0, start_1, ..., start_k, len]``, so block ``i`` spans
+        ``bounds[i]:bounds[i + 1]``.
+    """
+    n = len(keys[0])
+    change = np.zeros(max(n - 1, 0), dtype=bool)
+    for key in keys:
+        change |= key[1:] != key[:-1]
+    return np.concatenate([[0], np.flatnonzero(change) + 1, [n]])
+
+
+def window_view(X: np.ndarray, seq_len: int) -> np.ndarray:
+    """Every ``seq_len``-row window of ``X`` as a read-only view.
+
+    Window ``i`` is ``X[i:i + seq_len]``; the result has shape
+    ``(rows - seq_len + 1, seq_len, features)`` and shares ``X``'s memory.
+    """
+    return sliding_window_view(X, seq_len, axis=0).transpose(0, 2, 1)
+
+
+def window_ends(bounds: np.ndarray, seq_len: int, horizon: int = 0) -> np.ndarray:
+    """Last rows of the windows that stay inside one block.
+
+    ``horizon`` rows after each window must also be in its block, for
+    windows that are labelled with a later row.
+    """
+    ends = [
+        np.arange(lo + seq_len - 1, hi - horizon)
+        for lo, hi in zip(bounds[:-1], bounds[1:])
+    ]
+    return np.concatenate(ends or [[]]).astype(np.int64)
+
+
+class SequenceDataset:
+    """``(seq_len, features)`` windows over per-block contiguous rows.
+
+    ``X`` holds the rows of each block (symbol) contiguously, oldest
+    first, with ``bounds`` from :func:`blocks`. Windows are views into
+    ``X``, so building the dataset copies nothing; only :meth:`batch`
+    gathers windows into a new array. With ``target``, the window ending
+    at row ``t`` is labelled ``target[t + 1]``, the next row of the same
+    block. Items work with ``torch.utils.data.DataLoader``.
+    """
+
+    def __init__(
+        self,
+        X: np.ndarray,
+        bounds: np.ndarray,
+        seq_len: int,
+        target: np.ndarray | None = None,
+    ) -> None:
+        self.X = X
+        self.seq_len = seq_len
+        self.target = target
+        self.view = window_view(X, seq_len)
+        self.ends = window_ends(bounds, seq_len, int(target is not None))
+
+    def __len__(self) -> int:
+        return len(self.ends)
+
+    def __getitem__(self, i: int):
+        end = self.ends[i]
+        window = self.view[end - self.seq_len + 1]
+        if self.target is None:
+            return window
+        return window, self.target[end + 1]
+
+    def batch(self, idx: np.ndarray):
+        """Windows (and labels) ``idx`` stacked into new arrays."""
+        ends = self.ends[idx]
+        windows = self.view[ends - self.seq_len + 1]
+        if self.target is None:
+            return windows
+        return windows, self.target[ends + 1]
+
+
+def last_windows(
+    frames: list[pd.DataFrame], columns: list[str], seq_len: int
+) -> tuple[np.ndarray, list[int]]:
+    """The newest ``seq_len``-row window of each frame, for inference.
+
+    Frames hold one symbol's rows, oldest first; frames shorter than
+    ``seq_len`` are skipped. Missing values become 0, as in training.
+
+    Returns
+    -------
+    tuple
+        Windows shaped ``(frames, seq_len, features)`` and the positions
+        of the frames they came from.
+    """
+    tails = [
+        (i, df[columns].tail(seq_len))
+        for i, df in enumerate(frames)
+        if len(df) >= seq_len
+    ]
+    if not tails:
+        return np.empty((0, seq_len, len(columns)), np.float32), []
+    X = np.concatenate([t.fillna(0.0).to_numpy(np.float32) for _, t in tails])
+    bounds = np.arange(0, len(X) + 1, seq_len)
+    dataset = SequenceDataset(X, bounds, seq_len)
+    return dataset.batch(np.arange(len(dataset))), [i for i, _ in tails]
@@ -0,0 +1,154 @@
+import asyncio
+import logging
+import time
+
+import pandas as pd
+
+from .config import WRITE_BATCH_ROWS, WRITE_FLUSH_SECONDS, WRITE_QUEUE_SIZE
+
+logger = logging.getLogger(__name__)
+
+
+class BatchWriter:
+    """Single database writer fed by a bounded queue of parsed frames.
+
+    Producers ``await put(target, source, df)``. The queue holds at most
+    ``queue_size`` frames, so when the database falls behind the producers
+    wait instead of piling up frames or connections. The writer groups
+    queued frames by target and hands each group to
+    ``handlers[target](conn, items)``, with ``items`` the ``(source, df)``
+    pairs in arrival order; it may return a callable to run once the
+    transaction has committed. All targets of a flush share one connection,
+    each in its own transaction, so one failing target does not roll back
+    the others. A flush happens once ``batch_rows`` rows are pending,
+    ``flush_interval`` seconds after the oldest pending frame arrived, or
+    on :meth:`flush`.
+
+    When a target fails to write, its frames are dropped, their sources
+    are added to :attr:`failed` and ``on_error(sources, exc)`` is called in
+    a worker thread.
+    """
+
+    def __init__(
+        self,
+        engine,
+        handlers: dict,
+        queue_size: int = WRITE_QUEUE_SIZE,
+        batch_rows: int = WRITE_BATCH_ROWS,
+        flush_interval: float = WRITE_FLUSH_SECONDS,
+        on_error=None,
+    ) -> None:
+        self.engine = engine
+        self.handlers = handlers
+        self.batch_rows = batch_rows
+        self.flush_interval = flush_interval
+        self.on_error = on_error
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.flushes = 0
+        self.failed: set[str] = set()
+        self._pending: dict[str, list[tuple[str, pd.DataFrame]]] = {}
+        self._rows = 0
+        self._oldest: float | None = None
+        self._task: asyncio.Task | None = None
+
+    async def put(self, target: str, source: str, df: pd.DataFrame) -> None:
+        """Queue ``df`` for ``target``; waits while the queue is full."""
+        if target not in self.handlers:
+            raise KeyError(f"no writer for {target!r}")
+        if df.empty:
+            return
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+        await self.queue.put((target, source, df))
+
+    async def flush(self) -> None:
+        """Wait until every frame queued so far has been written."""
+        if self._task is None or self._task.done():
+            return
+        done = asyncio.get_running_loop().create_future()
+        await self.queue.put(done)
+        await done
+
+    async def close(self) -> None:
+        """Flush and stop the writer task."""
+        await self.flush()
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            timeout = None
+            if self._oldest is not None:
+                age = time.monotonic() - self._oldest
+                timeout = max(0.0, self.flush_interval - age)
+            try:
+                item = await asyncio.wait_for(self.queue.get(), timeout)
+            except asyncio.TimeoutError:
+                await self._flush()
+                continue
+            if isinstance(item, asyncio.Future):
+                await self._flush()
+                item.set_result(None)
+                continue
+            target, source, df = item
+            self._pending.setdefault(target, []).append((source, df))
+            self._rows += len(df)
+            if self._oldest is None:
+                self._oldest = time.monotonic()
+            if self._rows >= self.batch_rows:
+                await self._flush()
+
+    async def _flush(self) -> None:
+        if not self._pending:
+            return
+        batch, rows = self._pending, self._rows
+        self._pending, self._rows, self._oldest = {}, 0, None
+        t0 = time.perf_counter()
+        try:
+            errors = await asyncio.to_thread(self._write, batch)
+        except Exception as exc:  # noqa: BLE001 - e.g. no connection
+            errors = dict.fromkeys(batch, exc)
+        for target, exc in errors.items():
+            sources = sorted({s for s, _ in batch[target]})
+            logger.error(
+                "Failed to write %d rows from %s to %s: %s",
+                sum(len(df) for _, df in batch[target]),
+                ", ".join(sources),
+                target,
+                exc,
+            )
+            self.failed.update(sources)
+            if self.on_error is not None:
+                try:
+                    await asyncio.to_thread(self.on_error, sources, exc)
+                except Exception as callback_exc:  # noqa: BLE001
+                    logger.error("Write error callback failed: %s", callback_exc)
+        written = [target for target in batch if target not in errors]
+        if not written:
+            return
+        self.flushes += 1
+        logger.info(
+            "Flushed %d rows to %s in %.2fs",
+            rows - sum(len(df) for t in errors for _, df in batch[t]),
+            ", ".join(written),
+            time.perf_counter() - t0,
+        )
+
+    def _write(self, batch: dict) -> dict[str, Exception]:
+        """Write each target in its own transaction on one connection.
+
+        Returns the error of every target whose transaction rolled back.
+        """
+        errors = {}
+        with self.engine.connect() as conn:
+            for target, items in batch.items():
+                try:
+                    with conn.begin():
+                        callback = self.handlers[target](conn, items)
+                    if callback is not None:
+                        callback()
+                except Exception as exc:  # noqa: BLE001
+                    errors[target] = exc
+        return errors